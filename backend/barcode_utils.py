@@ -2,8 +2,9 @@
 import segno
 import io
 import base64
+from functools import lru_cache
 
-def generate_epc_qr_code(
+def epc_qr_data(
     iban: str,
     amount: float,
     payee_name: str,
@@ -18,7 +19,7 @@ def generate_epc_qr_code(
     payer_city: str = ""
 ) -> str:
     """
-    Generates a Croatian "Slikaj i plati" (EPC) QR code base64 string.
+    Builds the Croatian "Slikaj i plati" (EPC) QR payload.
     
     Format:
     BCD
@@ -73,10 +74,24 @@ def generate_epc_qr_code(
         "" # Display (optional)
     ]
     
-    data = "\n".join(lines)
-    
-    # Generate QR
-    qr = segno.make(data, error='M') # M level is standard
+    return "\n".join(lines)
+
+@lru_cache(maxsize=256)
+def _encode_qr(data: str) -> "segno.QRCode":
+    # Picking the mask pattern dominates the cost; re-rendering the same invoice reuses it
+    return segno.make(data, error='M') # M level is standard
+
+def make_epc_qr(**kwargs) -> "segno.QRCode":
+    """
+    Builds the EPC QR symbol (see epc_qr_data for the arguments).
+    """
+    return _encode_qr(epc_qr_data(**kwargs))
+
+def generate_epc_qr_code(**kwargs) -> str:
+    """
+    Generates a Croatian "Slikaj i plati" (EPC) QR code as a base64 PNG data URI.
+    """
+    qr = make_epc_qr(**kwargs)
     
     # Output to buffer
     buff = io.BytesIO()
@@ -0,0 +1,201 @@
+from datetime import date
+from typing import IO, Iterator, List, Optional, Tuple, Union
+from lxml import etree as ET
+
+from backend.models import Transaction, TransactionType, TransactionCategory
+from backend.erste_parser import make_transaction_id
+
+CAMT053_NAMESPACE_PREFIX = "urn:iso:std:iso:20022:tech:xsd:camt.053"
+
+
+def _local(tag: str) -> str:
+    # '{urn:iso:...camt.053.001.02}Ntry' -> 'Ntry'
+    return tag.rsplit('}', 1)[-1]
+
+
+def _flatten(elem) -> dict:
+    """
+    Flattens an element into {'Local/Path': text} in a single walk.
+    The first occurrence of a path wins, and namespaces are dropped
+    (camt.053 versions 001.02 - 001.08 only differ in the namespace).
+    Attributes are stored as 'Path@name'.
+    """
+    fields = {}
+
+    def walk(node, prefix):
+        for child in node:
+            if not isinstance(child.tag, str):
+                continue # comments / processing instructions
+            path = prefix + _local(child.tag)
+            if path not in fields:
+                text = child.text.strip() if child.text else ""
+                fields[path] = text
+                for name, value in child.attrib.items():
+                    fields[f"{path}@{name}"] = value
+            walk(child, path + "/")
+
+    walk(elem, "")
+    return fields
+
+
+def _parse_date(fields: dict, path: str) -> Optional[date]:
+    # Dates come either as <Dt>2025-12-19</Dt> or <DtTm>2025-12-19T10:00:00</DtTm>
+    value = fields.get(f"{path}/Dt") or fields.get(f"{path}/DtTm", "")[:10]
+    if not value:
+        return None
+    return date.fromisoformat(value)
+
+
+def _extract_account_metadata(acct) -> dict:
+    fields = _flatten(acct)
+    metadata = {}
+
+    if fields.get('Id/IBAN'):
+        metadata['iban'] = fields['Id/IBAN']
+
+    if fields.get('Ownr/Nm'):
+        metadata['name'] = fields['Ownr/Nm']
+
+    oib = fields.get('Ownr/Id/OrgId/Othr/Id') or fields.get('Ownr/Id/PrvtId/Othr/Id')
+    if oib:
+        metadata['oib'] = oib
+
+    street = " ".join(filter(None, [fields.get('Ownr/PstlAdr/StrtNm'), fields.get('Ownr/PstlAdr/BldgNb')]))
+    town = " ".join(filter(None, [fields.get('Ownr/PstlAdr/PstCd'), fields.get('Ownr/PstlAdr/TwnNm')]))
+    parts = [p for p in [street, town] if p]
+    if not parts:
+        # Unstructured address: only the first <AdrLine> survives flattening
+        parts = [fields['Ownr/PstlAdr/AdrLine']] if fields.get('Ownr/PstlAdr/AdrLine') else []
+    if parts:
+        metadata['address'] = ", ".join(parts)
+
+    return metadata
+
+
+def _entry_to_transaction(ntry, source_filename: Optional[str]) -> Optional[Transaction]:
+    fields = _flatten(ntry)
+
+    # Only booked entries end up on the statement (skip PDNG / INFO)
+    status = fields.get('Sts/Cd') or fields.get('Sts')
+    if status and status != 'BOOK':
+        return None
+
+    tx_date = _parse_date(fields, 'BookgDt') or _parse_date(fields, 'ValDt')
+    if tx_date is None or not fields.get('Amt'):
+        return None
+
+    amount = float(fields['Amt'])
+    currency = fields.get('Amt@Ccy', 'EUR')
+
+    is_credit = fields.get('CdtDbtInd') == 'CRDT'
+    if fields.get('RvslInd', '').lower() == 'true':
+        is_credit = not is_credit
+
+    # Most banks send one TxDtls per Ntry; batch bookings are imported as one entry
+    # described by their first transaction
+    details = 'NtryDtls/TxDtls/'
+
+    # Counterparty: the debtor pays us, we pay the creditor
+    party = 'Dbtr' if is_credit else 'Cdtr'
+    counterparty = fields.get(f'{details}RltdPties/{party}/Nm') or fields.get(f'{details}RltdPties/{party}/Pty/Nm')
+    counterparty_iban = fields.get(f'{details}RltdPties/{party}Acct/Id/IBAN')
+
+    description = " ".join(filter(None, [counterparty, counterparty_iban]))
+    if not description:
+        description = fields.get(f'{details}RmtInf/Ustrd') or fields.get('AddtlNtryInf', "")
+    description = " ".join(description.split())
+
+    end_to_end_id = fields.get(f'{details}Refs/EndToEndId')
+    if end_to_end_id == 'NOTPROVIDED':
+        end_to_end_id = None
+    reference = " ".join(filter(None, [
+        fields.get(f'{details}RmtInf/Strd/CdtrRefInf/Ref'),
+        end_to_end_id,
+        fields.get(f'{details}Refs/AcctSvcrRef') or fields.get('AcctSvcrRef'),
+    ]))
+
+    if is_credit:
+        tx_type = TransactionType.INFLOW
+        category = TransactionCategory.BUSINESS_INCOME # Default for positive
+    else:
+        tx_type = TransactionType.OUTFLOW
+        category = TransactionCategory.BUSINESS_EXPENSE
+
+    return Transaction(
+        id=make_transaction_id(tx_date, description, amount, reference),
+        date=tx_date,
+        description=description,
+        amount=amount,
+        currency=currency,
+        type=tx_type,
+        category=category,
+        raw_reference=reference,
+        source_file=source_filename
+    )
+
+
+def iter_camt053_transactions(
+    source: Union[str, IO[bytes]],
+    source_filename: str = None,
+    metadata: Optional[dict] = None
+) -> Iterator[Transaction]:
+    """
+    Streams Transactions out of an ISO 20022 camt.053 statement (path or binary file object).
+    Each <Ntry> is converted and then dropped from the tree, so memory stays bounded
+    regardless of how many entries a (multi-year) export holds.
+    Account owner details are written into `metadata` when it is given.
+    """
+    # lxml filters the events down to the two tags we care about in C
+    events = ET.iterparse(source, events=('end',), tag=('{*}Ntry', '{*}Acct'), huge_tree=True)
+    for _, elem in events:
+        parent = elem.getparent()
+        if _local(elem.tag) == 'Acct':
+            # Only the statement's own account (Stmt/Acct), not related-party accounts
+            if metadata is not None and parent is not None and _local(parent.tag) == 'Stmt':
+                for key, value in _extract_account_metadata(elem).items():
+                    metadata.setdefault(key, value)
+            continue
+
+        try:
+            tx = _entry_to_transaction(elem, source_filename)
+        except ValueError as e:
+            print(f"Skipping camt.053 entry: {e}")
+            tx = None
+
+        # Drop the finished entry and everything before it so the tree never grows
+        elem.clear()
+        while elem.getprevious() is not None:
+            del parent[0]
+
+        if tx is not None:
+            yield tx
+
+
+def parse_camt053(source: Union[str, IO[bytes]], source_filename: str = None) -> Tuple[List[Transaction], dict]:
+    """
+    Parses a camt.053 statement and returns (transactions, metadata),
+    the same shape as parse_erste_html.
+    """
+    metadata = {}
+    transactions = list(iter_camt053_transactions(source, source_filename, metadata))
+    return transactions, metadata
+
+
+def is_camt053(head: bytes) -> bool:
+    """
+    Cheap check on the first few KB of a file.
+    """
+    return CAMT053_NAMESPACE_PREFIX.encode() in head
+
+
+if __name__ == "__main__":
+    # Test run
+    import sys
+    if len(sys.argv) > 1:
+        fpath = sys.argv[1]
+        print(f"Parsing {fpath}...")
+        txs, meta = parse_camt053(fpath)
+        print(f"Metadata: {meta}")
+        print(f"Found {len(txs)} transactions.")
+        for t in txs[:50]:
+            print(f"{t.date} | {t.amount} | {t.type} | {t.description[:50]}...")
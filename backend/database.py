@@ -5,14 +5,37 @@ from typing import List, Optional
 import json
 from backend.models import Transaction, TransactionType, TransactionCategory, Client, Invoice, InvoiceStatus
 from datetime import date
+import threading
 import uuid
 
 class XMLDatabase:
     def __init__(self, db_path: str):
         self.db_path = db_path
         self.processed_files_path = os.path.join(os.path.dirname(db_path), "processed_files.json")
+        self.rejected_files_path = os.path.join(os.path.dirname(db_path), "rejected_files.json")
+        # Serialises read-modify-write cycles on the XML file (upload, sync and
+        # review requests can overlap)
+        self._lock = threading.RLock()
+        # Called as callback(kind, key) after invoices ("invoice", id) or the
+        # issuer metadata ("metadata", None) change
+        self._change_listeners = []
         self._ensure_db_exists()
-        self.processed_files = self._load_processed_files()
+        # filename -> (mtime_ns, size) at the time it was imported, or None for
+        # entries recorded before stats were kept
+        self.processed_stats = self._load_processed_files()
+        self.processed_files = set(self.processed_stats)
+        # filename -> (mtime_ns, size) of files found in DATA_DIR that failed to parse
+        self.rejected_stats = self._load_rejected_files()
+
+    def add_change_listener(self, callback):
+        self._change_listeners.append(callback)
+
+    def _notify_change(self, kind: str, key: Optional[str] = None):
+        for callback in self._change_listeners:
+            try:
+                callback(kind, key)
+            except Exception as e:
+                print(f"Change listener failed: {e}")
 
     def _ensure_db_exists(self):
         if not os.path.exists(self.db_path):
@@ -25,23 +48,119 @@ class XMLDatabase:
             with open(self.processed_files_path, 'w') as f:
                 json.dump([], f)
 
-    def _load_processed_files(self) -> set:
+    def _load_processed_files(self) -> dict:
         try:
             with open(self.processed_files_path, 'r') as f:
-                return set(json.load(f))
+                data = json.load(f)
         except:
-            return set()
+            return {}
+        if isinstance(data, list):
+            # Older ledger: filenames only
+            return {filename: None for filename in data}
+        return {filename: tuple(stat) if stat else None for filename, stat in data.items()}
 
     def save_processed_files(self):
         with open(self.processed_files_path, 'w') as f:
-            json.dump(list(self.processed_files), f, indent=2)
+            json.dump(self.processed_stats, f, indent=2)
+
+    def _load_rejected_files(self) -> dict:
+        try:
+            with open(self.rejected_files_path, 'r') as f:
+                return {filename: tuple(stat) for filename, stat in json.load(f).items()}
+        except:
+            return {}
+
+    def _save_rejected_files(self):
+        with open(self.rejected_files_path, 'w') as f:
+            json.dump(self.rejected_stats, f, indent=2)
+
+    def _file_stat(self, filename: str):
+        try:
+            stat = os.stat(os.path.join(os.path.dirname(self.db_path), filename))
+        except OSError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
 
     def is_file_processed(self, filename: str) -> bool:
         return filename in self.processed_files
 
+    def is_file_current(self, filename: str) -> bool:
+        """
+        True if the file was imported and hasn't changed on disk since.
+        Entries without a recorded stat count as current.
+        """
+        if filename not in self.processed_files:
+            return False
+        recorded = self.processed_stats.get(filename)
+        return recorded is None or recorded == self._file_stat(filename)
+
     def mark_file_processed(self, filename: str):
-        self.processed_files.add(filename)
-        self.save_processed_files()
+        self.mark_files_processed([filename])
+
+    def mark_files_processed(self, filenames: List[str]):
+        if not filenames:
+            return
+        with self._lock:
+            for filename in filenames:
+                self.processed_stats[filename] = self._file_stat(filename)
+            self.processed_files.update(filenames)
+            self.save_processed_files()
+            if any(self.rejected_stats.pop(filename, None) for filename in filenames):
+                self._save_rejected_files()
+
+    def is_file_rejected(self, filename: str) -> bool:
+        """
+        True if the file failed to parse and hasn't changed on disk since.
+        """
+        recorded = self.rejected_stats.get(filename)
+        return recorded is not None and recorded == self._file_stat(filename)
+
+    def mark_files_rejected(self, filenames: List[str]):
+        """
+        Records files that failed to parse, so they aren't tried again until they change.
+        """
+        with self._lock:
+            for filename in filenames:
+                stat = self._file_stat(filename)
+                if stat is not None:
+                    self.rejected_stats[filename] = stat
+            self._save_rejected_files()
+
+    # --- Gmail sync state ---
+    def _gmail_sync_path(self) -> str:
+        return os.path.join(os.path.dirname(self.db_path), "gmail_sync.json")
+
+    def get_gmail_sync_state(self, query: str) -> Optional[dict]:
+        """
+        Returns {"history_id", "synced_at", "failed"} recorded by the last completed sync
+        for a query, "failed" listing message ids to retry.
+        """
+        try:
+            with open(self._gmail_sync_path(), 'r') as f:
+                return json.load(f).get(query)
+        except (OSError, ValueError):
+            return None
+
+    def save_gmail_sync_state(self, query: str, state: dict):
+        try:
+            with open(self._gmail_sync_path(), 'r') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            data = {}
+        data[query] = state
+        with open(self._gmail_sync_path(), 'w') as f:
+            json.dump(data, f, indent=2)
+
+    def clear_gmail_sync_state(self):
+        if os.path.exists(self._gmail_sync_path()):
+            os.remove(self._gmail_sync_path())
+
+    # Gmail messages are recorded in the same ledger, prefixed so they can't clash with filenames
+    def is_message_processed(self, message_id: str) -> bool:
+        return f"gmail:{message_id}" in self.processed_files
+
+    def mark_messages_processed(self, message_ids: List[str]):
+        self.mark_files_processed([f"gmail:{message_id}" for message_id in message_ids])
 
     def _save_tree(self, tree: ET.ElementTree):
         # Pretty print for readability
@@ -148,13 +267,128 @@ class XMLDatabase:
         Updates source_file if missing in existing transaction.
         Returns the number of new or updated transactions.
         """
-        tree = ET.parse(self.db_path)
-        root = tree.getroot()
-        tx_root = root.find("transactions")
-        
-        # Build index of existing elements
-        existing_map = {e.get("id"): e for e in tx_root.findall("transaction")}
-        
+        with self._lock:
+            tree = ET.parse(self.db_path)
+            tx_root = tree.getroot().find("transactions")
+            existing_map = {e.get("id"): e for e in tx_root.findall("transaction")}
+
+            added_count = self._apply_transactions(tx_root, existing_map, new_transactions)
+
+            if added_count > 0:
+                self._save_tree(tree)
+
+        return added_count
+
+    def commit_ingest(self, entries: List[tuple]) -> dict:
+        """
+        Commits the result of a whole ingest batch in one go.
+        `entries` is a list of (filename, transactions, metadata) tuples, applied in order.
+        The XML DB and processed_files.json are each rewritten at most once.
+        Returns {filename: number of new or updated transactions}.
+        """
+        added = {}
+        if not entries:
+            return added
+
+        with self._lock:
+            tree = ET.parse(self.db_path)
+            root = tree.getroot()
+            tx_root = root.find("transactions")
+            existing_map = {e.get("id"): e for e in tx_root.findall("transaction")}
+
+            row_index = self._row_key_index(existing_map)
+
+            changed = False
+            metadata_changed = False
+            for filename, transactions, metadata in entries:
+                transactions, removed = self._dedupe_across_formats(filename, transactions, tx_root, existing_map, row_index)
+                added[filename] = self._apply_transactions(tx_root, existing_map, transactions)
+                for tx in transactions:
+                    row_index.setdefault(self._row_key(tx.date.isoformat(), tx.amount, tx.type.value, tx.raw_reference), existing_map[tx.id])
+                if removed:
+                    changed = True
+                if added[filename] > 0:
+                    changed = True
+                # Text scraped from a PDF is a fallback: it fills gaps but never
+                # overwrites what an HTML or camt.053 statement provided
+                if metadata and self._apply_metadata(root, metadata, overwrite=not filename.lower().endswith(".pdf")):
+                    changed = True
+                    metadata_changed = True
+
+            if changed:
+                self._save_tree(tree)
+            self.mark_files_processed([filename for filename, _, _ in entries])
+
+        if metadata_changed:
+            self._notify_change("metadata")
+        return added
+
+    @staticmethod
+    def _row_key(date_str: str, amount, type_str: str, reference: Optional[str]) -> tuple:
+        """
+        Format independent identity of a statement row. Descriptions differ between
+        HTML, camt.053 and PDF text extraction, but date, amount, direction and the
+        digits of the payment references don't.
+        """
+        digits = "".join(c for c in (reference or "") if c.isdigit())
+        return (date_str, round(float(amount), 2), type_str, digits)
+
+    def _row_key_index(self, existing_map: dict) -> dict:
+        index = {}
+        for elem in existing_map.values():
+            ref_node = elem.find("raw_reference")
+            key = self._row_key(
+                elem.find("date").text,
+                elem.find("amount").text,
+                elem.find("type").text,
+                ref_node.text if ref_node is not None else None
+            )
+            index.setdefault(key, elem)
+        return index
+
+    def _dedupe_across_formats(self, filename: str, transactions: List[Transaction], tx_root: ET.Element, existing_map: dict, row_index: dict):
+        """
+        PDF statements are a fallback: their rows are dropped when the same booking is
+        already known from another source, and rows previously imported from a PDF are
+        replaced once the HTML/XML version of the statement arrives.
+        Returns (transactions to apply, whether existing rows were removed).
+        """
+        is_pdf = filename.lower().endswith(".pdf")
+        kept = []
+        removed = False
+        for tx in transactions:
+            key = self._row_key(tx.date.isoformat(), tx.amount, tx.type.value, tx.raw_reference)
+            known = row_index.get(key)
+            if known is None or known.get("id") == tx.id:
+                kept.append(tx)
+                continue
+
+            known_source = known.find("source_file")
+            known_is_pdf = known_source is not None and (known_source.text or "").lower().endswith(".pdf")
+            if is_pdf:
+                if known_is_pdf and known_source.text == filename:
+                    kept.append(tx) # Distinct booking that happens to share the key
+                continue
+
+            if known_is_pdf:
+                # Carry over review decisions made on the PDF-derived row
+                for field in ("is_excluded_from_posd", "posd_note", "tax_type"):
+                    node = known.find(field)
+                    if node is not None and node.text and not getattr(tx, field):
+                        setattr(tx, field, node.text == 'true' if field == "is_excluded_from_posd" else node.text)
+                tx_root.remove(known)
+                existing_map.pop(known.get("id"), None)
+                del row_index[key]
+                removed = True
+            kept.append(tx)
+
+        return kept, removed
+
+    def _apply_transactions(self, tx_root: ET.Element, existing_map: dict, new_transactions: List[Transaction]) -> int:
+        """
+        Merges transactions into an already parsed <transactions> element.
+        `existing_map` (id -> element) is kept up to date so it can be reused across calls.
+        """
         added_count = 0
 
         for tx in new_transactions:
@@ -257,31 +491,41 @@ class XMLDatabase:
             added_count += 1
             existing_map[tx.id] = tx_elem
 
-        if added_count > 0:
-            self._save_tree(tree)
-        
         return added_count
 
     def save_metadata(self, metadata: dict):
         """
         Updates metadata section in XML.
         """
-        tree = ET.parse(self.db_path)
-        root = tree.getroot()
-        
+        with self._lock:
+            tree = ET.parse(self.db_path)
+            self._apply_metadata(tree.getroot(), metadata)
+            self._save_tree(tree)
+        self._notify_change("metadata")
+
+    def _apply_metadata(self, root: ET.Element, metadata: dict, overwrite: bool = True) -> bool:
+        """
+        Writes metadata values into the <metadata> element; with overwrite=False only
+        keys without a value are filled. Returns True if anything changed.
+        """
         meta_node = root.find("metadata")
         if meta_node is None:
             meta_node = ET.SubElement(root, "metadata")
-            
+
+        changed = False
         for key, value in metadata.items():
             if not value: continue
-            
+
             node = meta_node.find(key)
             if node is None:
                 node = ET.SubElement(meta_node, key)
-            node.text = str(value)
-            
-        self._save_tree(tree)
+            elif node.text and not overwrite:
+                continue
+            if node.text != str(value):
+                node.text = str(value)
+                changed = True
+
+        return changed
 
     def get_metadata(self) -> dict:
         if not os.path.exists(self.db_path):
@@ -373,7 +617,8 @@ class XMLDatabase:
                     search: Optional[str] = None,
                     start_date: Optional[date] = None,
                     end_date: Optional[date] = None,
-                    status: Optional[InvoiceStatus] = None) -> dict:
+                    status: Optional[InvoiceStatus] = None,
+                    year: Optional[int] = None) -> dict:
         
         raw_data = self._load_invoices_file()
         invoices = []
@@ -393,6 +638,9 @@ class XMLDatabase:
         for inv in invoices:
             if status and inv.status != status:
                 continue
+
+            if year and inv.issue_date.year != year:
+                continue
             
             if start_date and inv.issue_date < start_date:
                 continue
@@ -446,6 +694,7 @@ class XMLDatabase:
             raw_data.append(inv_dict)
             
         self.save_invoices_file(raw_data)
+        self._notify_change("invoice", invoice.id)
         return invoice
 
     def get_invoice(self, invoice_id: str) -> Optional[Invoice]:
@@ -464,6 +713,7 @@ class XMLDatabase:
         
         if len(filtered) < initial_len:
             self.save_invoices_file(filtered)
+            self._notify_change("invoice", invoice_id)
             return True
         return False
     
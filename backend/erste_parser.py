@@ -5,6 +5,14 @@ from typing import List
 import hashlib
 from backend.models import Transaction, TransactionType, TransactionCategory
 
+def make_transaction_id(tx_date, description: str, amount: float, reference: str) -> str:
+    """
+    Stable transaction id shared by all statement parsers, so the same booking
+    imported twice (or from another export format) deduplicates on save.
+    """
+    unique_str = f"{tx_date}{description}{amount}{reference}"
+    return hashlib.md5(unique_str.encode()).hexdigest()
+
 def parse_erste_html(html_content: str, source_filename: str = None) -> List[Transaction]:
     """
     Parses an Erste Bank HTML statement and returns a list of Transactions.
@@ -108,8 +116,7 @@ def parse_erste_html(html_content: str, source_filename: str = None) -> List[Tra
             continue
 
         # Generate a unique ID based on fields to avoid duplicates
-        unique_str = f"{tx_date}{description}{amount}{reference}"
-        tx_id = hashlib.md5(unique_str.encode()).hexdigest()
+        tx_id = make_transaction_id(tx_date, description, amount, reference)
 
         tx = Transaction(
             id=tx_id,
@@ -125,6 +132,118 @@ def parse_erste_html(html_content: str, source_filename: str = None) -> List[Tra
 
     return transactions, metadata
 
+# Stands in for <br> while a statement is flattened to text
+_LINE_BREAK = "\x1f"
+
+def _style(tag) -> dict:
+    """
+    Inline CSS of a tag as {property: value}.
+    """
+    style = {}
+    for declaration in (tag.get('style') or '').split(';'):
+        name, _, value = declaration.partition(':')
+        if value:
+            style[name.strip().lower()] = value.strip().lower()
+    return style
+
+def _lines(tag) -> List[str]:
+    """
+    Text of a tag split at its <br>s, whitespace collapsed and blank lines dropped.
+    """
+    lines = (" ".join(part.split()) for part in tag.get_text().split(_LINE_BREAK))
+    return [line for line in lines if line]
+
+def _cell(tag) -> dict:
+    style = _style(tag)
+    width = style.get('width', '')
+    return {
+        "lines": _lines(tag),
+        "span": int(tag.get('colspan') or 1),
+        "align": style.get('text-align', 'left'),
+        "bold": style.get('font-weight') == 'bold',
+        "shade": style.get('background') or style.get('background-color'),
+        "rule": 'border-bottom' in style,
+        "width": float(width[:-1]) if width.endswith('%') else None,
+    }
+
+def _row(kind: str, tr) -> dict:
+    return {
+        "kind": kind,
+        "shade": _style(tr).get('background-color'),
+        "cells": [_cell(td) for td in tr.find_all('td', recursive=False)],
+    }
+
+def _field(div):
+    spans = div.find_all('span', recursive=False)
+    return " ".join(_lines(spans[0])), " ".join(_lines(spans[-1])) if len(spans) > 1 else ""
+
+def parse_erste_statement(html_content: str):
+    """
+    Parses an Erste Bank HTML statement into what it prints, for rendering it
+    without the HTML (see statement_pdf_native). Returns None for anything that
+    isn't laid out like an Erste statement.
+
+    Rows of the transactions table are {"kind", "shade", "cells"}, kind being
+    "head" (column titles), "balance" (opening/closing), "item" or "total" (the
+    per-day footer); cells are {"lines", "span", "align", "bold", "shade", "rule",
+    "width"}. The recapitulation and the notes below it use the same cells.
+    """
+    soup = BeautifulSoup(html_content, 'lxml')
+    header = soup.find('div', id='Header')
+    if soup.body is None or header is None or soup.find('table', class_='tbHeadUp') is None:
+        return None
+    for br in soup.find_all('br'):
+        br.replace_with(_LINE_BREAK)
+
+    statement = {
+        "title": "",
+        "lines": [], # issue date, period
+        "bank": [],
+        "client": [],
+        "fields": [], # (label, value)
+        "rows": [],
+        "recap": [],
+        "notes": [], # lists of cells
+    }
+    for div in header.find_all('div', recursive=False):
+        if div.get('id') == 'Naslov':
+            statement["title"] = " ".join(_lines(div))
+        elif div.get('id') == 'Generalno':
+            statement["fields"].append(_field(div))
+        elif div.find('table') is not None:
+            cells = div.find('table').find('tr').find_all('td', recursive=False)
+            statement["bank"] = _lines(cells[0])
+            if len(cells) > 1:
+                statement["client"] = _lines(cells[1])
+        else:
+            line = " ".join(_lines(div))
+            if line:
+                statement["lines"].append(line)
+
+    for tag in soup.body.find_all(['div', 'table'], recursive=False):
+        classes = tag.get('class') or []
+        if tag.name == 'div' and tag.get('id') == 'Generalno':
+            statement["fields"].append(_field(tag))
+        elif tag.name == 'div' and tag.get('id') == 'TRekap':
+            statement["notes"].append([_cell(span) for span in tag.find_all('span', recursive=False)])
+        elif 'tbHeadUp' in classes:
+            statement["rows"].extend(_row("head", tr) for tr in tag.find_all('tr'))
+        elif 'tbHeadDown' in classes:
+            statement["rows"].extend(_row("balance", tr) for tr in tag.find_all('tr'))
+        elif 'tbRekap' in classes:
+            statement["recap"].extend(_row("recap", tr) for tr in tag.find_all('tr'))
+        elif tag.name == 'table':
+            for tr in tag.find_all('tr'):
+                tr_classes = tr.get('class') or []
+                if 'trItems' in tr_classes:
+                    statement["rows"].append(_row("item", tr))
+                elif 'trFootUp' in tr_classes:
+                    statement["rows"].append(_row("total", tr))
+
+    if not statement["rows"]:
+        return None
+    return statement
+
 if __name__ == "__main__":
     # Test run
     import sys
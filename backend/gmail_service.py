@@ -1,27 +1,114 @@
 import os
 import base64
-from typing import List, Optional
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional
+import httplib2
+import google_auth_httplib2
 from google.auth.transport.requests import Request
 from google.auth.exceptions import RefreshError
 from google.oauth2.credentials import Credentials
 from google_auth_oauthlib.flow import InstalledAppFlow
 from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
+from googleapiclient.http import BatchHttpRequest
+from backend.statement_parsers import statement_extensions
 
 # If modifying these scopes, delete the file token.json.
 SCOPES = ['https://www.googleapis.com/auth/gmail.readonly']
 
+DEFAULT_QUERY = 'subject:"ERSTE Izvadak" has:attachment'
+
+# Attachment types we know how to import, in order of preference
+STATEMENT_EXTENSIONS = statement_extensions()
+
+# Partial response for the pre-download check: just enough to pick the statement part
+STATEMENT_PART_FIELDS = 'id,payload/parts(filename,body/attachmentId)'
+
+# Refresh the OAuth access token this long before it expires
+TOKEN_REFRESH_MARGIN = 300
+# Retry delay after a failed background refresh (e.g. network down)
+TOKEN_REFRESH_RETRY = 60
+
+# Gmail accepts at most 100 calls per batch request
+MAX_BATCH_SIZE = 100
+# Rate limit / transient server errors worth retrying
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+
+# Gmail's per-user quota is 250 units/s; messages.get, attachments.get and messages.list cost 5 each
+QUOTA_UNITS_PER_SECOND = 250
+CALL_QUOTA_UNITS = 5
+HISTORY_QUOTA_UNITS = 2
+
+
+class TokenBucket:
+    """
+    Thread safe token bucket. `acquire(n)` blocks until `n` tokens are available;
+    requests larger than the bucket wait for a full bucket and then borrow the
+    rest, so a 100-call batch is paced rather than rejected.
+    """
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, n: float = 1):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                needed = min(n, self.capacity)
+                if self.tokens >= needed:
+                    self.tokens -= n
+                    return
+                wait = (needed - self.tokens) / self.rate
+            time.sleep(wait)
+
+
 class GmailService:
-    def __init__(self, credentials_path: str = 'credentials.json', token_path: str = 'token.json'):
+    def __init__(
+        self,
+        credentials_path: str = 'credentials.json',
+        token_path: str = 'token.json',
+        batch_size: int = MAX_BATCH_SIZE,
+        batch_concurrency: int = 4,
+        max_retries: int = 5,
+        quota_units_per_second: float = QUOTA_UNITS_PER_SECOND,
+        api_endpoint: Optional[str] = None
+    ):
         self.credentials_path = credentials_path
         self.token_path = token_path
         self.creds = None
         self.service = None
+        # Calls per batch request and how many batch requests may be in flight at once
+        self.batch_size = min(batch_size, MAX_BATCH_SIZE)
+        self.batch_concurrency = batch_concurrency
+        self.max_retries = max_retries
+        # Shared by every thread issuing API calls, so concurrency can't blow the quota
+        self.rate_limiter = TokenBucket(quota_units_per_second)
+        # Alternative API root, e.g. the local stand-in in scripts/fake_gmail_server.py
+        self.api_endpoint = api_endpoint.rstrip('/') + '/' if api_endpoint else None
 
-    def authenticate(self):
+        self._profile_email = None
+        self._refresher = None
+        self._refresher_stop = threading.Event()
+
+    def authenticate(self, interactive: bool = True):
         """Shows basic usage of the Gmail API.
         Handles expired/revoked tokens by automatically triggering re-authentication.
+        Once authenticated the built service is kept and the token is refreshed in the
+        background, so later calls return without touching disk or network.
+        With interactive=False (background jobs) the browser OAuth flow is never started.
         """
+        if self.service and self.creds and self.creds.valid:
+            return True
+
         self.creds = None
         # The file token.json stores the user's access and refresh tokens, and is
         # created automatically when the authorization flow completes for the first
@@ -43,6 +130,8 @@ class GmailService:
             
             # If we still don't have valid credentials, run the OAuth flow
             if not self.creds:
+                if not interactive:
+                    return False
                 if not os.path.exists(self.credentials_path):
                     # Mocking/Warning for development if file is missing
                     print(f"Warning: {self.credentials_path} not found. Cannot authenticate.")
@@ -57,13 +146,60 @@ class GmailService:
                 token.write(self.creds.to_json())
 
         try:
-            self.service = build('gmail', 'v1', credentials=self.creds)
+            # The discovery document ships with the client library, no fetch needed
+            client_options = {'api_endpoint': self.api_endpoint} if self.api_endpoint else None
+            self.service = build(
+                'gmail', 'v1', credentials=self.creds,
+                static_discovery=True, cache_discovery=False, client_options=client_options
+            )
+            self._start_token_refresher()
             return True
         except HttpError as error:
             print(f'An error occurred: {error}')
             return False
 
-    def fetch_erste_emails(self, query: str = 'subject:"ERSTE Izvadak" has:attachment') -> List[dict]:
+    def _start_token_refresher(self):
+        if self._refresher is not None and self._refresher.is_alive():
+            return
+        self._refresher_stop = threading.Event()
+        self._refresher = threading.Thread(
+            target=self._run_token_refresher, args=(self._refresher_stop,),
+            name="gmail-token-refresh", daemon=True
+        )
+        self._refresher.start()
+
+    def _run_token_refresher(self, stop: threading.Event):
+        """
+        Refreshes the access token TOKEN_REFRESH_MARGIN seconds before it expires,
+        so API calls never pay for the refresh inline.
+        """
+        while not stop.is_set():
+            creds = self.creds
+            if creds is None or not creds.refresh_token:
+                return
+
+            delay = TOKEN_REFRESH_RETRY
+            if creds.expiry is not None:
+                # google-auth keeps expiry as naive UTC
+                now = datetime.now(timezone.utc).replace(tzinfo=None)
+                delay = (creds.expiry - now).total_seconds() - TOKEN_REFRESH_MARGIN
+            if delay > 0 and stop.wait(delay):
+                return
+
+            try:
+                creds.refresh(Request())
+                with open(self.token_path, 'w') as token:
+                    token.write(creds.to_json())
+            except RefreshError as e:
+                # Revoked: the next authenticate() falls back to the OAuth flow
+                print(f"Background token refresh failed: {e}")
+                return
+            except Exception as e:
+                print(f"Background token refresh failed, retrying: {e}")
+                if stop.wait(TOKEN_REFRESH_RETRY):
+                    return
+
+    def fetch_erste_emails(self, query: str = DEFAULT_QUERY) -> List[dict]:
         """
         Searches for emails matching the query and returns a list of message objects.
         """
@@ -73,27 +209,7 @@ class GmailService:
                 return []
 
         try:
-            print(f"Searching Gmail with query: '{query}'")
-            messages = []
-            page_token = None
-            
-            while True:
-                results = self.service.users().messages().list(
-                    userId='me', q=query, pageToken=page_token
-                ).execute()
-                
-                new_messages = results.get('messages', [])
-                if new_messages:
-                    messages.extend(new_messages)
-                
-                page_token = results.get('nextPageToken')
-                if not page_token:
-                    break
-            
-            if not messages:
-                print(f"No emails found for query: {query}")
-            
-            return messages
+            return self.list_messages(query)
         except HttpError as error:
             print(f'An error occurred during email fetch: {error}')
             return []
@@ -101,58 +217,293 @@ class GmailService:
             print(f"Unexpected error during email fetch: {e}")
             return []
 
-    def download_attachment(self, message_id: str, save_dir: str) -> Optional[str]:
+    def list_messages(self, query: str = DEFAULT_QUERY) -> List[dict]:
+        """
+        Lists all messages matching the query, following pagination.
+        Unlike fetch_erste_emails, API errors are raised.
         """
-        Downloads the HTML attachment from a specific message.
-        Returns the path to the saved file.
+        print(f"Searching Gmail with query: '{query}'")
+        messages = []
+        page_token = None
+        
+        while True:
+            self.rate_limiter.acquire(CALL_QUOTA_UNITS)
+            results = self.service.users().messages().list(
+                userId='me', q=query, pageToken=page_token
+            ).execute(num_retries=self.max_retries)
+            
+            new_messages = results.get('messages', [])
+            if new_messages:
+                messages.extend(new_messages)
+            
+            page_token = results.get('nextPageToken')
+            if not page_token:
+                break
+        
+        if not messages:
+            print(f"No emails found for query: {query}")
+        
+        return messages
+
+    def get_history_id(self) -> Optional[str]:
+        """
+        Returns the mailbox's current historyId, the starting point for the next incremental sync.
         """
         if not self.service:
+            if not self.authenticate():
+                return None
+
+        try:
+            profile = self.service.users().getProfile(userId='me').execute(num_retries=self.max_retries)
+            self._profile_email = profile.get('emailAddress') or self._profile_email
+            return profile.get('historyId')
+        except HttpError as error:
+            print(f'An error occurred while reading the history id: {error}')
             return None
 
+    def fetch_new_erste_emails(self, start_history_id: str, since: int, query: str = DEFAULT_QUERY) -> Optional[List[dict]]:
+        """
+        Returns the messages matching `query` that were added after `start_history_id`.
+        `since` is the unix time of that history id; it only narrows the search used
+        to apply the query to the added messages.
+        Returns None when Gmail no longer has history that far back (a full list is needed).
+        """
+        if not self.service:
+            if not self.authenticate():
+                print("Authentication failed or skipped.")
+                return []
+
         try:
-            message = self.service.users().messages().get(userId='me', id=message_id).execute()
-            
-            if 'parts' not in message['payload']:
-                print(f"Message {message_id} has no parts.")
+            added = set()
+            page_token = None
+            while True:
+                self.rate_limiter.acquire(HISTORY_QUOTA_UNITS)
+                results = self.service.users().history().list(
+                    userId='me', startHistoryId=start_history_id,
+                    historyTypes=['messageAdded'], pageToken=page_token
+                ).execute(num_retries=self.max_retries)
+
+                for record in results.get('history', []):
+                    for item in record.get('messagesAdded', []):
+                        added.add(item['message']['id'])
+
+                page_token = results.get('nextPageToken')
+                if not page_token:
+                    break
+        except HttpError as error:
+            if error.resp.status == 404:
+                # History ids are only kept for about a week
+                print(f"History id {start_history_id} has expired.")
                 return None
+            raise
 
-            for part in message['payload']['parts']:
-                if part['filename'] and part['filename'].lower().endswith('.html'):
-                    if 'data' in part['body']:
-                        data = part['body']['data']
-                    else:
-                        att_id = part['body']['attachmentId']
-                        att = self.service.users().messages().attachments().get(userId='me', messageId=message_id, id=att_id).execute()
-                        data = att['data']
-                    
-                    file_data = base64.urlsafe_b64decode(data.encode('UTF-8'))
-                    path = os.path.join(save_dir, part['filename'])
-                    
-                    # Avoid overwriting if possible or handle naming
-                    # For now just save
-                    with open(path, 'wb') as f:
-                        f.write(file_data)
-                    
-                    return path
-            
-            print(f"No HTML attachment found in message {message_id}. Parts: {[p.get('filename') for p in message['payload']['parts']]}")
+        if not added:
+            return []
+
+        # history.list has no search filter: run the query over the recent window only
+        # (a day of slack for clock skew) and keep the messages history reported as new
+        since_day = max(since - 24 * 3600, 0)
+        recent = self.list_messages(query=f"{query} after:{since_day}")
+        return [msg for msg in recent if msg['id'] in added]
+
+    def get_statement_parts(self, message_ids: List[str]) -> Dict[str, Optional[dict]]:
+        """
+        Looks up which statement attachment each message carries without downloading
+        anything: only the part filenames and attachment ids are requested.
+        Returns {message_id: part or None}; messages that could not be fetched are left out.
+        """
+        if not self.service or not message_ids:
+            return {}
+
+        messages = self.get_messages(message_ids, fields=STATEMENT_PART_FIELDS)
+        parts = {message_id: self._pick_statement_part(message) for message_id, message in messages.items()}
+
+        # Small attachments are sent inline (body/data, no attachmentId). The mask leaves
+        # the data out so message bodies aren't downloaded here; fetch those few in full.
+        inline = [
+            message_id for message_id, part in parts.items()
+            if part is not None and 'attachmentId' not in part.get('body', {})
+        ]
+        if inline:
+            for message_id, message in self.get_messages(inline).items():
+                parts[message_id] = self._pick_statement_part(message)
+        return parts
+
+    def download_attachments(
+        self,
+        message_ids: List[str],
+        save_dir: str,
+        parts: Optional[Dict[str, Optional[dict]]] = None
+    ) -> Dict[str, Optional[str]]:
+        """
+        Downloads the statement attachment (HTML, camt.053 XML or PDF) of each message.
+        Message details and attachment bodies are each fetched with batch requests
+        (rate limited and retried by execute_batched) instead of one HTTP round trip per call.
+        `parts` (from get_statement_parts) saves fetching the message details again.
+        Returns {message_id: saved path or None}.
+        """
+        results = {message_id: None for message_id in message_ids}
+        if not self.service or not message_ids:
+            return results
+
+        if parts is None:
+            parts = {
+                message_id: self._pick_statement_part(message)
+                for message_id, message in self.get_messages(message_ids).items()
+            }
+
+        # Small attachments come inline, the rest need an attachments().get each
+        attachment_calls = {}
+        pending_parts = {}
+        for message_id in message_ids:
+            part = parts.get(message_id)
+            if part is None:
+                continue
+            body = part.get('body', {})
+            if 'data' in body:
+                results[message_id] = self._save_attachment(save_dir, part['filename'], body['data'])
+            elif 'attachmentId' in body:
+                att_id = body['attachmentId']
+                attachment_calls[message_id] = lambda m=message_id, a=att_id: self.service.users().messages().attachments().get(
+                    userId='me', messageId=m, id=a
+                )
+                pending_parts[message_id] = part
+
+        for message_id, att in self.execute_batched(attachment_calls).items():
+            results[message_id] = self._save_attachment(save_dir, pending_parts[message_id]['filename'], att['data'])
+
+        return results
+
+    def get_messages(self, message_ids: List[str], format: str = 'full', fields: Optional[str] = None) -> Dict[str, dict]:
+        """
+        Fetches messages with batch requests. Messages that still fail after
+        retries are left out of the result.
+        """
+        def make_call(message_id):
+            kwargs = {'userId': 'me', 'id': message_id, 'format': format}
+            if fields:
+                kwargs['fields'] = fields
+            return lambda: self.service.users().messages().get(**kwargs)
+
+        return self.execute_batched({message_id: make_call(message_id) for message_id in message_ids})
+
+    def execute_batched(self, calls: Dict[str, Callable]) -> Dict[str, dict]:
+        """
+        Executes API calls through Gmail batch requests.
+        `calls` maps a key to a zero-argument callable building the HttpRequest
+        (so it can be rebuilt for retries). Calls are sent `batch_size` per batch
+        with up to `batch_concurrency` batches in flight; calls failing with
+        429/5xx are retried with exponential backoff.
+        Returns {key: response} for the calls that succeeded.
+        """
+        if not calls:
+            return {}
+
+        keys = list(calls)
+        chunks = [keys[i:i + self.batch_size] for i in range(0, len(keys), self.batch_size)]
+
+        results = {}
+        with ThreadPoolExecutor(max_workers=max(1, self.batch_concurrency)) as pool:
+            for chunk_result in pool.map(lambda chunk: self._execute_chunk(chunk, calls), chunks):
+                results.update(chunk_result)
+        return results
+
+    def _execute_chunk(self, keys: List[str], calls: Dict[str, Callable]) -> Dict[str, dict]:
+        # httplib2 isn't thread safe, so every batch gets its own connection
+        http = google_auth_httplib2.AuthorizedHttp(self.creds, http=httplib2.Http(timeout=60))
+
+        results = {}
+        remaining = list(keys)
+        for attempt in range(self.max_retries + 1):
+            retry = []
+
+            def callback(request_id, response, exception):
+                if exception is None:
+                    results[request_id] = response
+                elif isinstance(exception, HttpError) and exception.resp.status in RETRYABLE_STATUSES:
+                    retry.append(request_id)
+                else:
+                    print(f"Gmail call {request_id} failed: {exception}")
+
+            if self.api_endpoint:
+                # The discovery document's batch URI ignores api_endpoint
+                batch = BatchHttpRequest(callback=callback, batch_uri=self.api_endpoint + 'batch/gmail/v1')
+            else:
+                batch = self.service.new_batch_http_request(callback=callback)
+            for key in remaining:
+                batch.add(calls[key](), request_id=key)
+
+            # Every call inside a batch counts against the quota separately
+            self.rate_limiter.acquire(CALL_QUOTA_UNITS * len(remaining))
+            try:
+                batch.execute(http=http)
+            except HttpError as error:
+                if error.resp.status not in RETRYABLE_STATUSES:
+                    print(f"Gmail batch request failed: {error}")
+                    return results
+                retry = remaining
+            except (httplib2.HttpLib2Error, OSError) as error:
+                print(f"Gmail batch request failed: {error}")
+                retry = remaining
+
+            if not retry:
+                return results
+            if attempt == self.max_retries:
+                print(f"Giving up on {len(retry)} Gmail calls after {self.max_retries} retries")
+                return results
+
+            remaining = retry
+            # Exponential backoff with jitter, capped at 32s
+            time.sleep(min(2 ** attempt + random.random(), 32))
+
+        return results
+
+    def _pick_statement_part(self, message: dict) -> Optional[dict]:
+        message_id = message.get('id')
+        parts = message.get('payload', {}).get('parts')
+        if not parts:
+            print(f"Message {message_id} has no parts.")
             return None
 
-        except HttpError as error:
-            print(f'An error occurred: {error}')
+        statement_parts = [
+            part for part in parts
+            if part.get('filename') and part['filename'].lower().endswith(STATEMENT_EXTENSIONS)
+        ]
+        if not statement_parts:
+            print(f"No statement attachment found in message {message_id}. Parts: {[p.get('filename') for p in parts]}")
             return None
 
+        # When a message carries several formats, take the structured export over the PDF
+        statement_parts.sort(key=lambda part: STATEMENT_EXTENSIONS.index(os.path.splitext(part['filename'].lower())[1]))
+        return statement_parts[0]
+
+    def _save_attachment(self, save_dir: str, filename: str, data: str) -> str:
+        file_data = base64.urlsafe_b64decode(data.encode('UTF-8'))
+        path = os.path.join(save_dir, filename)
+
+        # Avoid overwriting if possible or handle naming
+        # For now just save
+        with open(path, 'wb') as f:
+            f.write(file_data)
+
+        return path
+
     def get_profile_email(self) -> Optional[str]:
         """
         Returns the email address of the authenticated user.
+        Fetched once per login and cached.
         """
+        if self._profile_email:
+            return self._profile_email
+
         if not self.service:
             if not self.authenticate():
                 return None
         
         try:
-            profile = self.service.users().getProfile(userId='me').execute()
-            return profile.get('emailAddress')
+            profile = self.service.users().getProfile(userId='me').execute(num_retries=self.max_retries)
+            self._profile_email = profile.get('emailAddress')
+            return self._profile_email
         except Exception as e:
             print(f"Error fetching profile: {e}")
             return None
@@ -161,8 +512,10 @@ class GmailService:
         """
         Logs out the user by removing the token file.
         """
+        self._refresher_stop.set()
         self.creds = None
         self.service = None
+        self._profile_email = None
         if os.path.exists(self.token_path):
             try:
                 os.remove(self.token_path)
@@ -0,0 +1,185 @@
+import os
+import threading
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import List, Tuple
+
+from backend.ingest import IngestBatch, claim_files, get_parse_pool, parse_statement_file, release_files
+
+
+class GmailSyncPipeline:
+    """
+    Imports Gmail statements in two overlapping stages:
+
+    - download: slices of `batch_size` messages are pre-checked and downloaded by a
+      bounded thread pool (GmailService paces the calls with its token bucket)
+    - ingest: saved files are parsed in the parse pool and committed in batches of
+      `commit_batch_size`, or whenever the stage would otherwise sit waiting on the network
+
+    Progress counts a message once it is settled: skipped, failed or committed.
+    Messages that failed (fetch, download, parse or commit) end up in `failed`, so
+    the caller can retry them on the next sync.
+    Files are claimed (see ingest.claim_files) from download until they are
+    committed or fail, so the watch folder doesn't import them a second time.
+    """
+    def __init__(self, gmail_service, db, data_dir: str, sync_manager, commit_batch_size: int = 25):
+        self.gmail_service = gmail_service
+        self.db = db
+        self.data_dir = data_dir
+        self.sync_manager = sync_manager
+        self.commit_batch_size = commit_batch_size
+
+        self.total = 0
+        self.done = 0
+        self.imported = 0
+        self.skipped = 0
+        self.failed: List[str] = []
+        # Download threads and the ingest stage both report progress
+        self._progress_lock = threading.Lock()
+        self._claimed = Counter() # filenames claimed by this run and not yet released
+
+    def run(self, message_ids: List[str]) -> Tuple[int, int]:
+        """
+        Returns (imported, skipped).
+        """
+        self.total = len(message_ids)
+        self.sync_manager.update_progress(0, self.total)
+        try:
+            return self._run(message_ids)
+        finally:
+            self._release(list(self._claimed.elements()))
+
+    def _claim(self, filenames: List[str]):
+        with self._progress_lock:
+            self._claimed.update(filenames)
+        claim_files(filenames)
+
+    def _release(self, filenames: List[str]):
+        released = []
+        with self._progress_lock:
+            for filename in filenames:
+                if self._claimed[filename] > 0:
+                    self._claimed[filename] -= 1
+                    released.append(filename)
+        release_files(released)
+
+    def _run(self, message_ids: List[str]) -> Tuple[int, int]:
+
+        slice_size = self.gmail_service.batch_size
+        slices = [message_ids[i:i + slice_size] for i in range(0, len(message_ids), slice_size)]
+
+        batch = IngestBatch()
+        batch_messages = []
+        parsing = {}
+
+        with ThreadPoolExecutor(max_workers=max(1, self.gmail_service.batch_concurrency)) as downloads:
+            downloading = {downloads.submit(self._download_slice, ids) for ids in slices}
+
+            while downloading or parsing:
+                finished, _ = wait(downloading | set(parsing), return_when=FIRST_COMPLETED)
+
+                for future in finished:
+                    if future in downloading:
+                        downloading.discard(future)
+                        for message_id, path in future.result():
+                            parsing[get_parse_pool().submit(parse_statement_file, path)] = (message_id, path)
+                        continue
+
+                    message_id, path = parsing.pop(future)
+                    try:
+                        batch.add(*future.result())
+                        batch_messages.append(message_id)
+                    except Exception as e:
+                        print(f"Failed to parse {path}: {e}")
+                        self.sync_manager.add_log(f"Error parsing {path}: {e}")
+                        self._release([os.path.basename(path)])
+                        self._fail([message_id])
+                        self._settle(1)
+
+                # Commit full batches, and anything pending once there's nothing left to parse
+                if len(batch) >= self.commit_batch_size or (len(batch) and not parsing):
+                    self._commit(batch, batch_messages)
+                    batch_messages = []
+
+        return self.imported, self.skipped
+
+    def _fail(self, message_ids: List[str]):
+        with self._progress_lock:
+            self.failed.extend(message_ids)
+
+    def _settle(self, count: int, skipped: int = 0):
+        with self._progress_lock:
+            self.done += count
+            self.skipped += skipped
+            self.sync_manager.update_progress(self.done, self.total)
+
+    def _download_slice(self, chunk: List[str]) -> List[Tuple[str, str]]:
+        """
+        Runs in the download pool. Returns [(message_id, saved path)] for the
+        statements that still need importing.
+        """
+        sync_manager = self.sync_manager
+
+        # Messages imported by an earlier sync need no API call at all
+        known = [message_id for message_id in chunk if self.db.is_message_processed(message_id)]
+        if known:
+            sync_manager.add_log(f"Skipping {len(known)} already processed emails")
+
+        # Only the attachment filenames are fetched before deciding what to download
+        parts = self.gmail_service.get_statement_parts([m for m in chunk if m not in known])
+
+        to_download = []
+        settled = []
+        imported = []
+        for message_id, part in parts.items():
+            if part is None:
+                # Kept off the ledger and checked again (metadata only) on the next sync:
+                # it may have been seen half-delivered, or carry a format supported later
+                sync_manager.add_log(f"No target attachment for email {message_id}")
+                settled.append(message_id)
+            elif self.db.is_file_processed(part['filename']):
+                # Already imported (e.g. uploaded by hand); the file on disk is left alone
+                sync_manager.add_log(f"Skipping {part['filename']} (already processed)")
+                settled.append(message_id)
+                imported.append(message_id)
+            else:
+                to_download.append(message_id)
+        for message_id in chunk:
+            if message_id not in known and message_id not in parts:
+                sync_manager.add_log(f"Could not fetch email {message_id}")
+                self._fail([message_id])
+
+        self.db.mark_messages_processed(imported)
+
+        self._claim([parts[message_id]['filename'] for message_id in to_download])
+        saved = self.gmail_service.download_attachments(to_download, self.data_dir, parts=parts)
+
+        ready = []
+        for message_id in to_download:
+            if saved.get(message_id):
+                ready.append((message_id, saved[message_id]))
+            else:
+                sync_manager.add_log(f"Failed to download attachment of email {message_id}")
+                self._release([parts[message_id]['filename']])
+                self._fail([message_id])
+
+        self._settle(len(chunk) - len(ready), skipped=len(known) + len(settled))
+        if ready:
+            sync_manager.add_log(f"Downloaded {len(ready)} new statements")
+        return ready
+
+    def _commit(self, batch: IngestBatch, message_ids: List[str]):
+        filenames = [filename for filename, _, _ in batch.entries]
+        try:
+            batch.commit(self.db)
+        except Exception:
+            self._fail(message_ids)
+            raise
+        finally:
+            self._release(filenames)
+        self.db.mark_messages_processed(message_ids)
+
+        for filename in filenames:
+            self.sync_manager.add_log(f"Successfully processed {filename}")
+        self.imported += len(filenames)
+        self._settle(len(filenames))
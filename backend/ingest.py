@@ -0,0 +1,114 @@
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from backend.models import Transaction
+from backend.statement_parsers import detect_parser
+
+# Parsing statements is CPU bound (BeautifulSoup), so it runs in worker processes
+# instead of on the event loop / sync thread.
+PARSE_WORKERS = min(4, os.cpu_count() or 1)
+
+_parse_pool: Optional[ProcessPoolExecutor] = None
+
+# Called with the filenames of every committed IngestBatch (e.g. to pre-render PDFs)
+_commit_listeners: List[Callable[[List[str]], None]] = []
+
+# Files a writer (upload, Gmail sync) is putting into DATA_DIR and hasn't committed
+# yet, so the watch folder leaves them alone. filename -> number of claims
+_claimed: Dict[str, int] = {}
+_claimed_lock = threading.Lock()
+
+
+def get_parse_pool() -> ProcessPoolExecutor:
+    """
+    Returns the shared statement parsing pool, creating it on first use.
+    """
+    global _parse_pool
+    if _parse_pool is None:
+        _parse_pool = ProcessPoolExecutor(max_workers=PARSE_WORKERS)
+    return _parse_pool
+
+
+def shutdown_parse_pool():
+    global _parse_pool
+    if _parse_pool is not None:
+        _parse_pool.shutdown(wait=False, cancel_futures=True)
+        _parse_pool = None
+
+
+def add_commit_listener(callback: Callable[[List[str]], None]):
+    _commit_listeners.append(callback)
+
+
+def claim_files(filenames: Iterable[str]):
+    """
+    Marks files as being written and ingested; call before writing them into DATA_DIR
+    and release_files() once they are committed (or failed).
+    """
+    with _claimed_lock:
+        for filename in filenames:
+            _claimed[filename] = _claimed.get(filename, 0) + 1
+
+
+def release_files(filenames: Iterable[str]):
+    with _claimed_lock:
+        for filename in filenames:
+            count = _claimed.get(filename, 0) - 1
+            if count > 0:
+                _claimed[filename] = count
+            else:
+                _claimed.pop(filename, None)
+
+
+def is_claimed(filename: str) -> bool:
+    with _claimed_lock:
+        return filename in _claimed
+
+
+def parse_statement_file(file_path: str, filename: str = None) -> Tuple[str, List[Transaction], dict]:
+    """
+    Parses a statement file from disk, filed under `filename` (default: its own
+    name, which differs when `file_path` is a temporary copy).
+    Module level so it can be shipped to the parse pool.
+    Returns (filename, transactions, metadata).
+    """
+    filename = filename or os.path.basename(file_path)
+    parser = detect_parser(file_path)
+    if parser is None:
+        raise ValueError(f"Unrecognised statement format: {filename}")
+
+    metadata = {}
+    transactions = list(parser.iter_transactions(file_path, filename, metadata))
+    return filename, transactions, metadata
+
+
+class IngestBatch:
+    """
+    Collects parsed statements so they can be written with a single
+    XMLDatabase.commit_ingest call instead of one rewrite per file.
+    """
+    def __init__(self):
+        self.entries = []
+
+    def add(self, filename: str, transactions: List[Transaction], metadata: dict):
+        self.entries.append((filename, transactions, metadata or {}))
+
+    def __len__(self):
+        return len(self.entries)
+
+    def commit(self, db) -> dict:
+        """
+        Writes all collected statements to the DB and marks their files processed.
+        Returns {filename: added_count}.
+        """
+        added = db.commit_ingest(self.entries)
+        filenames = [filename for filename, _, _ in self.entries]
+        self.entries = []
+        for callback in _commit_listeners:
+            try:
+                callback(filenames)
+            except Exception as e:
+                print(f"Commit listener failed: {e}")
+        return added
@@ -0,0 +1,124 @@
+import os
+import zipfile
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Iterator, List, Optional
+
+from backend.models import Invoice
+from backend.invoice_pdf_cache import InvoicePdfCache
+from backend.invoice_pdf_generator import generate_invoice_pdf
+from backend.pdf_metrics import last_trace, record
+
+# Rendering is CPU bound, so bulk exports fan out over worker processes
+RENDER_WORKERS = min(4, os.cpu_count() or 1)
+
+_render_pool: Optional[ProcessPoolExecutor] = None
+
+
+def get_render_pool() -> ProcessPoolExecutor:
+    """
+    Returns the shared invoice rendering pool, creating it on first use.
+    """
+    global _render_pool
+    if _render_pool is None:
+        _render_pool = ProcessPoolExecutor(max_workers=RENDER_WORKERS)
+    return _render_pool
+
+
+def shutdown_render_pool():
+    global _render_pool
+    if _render_pool is not None:
+        _render_pool.shutdown(wait=False, cancel_futures=True)
+        _render_pool = None
+
+
+def _render_invoice(invoice: Invoice, issuer: dict):
+    # Runs in the render pool: the timings go back with the PDF
+    pdf = generate_invoice_pdf(invoice, issuer)
+    return pdf, last_trace()
+
+
+def invoice_pdf_filename(invoice: Invoice) -> str:
+    safe_client_name = "".join([c if c.isalnum() else "_" for c in invoice.client_name]).strip("_")
+    date_str = invoice.issue_date.strftime("%Y-%m-%d")
+    return f"Racun_{invoice.number}_{safe_client_name}_{date_str}.pdf"
+
+
+class _ZipStream:
+    """
+    Write-only sink for zipfile: collects what has been written since the last drain.
+    Without tell()/seek() zipfile writes data descriptors and never goes back.
+    """
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def stream_invoice_zip(invoices: List[Invoice], issuer: dict, cache: InvoicePdfCache) -> Iterator[bytes]:
+    """
+    Yields a ZIP of the invoice PDFs while it is being built. Cached PDFs go out first,
+    the rest are rendered in the process pool and added in completion order. At most
+    two renders per worker are in flight, so memory stays flat however many invoices
+    are exported and the client reads.
+    """
+    sink = _ZipStream()
+    archive = zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_DEFLATED, compresslevel=1)
+    names = set()
+    errors = []
+
+    def add(invoice: Invoice, pdf: bytes):
+        name = invoice_pdf_filename(invoice)
+        base, suffix = name[:-4], 2
+        while name in names:
+            name = f"{base}_{suffix}.pdf"
+            suffix += 1
+        names.add(name)
+        archive.writestr(name, pdf)
+
+    pending = deque()
+    for invoice in invoices:
+        key = cache.key(invoice, issuer)
+        pdf = cache.get(key)
+        if pdf is None:
+            pending.append((invoice, key))
+            continue
+        add(invoice, pdf)
+        yield sink.drain()
+
+    pool = get_render_pool() if pending else None
+    window = RENDER_WORKERS * 2
+    rendering = {}
+    while pending or rendering:
+        while pending and len(rendering) < window:
+            invoice, key = pending.popleft()
+            rendering[pool.submit(_render_invoice, invoice, issuer)] = (invoice, key)
+
+        finished, _ = wait(rendering, return_when=FIRST_COMPLETED)
+        for future in finished:
+            invoice, key = rendering.pop(future)
+            try:
+                pdf, timings = future.result()
+            except Exception as e:
+                print(f"Error rendering invoice {invoice.number}: {e}")
+                errors.append(f"{invoice.number}: {e}")
+                continue
+            record(timings)
+            cache.put(key, invoice.id, pdf)
+            add(invoice, pdf)
+            yield sink.drain()
+
+    if errors:
+        archive.writestr("errors.txt", "\n".join(errors) + "\n")
+    archive.close()
+    yield sink.drain()
@@ -0,0 +1,88 @@
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+from backend.models import Invoice
+from backend.invoice_pdf_generator import INVOICE_RENDERER, generate_invoice_pdf
+
+# Part of every key: bump when the invoice layout changes so old renders are dropped
+LAYOUT_VERSION = "2"
+
+# Stored fields that never appear on the PDF; changing them keeps the same render
+NON_RENDERED_FIELDS = {"status", "created_at", "updated_at"}
+
+
+class InvoicePdfCache:
+    """
+    In-memory LRU of rendered invoice PDFs.
+
+    Entries are keyed by a hash of everything that goes into the PDF (the invoice,
+    the issuer snapshot and the renderer), so the key doubles as the ETag. Entries
+    of an invoice are dropped when it is saved or deleted, and everything is
+    dropped when the issuer metadata changes.
+    """
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries = OrderedDict() # key -> (invoice_id, pdf bytes)
+        self._bytes = 0
+
+    @staticmethod
+    def key(invoice: Invoice, issuer: dict) -> str:
+        payload = {
+            "invoice": invoice.model_dump(mode="json", exclude=NON_RENDERED_FIELDS),
+            "issuer": issuer,
+            "renderer": f"{INVOICE_RENDERER}-{LAYOUT_VERSION}",
+        }
+        return hashlib.sha256(json.dumps(payload, sort_keys=True).encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def put(self, key: str, invoice_id: Optional[str], pdf: bytes):
+        with self._lock:
+            if key in self._entries:
+                return
+            self._entries[key] = (invoice_id, pdf)
+            self._bytes += len(pdf)
+            while self._bytes > self.max_bytes and len(self._entries) > 1:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self._bytes -= len(evicted)
+
+    def get_or_render(self, invoice: Invoice, issuer: dict) -> Tuple[str, bytes]:
+        """
+        Returns (key, pdf bytes), rendering on a miss.
+        """
+        key = self.key(invoice, issuer)
+        pdf = self.get(key)
+        if pdf is None:
+            pdf = generate_invoice_pdf(invoice, issuer)
+            self.put(key, invoice.id, pdf)
+        return key, pdf
+
+    def invalidate(self, invoice_id: Optional[str] = None):
+        """
+        Drops the entries of one invoice, or everything when no id is given.
+        """
+        with self._lock:
+            if invoice_id is None:
+                self._entries.clear()
+                self._bytes = 0
+                return
+            for key in [k for k, (owner, _) in self._entries.items() if owner == invoice_id]:
+                _, pdf = self._entries.pop(key)
+                self._bytes -= len(pdf)
+
+    def on_db_change(self, kind: str, key: Optional[str] = None):
+        # XMLDatabase change listener
+        if kind == "invoice":
+            self.invalidate(key)
+        elif kind == "metadata":
+            self.invalidate()
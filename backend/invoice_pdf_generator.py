@@ -2,13 +2,51 @@ try:
     from xhtml2pdf import pisa
 except ImportError:
     pisa = None
+try:
+    from backend.invoice_pdf_native import render_invoice_pdf
+except ImportError:
+    render_invoice_pdf = None
+import hashlib
 import io
 import os
-from datetime import datetime
 from backend.models import Invoice
 from backend.barcode_utils import generate_epc_qr_code
+from backend.pdf_metrics import span, trace
+
+# "native" draws the invoice directly with reportlab, "html" goes through xhtml2pdf
+INVOICE_RENDERER = os.environ.get("POSD_INVOICE_RENDERER", "native")
+
+def _qr_args(invoice: Invoice, issuer: dict):
+    """
+    Arguments for the "Slikaj i plati" QR code, or None when there is nothing to pay.
+    """
+    if not (invoice.total_amount > 0 and issuer.get('iban')):
+        return None
+    clean_number = ''.join(filter(str.isdigit, invoice.number))
+    if not clean_number:
+        clean_number = "0"
+    return dict(
+        iban=issuer.get('iban'),
+        amount=invoice.total_amount,
+        payee_name=issuer.get('name'),
+        payment_reference=f"HR01 {clean_number}",
+        description=f"Placanje racuna {invoice.number}",
+        purpose_code="COST"
+    )
+
+def _reference(invoice: Invoice) -> str:
+    # Stable per invoice, so the same invoice always renders to the same bytes
+    digest = hashlib.sha256((invoice.id or invoice.number).encode("utf-8")).hexdigest()
+    return f"{int(digest[:8], 16) % 1000000:06d}"
 
 def generate_invoice_pdf(invoice: Invoice, issuer: dict) -> bytes:
+    reference = _reference(invoice)
+    with trace("invoice"):
+        if INVOICE_RENDERER == "native" and render_invoice_pdf is not None:
+            return render_invoice_pdf(invoice, issuer, _qr_args(invoice, issuer), reference)
+        return generate_invoice_pdf_html(invoice, issuer, reference)
+
+def generate_invoice_pdf_html(invoice: Invoice, issuer: dict, reference: str) -> bytes:
     if pisa is None:
         raise Exception("PDF generation disabled: xhtml2pdf not installed")
 
@@ -18,21 +56,11 @@ def generate_invoice_pdf(invoice: Invoice, issuer: dict) -> bytes:
     
     # Generate QR Code
     qr_code_b64 = None
-    if invoice.total_amount > 0 and issuer.get('iban'):
+    qr_args = _qr_args(invoice, issuer)
+    if qr_args:
         try:
-            clean_number = ''.join(filter(str.isdigit, invoice.number))
-            if not clean_number:
-                clean_number = "0"
-            reference = f"HR01 {clean_number}"
-            
-            qr_code_b64 = generate_epc_qr_code(
-                iban=issuer.get('iban'),
-                amount=invoice.total_amount,
-                payee_name=issuer.get('name'),
-                payment_reference=reference,
-                description=f"Placanje racuna {invoice.number}",
-                purpose_code="COST"
-            )
+            with span("qr"):
+                qr_code_b64 = generate_epc_qr_code(**qr_args)
         except Exception as e:
             print(f"QR Code generation failed: {e}")
 
@@ -200,7 +228,7 @@ def generate_invoice_pdf(invoice: Invoice, issuer: dict) -> bytes:
                 <td width="50%" class="text-right">
                     <div class="text-3xl font-light text-slate-300 uppercase" style="letter-spacing: 2px;">Račun</div>
                     <div class="text-sm font-bold text-slate-700">Broj: {invoice.number}</div>
-                    <div class="text-xs text-slate-500">Ref: {datetime.now().strftime('%f')[:6]}</div>
+                    <div class="text-xs text-slate-500">Ref: {reference}</div>
                 </td>
             </tr>
         </table>
@@ -318,12 +346,13 @@ def generate_invoice_pdf(invoice: Invoice, issuer: dict) -> bytes:
     
     # Generate PDF
     output_buffer = io.BytesIO()
-    pisa_status = pisa.CreatePDF(
-        html_content,
-        dest=output_buffer,
-        encoding='utf-8',
-        link_callback=link_callback
-    )
+    with span("pisa"):
+        pisa_status = pisa.CreatePDF(
+            html_content,
+            dest=output_buffer,
+            encoding='utf-8',
+            link_callback=link_callback
+        )
     
     if pisa_status.err:
         raise Exception("Error generating PDF invoice")
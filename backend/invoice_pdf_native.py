@@ -0,0 +1,365 @@
+import io
+import os
+import threading
+from contextlib import contextmanager
+from reportlab import rl_config
+from reportlab.lib.colors import HexColor, black, white
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.units import cm
+from reportlab.lib.utils import simpleSplit
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.pdfgen import canvas
+from backend.models import Invoice
+from backend.barcode_utils import make_epc_qr
+from backend.pdf_metrics import span
+
+# Same layout as the HTML template in invoice_pdf_generator, drawn straight onto a
+# reportlab canvas: no CSS parsing, font lookups or layout engine per invoice.
+# The static parts (header, labels, footer) cost well under a millisecond to draw,
+# so they are drawn with the rest rather than overlaid from a cached page: merging
+# pages with pypdf costs several times a whole render.
+
+FONT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fonts")
+
+REGULAR = "DejaVuSans"
+BOLD = "DejaVuSans-Bold"
+
+_fonts_lock = threading.Lock()
+_fonts_registered = False
+
+_a85_lock = threading.Lock()
+_a85_users = 0
+_a85_saved = None
+
+SLATE_900 = HexColor("#0f172a")
+SLATE_800 = HexColor("#1e293b")
+SLATE_700 = HexColor("#334155")
+SLATE_500 = HexColor("#64748b")
+SLATE_400 = HexColor("#94a3b8")
+SLATE_300 = HexColor("#cbd5e1")
+SLATE_200 = HexColor("#e2e8f0")
+INDIGO_600 = HexColor("#4f46e5")
+
+PAGE_WIDTH, PAGE_HEIGHT = A4
+MARGIN = 1.5 * cm
+LEFT = MARGIN
+RIGHT = PAGE_WIDTH - MARGIN
+WIDTH = RIGHT - LEFT
+TOP = PAGE_HEIGHT - MARGIN
+BOTTOM = MARGIN
+
+# Distance from the top of a 1.5x line box to the baseline, as a fraction of the font size
+BASELINE = 0.718
+
+# Items table: (title, share of the width, right aligned)
+ITEM_COLUMNS = [
+    ("Opis Usluge / Proizvoda", 0.40, False),
+    ("Kol.", 0.15, True),
+    ("Cijena", 0.15, True),
+    ("Popust", 0.10, True),
+    ("Ukupno", 0.20, True),
+]
+ROW_PADDING = 7.5
+
+
+def register_fonts():
+    """
+    Registers the DejaVu fonts with reportlab. Only the first call per process
+    does any work.
+    """
+    global _fonts_registered
+    if _fonts_registered:
+        return
+    with _fonts_lock:
+        if not _fonts_registered:
+            pdfmetrics.registerFont(TTFont(REGULAR, os.path.join(FONT_DIR, "DejaVuSans.ttf")))
+            pdfmetrics.registerFont(TTFont(BOLD, os.path.join(FONT_DIR, "DejaVuSans-Bold.ttf")))
+            _fonts_registered = True
+
+
+@contextmanager
+def binary_streams():
+    """
+    PDFs built inside the block write their streams as plain binary. ASCII85 only
+    makes them 25% larger and, without reportlab's optional C accelerators, is
+    encoded in pure Python on every save. reportlab has no per-canvas setting, so
+    rl_config.useA85 is switched off while any such block runs and then restored.
+    """
+    global _a85_users, _a85_saved
+    with _a85_lock:
+        if _a85_users == 0:
+            _a85_saved = rl_config.useA85
+            rl_config.useA85 = 0
+        _a85_users += 1
+    try:
+        yield
+    finally:
+        with _a85_lock:
+            _a85_users -= 1
+            if _a85_users == 0:
+                rl_config.useA85 = _a85_saved
+
+
+class _InvoiceCanvas:
+    """
+    Top-down drawing helpers: `y` is the top of the next block.
+    """
+    def __init__(self, buffer):
+        self.c = canvas.Canvas(buffer, pagesize=A4, invariant=1)
+        self.y = TOP
+
+    def text(self, x, top, value, font=REGULAR, size=10, color=SLATE_900, align="left", spacing=0):
+        self.c.setFont(font, size)
+        self.c.setFillColor(color)
+        baseline = top - BASELINE * size
+        if align == "right":
+            self.c.drawRightString(x, baseline, value, charSpace=spacing)
+        elif align == "center":
+            self.c.drawCentredString(x, baseline, value, charSpace=spacing)
+        else:
+            self.c.drawString(x, baseline, value, charSpace=spacing)
+
+    def lines(self, x, top, lines, font=REGULAR, size=8, color=SLATE_500, leading=None, align="left"):
+        leading = leading or size * 1.5
+        for i, line in enumerate(lines):
+            self.text(x, top - i * leading, line, font, size, color, align)
+        return len(lines) * leading
+
+    def rule(self, y, x1=None, x2=None):
+        self.c.setStrokeColor(SLATE_200)
+        self.c.setLineWidth(0.75)
+        self.c.line(LEFT if x1 is None else x1, y, RIGHT if x2 is None else x2, y)
+
+    def new_page(self):
+        self.c.showPage()
+        self.y = TOP
+
+
+def _wrap(value, font, size, width):
+    return simpleSplit(str(value or ""), font, size, width) or [""]
+
+
+def _draw_header(pdf: _InvoiceCanvas, invoice: Invoice, issuer: dict, reference: str):
+    c = pdf.c
+    top = pdf.y
+
+    # Logo box with the issuer name next to it
+    c.setFillColor(INDIGO_600)
+    c.roundRect(LEFT, top - 26.25, 40, 26.25, 3, stroke=0, fill=1)
+    pdf.text(LEFT + 20, top - 3.75, "P", BOLD, 14, white, align="center")
+    pdf.text(LEFT + 47.5, top - 2.625, str(issuer.get('name')), BOLD, 14, SLATE_900)
+
+    pdf.text(RIGHT, top, "RAČUN", REGULAR, 24, SLATE_300, align="right", spacing=1.5)
+    pdf.text(RIGHT, top - 66, f"Broj: {invoice.number}", BOLD, 9, SLATE_700, align="right")
+    pdf.text(RIGHT, top - 109.5, f"Ref: {reference}", REGULAR, 8, SLATE_500, align="right")
+
+    pdf.y = top - 121.5 - 30
+
+
+def _draw_parties(pdf: _InvoiceCanvas, invoice: Invoice, issuer: dict):
+    column = WIDTH / 2
+    blocks = [
+        ("Izdavatelj", issuer.get('name'), [
+            issuer.get('address'),
+            f"OIB: {issuer.get('oib')}",
+            f"IBAN: {issuer.get('iban')}",
+        ]),
+        ("Za Korisnika", invoice.client_name, [
+            invoice.client_address,
+            f"{invoice.client_zip} {invoice.client_city}",
+            f"OIB: {invoice.client_oib}",
+        ]),
+    ]
+
+    height = 0
+    for i, (label, name, details) in enumerate(blocks):
+        x = LEFT + i * column
+        top = pdf.y
+        pdf.text(x, top, label.upper(), BOLD, 8, SLATE_400, spacing=0.75)
+        top -= 12 + 6
+        name_lines = _wrap(name, BOLD, 9, column - 10)
+        top -= pdf.lines(x, top, name_lines, BOLD, 9, SLATE_800) + 3
+        detail_lines = [line for detail in details for line in _wrap(detail, REGULAR, 8, column - 10)]
+        top -= pdf.lines(x, top, detail_lines, REGULAR, 8, SLATE_500, leading=12.8)
+        height = max(height, pdf.y - top)
+
+    pdf.y -= height + 30
+
+
+def _draw_dates(pdf: _InvoiceCanvas, invoice: Invoice):
+    column = WIDTH / 4
+    top = pdf.y
+    fields = [
+        ("Datum Izdavanja", invoice.issue_date.strftime('%d.%m.%Y.'), SLATE_900),
+        ("Datum Dospijeća", invoice.due_date.strftime('%d.%m.%Y.'), INDIGO_600),
+        ("Način Plaćanja", "Transakcijski račun", SLATE_900),
+        ("Valuta", "EUR", SLATE_900),
+    ]
+    for i, (label, value, color) in enumerate(fields):
+        x = LEFT + i * column
+        pdf.text(x, top - 11.25, label.upper(), BOLD, 8, SLATE_400)
+        pdf.text(x, top - 26.25, value, BOLD, 9, color)
+
+    pdf.rule(top)
+    pdf.rule(top - 51)
+    pdf.y = top - 51 - 22.5
+
+
+def _column_edges():
+    edges = []
+    x = LEFT
+    for title, share, right in ITEM_COLUMNS:
+        edges.append((x, x + WIDTH * share, right))
+        x += WIDTH * share
+    return edges
+
+
+def _draw_items_header(pdf: _InvoiceCanvas):
+    for (title, _, _), (x1, x2, right) in zip(ITEM_COLUMNS, _column_edges()):
+        if right:
+            pdf.text(x2, pdf.y, title.upper(), BOLD, 8, SLATE_400, align="right")
+        else:
+            pdf.text(x1, pdf.y, title.upper(), BOLD, 8, SLATE_400)
+    pdf.y -= 12 + 7.5
+    pdf.rule(pdf.y)
+
+
+def _draw_items(pdf: _InvoiceCanvas, invoice: Invoice):
+    edges = _column_edges()
+    desc_x1, desc_x2, _ = edges[0]
+    _draw_items_header(pdf)
+
+    for item in invoice.items:
+        line_total = item.quantity * item.price * (1 - (item.discount or 0) / 100)
+        description = _wrap(item.description, REGULAR, 10, desc_x2 - desc_x1 - 4)
+        row_height = ROW_PADDING * 2 + 15 * len(description)
+
+        if pdf.y - row_height < BOTTOM:
+            pdf.new_page()
+            _draw_items_header(pdf)
+
+        top = pdf.y
+        pdf.lines(desc_x1, top - ROW_PADDING, description, REGULAR, 10, SLATE_800, leading=15)
+
+        # Single-line cells are vertically centred in the row
+        middle = top - row_height / 2 + 7.5
+        cells = [
+            (str(item.quantity), SLATE_900),
+            (f"{item.price:.2f} €", SLATE_900),
+            (f"{item.discount}%" if item.discount else "-", SLATE_400),
+            (f"{line_total:.2f} €", SLATE_800),
+        ]
+        for (value, color), (_, x2, _) in zip(cells, edges[1:]):
+            pdf.text(x2, middle, value, REGULAR, 10, color, align="right")
+
+        pdf.y -= row_height
+        pdf.rule(pdf.y)
+
+    pdf.y -= 22.5
+
+
+def _draw_qr(pdf: _InvoiceCanvas, qr, x, top):
+    c = pdf.c
+    c.setFillColor(white)
+    c.setStrokeColor(SLATE_200)
+    c.setLineWidth(0.75)
+    c.roundRect(x, top - 109, 92.5, 109, 5.625, stroke=1, fill=1)
+    pdf.text(x + 46.25, top - 10.75, "SLIKAJ I PLATI", BOLD, 8, SLATE_400, align="center")
+
+    # Vector modules, one rectangle per dark run, emitted as a single path in module
+    # units (integer operators instead of ~500 formatted rect() calls)
+    size = 75
+    border = qr.default_border_size
+    modules = len(qr.matrix) + 2 * border
+    ops = []
+    for row_index, row in enumerate(qr.matrix):
+        y = modules - border - row_index - 1
+        run_start = None
+        for col_index, dark in enumerate(list(row) + [0]):
+            if dark and run_start is None:
+                run_start = col_index
+            elif not dark and run_start is not None:
+                ops.append(f"{run_start + border} {y} {col_index - run_start} 1 re")
+                run_start = None
+
+    c.saveState()
+    c.translate(x + 8.25, top - 109 + 8.25)
+    c.scale(size / modules, size / modules)
+    c.setFillColor(black)
+    c.addLiteral("\n".join(ops) + "\nf")
+    c.restoreState()
+
+
+def _draw_totals(pdf: _InvoiceCanvas, invoice: Invoice, qr):
+    # QR box, totals and notes stay together
+    if pdf.y - 111.5 - 37.5 - 80 < BOTTOM:
+        pdf.new_page()
+
+    top = pdf.y
+    if qr is not None:
+        _draw_qr(pdf, qr, LEFT, top)
+
+    x = LEFT + WIDTH / 2
+    label_right = x + WIDTH / 2 - 100
+    tax_rate = (invoice.tax_total / invoice.subtotal * 100) if invoice.subtotal else 25
+
+    pdf.text(label_right, top - 3, "Iznos bez PDV-a:", REGULAR, 9, SLATE_500, align="right")
+    pdf.text(RIGHT, top - 3, f"{invoice.subtotal:.2f} €", BOLD, 10, SLATE_800, align="right")
+    pdf.text(label_right, top - 24, f"PDV ({tax_rate:.0f}%):", REGULAR, 9, SLATE_500, align="right")
+    pdf.text(RIGHT, top - 24, f"{invoice.tax_total:.2f} €", REGULAR, 9, SLATE_500, align="right")
+    pdf.rule(top - 40.5, x, RIGHT)
+    pdf.text(label_right, top - 48, "Za platiti:", BOLD, 12, SLATE_900, align="right")
+    pdf.text(RIGHT, top - 48, f"{invoice.total_amount:.2f} €", BOLD, 12, INDIGO_600, align="right")
+
+    pdf.y = top - 111.5 - 37.5
+
+
+def _draw_notes(pdf: _InvoiceCanvas, invoice: Invoice):
+    notes = _wrap(invoice.notes, REGULAR, 8, WIDTH)
+    if pdf.y - 15.75 - 18 - 12 * len(notes) - 27 < BOTTOM:
+        pdf.new_page()
+
+    pdf.rule(pdf.y)
+    top = pdf.y - 15.75
+    pdf.text(LEFT, top, "NAPOMENA:", BOLD, 8, SLATE_500)
+    top -= 18
+    top -= pdf.lines(LEFT, top, notes, REGULAR, 8, SLATE_400, leading=12)
+
+    top -= 15
+    prefix = "Generirano putem "
+    pdf.text(LEFT, top, prefix, REGULAR, 8, SLATE_400)
+    pdf.text(LEFT + pdfmetrics.stringWidth(prefix, REGULAR, 8), top, "PO-SD App", BOLD, 8, INDIGO_600)
+    pdf.text(RIGHT, top, "Hvala na povjerenju!", REGULAR, 8, SLATE_400, align="right")
+
+
+def render_invoice_pdf(invoice: Invoice, issuer: dict, qr_args: dict = None, reference: str = "") -> bytes:
+    """
+    Renders the invoice with reportlab. `qr_args` are the make_epc_qr arguments
+    (None leaves the QR code out).
+    """
+    with span("fonts"):
+        register_fonts()
+
+    qr = None
+    if qr_args:
+        try:
+            with span("qr"):
+                qr = make_epc_qr(**qr_args)
+        except Exception as e:
+            print(f"QR Code generation failed: {e}")
+
+    buffer = io.BytesIO()
+    with binary_streams():
+        with span("layout"):
+            pdf = _InvoiceCanvas(buffer)
+            pdf.c.setTitle(f"Račun {invoice.number}")
+            _draw_header(pdf, invoice, issuer, reference)
+            _draw_parties(pdf, invoice, issuer)
+            _draw_dates(pdf, invoice)
+            _draw_items(pdf, invoice)
+            _draw_totals(pdf, invoice, qr)
+            _draw_notes(pdf, invoice)
+        with span("write"):
+            pdf.c.save()
+    return buffer.getvalue()
@@ -1,26 +1,38 @@
-from fastapi import FastAPI, HTTPException, Query, BackgroundTasks, UploadFile
+from fastapi import FastAPI, HTTPException, Query, BackgroundTasks, UploadFile, Header
 from fastapi.middleware.cors import CORSMiddleware
 from typing import List, Optional
 from pydantic import BaseModel
 import os
 import sys
 from datetime import datetime
+from contextlib import ExitStack
 
 from backend.models import Transaction, TransactionType, TransactionCategory, POSDData, Settings, Client, Invoice, InvoiceStatus
 from backend.database import XMLDatabase
-from backend.erste_parser import parse_erste_html
-from backend.gmail_service import GmailService
+from backend.ingest import IngestBatch, add_commit_listener, claim_files, get_parse_pool, parse_statement_file, release_files, shutdown_parse_pool
+from backend.watcher import StatementWatcher
+from backend.gmail_sync import GmailSyncPipeline
+from backend.scheduler import PeriodicJob
+from backend.pdf_pool import SANDBOX_JOB_TIMEOUT, get_pdf_pool, get_sandbox_pool, shutdown_pdf_pool, shutdown_sandbox_pool
+from backend.pdf_cache import PdfCache
+from backend.invoice_pdf_cache import InvoicePdfCache
+from backend.invoice_export import invoice_pdf_filename, shutdown_render_pool, stream_invoice_zip
+from backend.pdf_jobs import PRIORITY_BATCH, PRIORITY_INTERACTIVE, PdfJobQueue
+from backend.pdf_metrics import METRICS, span, trace
+from backend.gmail_service import GmailService, DEFAULT_QUERY as DEFAULT_GMAIL_QUERY
 from backend.xml_generator import generate_posd_xml
 from backend.sudreg import SudregAPI
 from backend.vies import ViesAPI
 from backend.barcode_utils import generate_epc_qr_code
 from backend.memorandum_generator import generate_memorandum_pdf
-from backend.invoice_pdf_generator import generate_invoice_pdf
-from fastapi.responses import Response
-from pypdf import PdfWriter
-# from pypdf import PdfWriter # Duplicate removed
+from fastapi.responses import FileResponse, Response, StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from backend.pdf_merge import ChunkPipe, StreamingPdfMerger
 import io
 import json
+import shutil
+import tempfile
+import time
 
 app = FastAPI(title="PO-SD App API")
 # Reload trigger: Dependency fixed
@@ -40,9 +52,62 @@ DB_PATH = os.path.join(DATA_DIR, "transactions.xml")
 CREDENTIALS_PATH = os.path.join(os.getcwd(), "credentials.json")
 TOKEN_PATH = os.path.join(DATA_DIR, "token.json")
 
+# Import statements dropped into DATA_DIR by other tooling (set to 0 to disable)
+WATCH_DATA_DIR = os.environ.get("POSD_WATCH_DATA_DIR", "1") == "1"
+
+# Gmail batch requests: calls per batch (max 100) and batches in flight at once
+GMAIL_BATCH_SIZE = int(os.environ.get("POSD_GMAIL_BATCH_SIZE", "100"))
+GMAIL_BATCH_CONCURRENCY = int(os.environ.get("POSD_GMAIL_BATCH_CONCURRENCY", "4"))
+# Gmail per-user quota budget (units/s) shared by all download threads
+GMAIL_QUOTA_UNITS_PER_SECOND = float(os.environ.get("POSD_GMAIL_QUOTA_UNITS", "250"))
+# Statements parsed from Gmail are written to the DB this many at a time
+GMAIL_COMMIT_BATCH_SIZE = 25
+# Point the Gmail client at another API root (e.g. scripts/fake_gmail_server.py for load tests)
+GMAIL_API_ENDPOINT = os.environ.get("POSD_GMAIL_API_ENDPOINT")
+# Background incremental Gmail sync (seconds, 0 disables); the first run follows startup
+GMAIL_SYNC_INTERVAL = int(os.environ.get("POSD_GMAIL_SYNC_INTERVAL", "3600"))
+GMAIL_SYNC_INITIAL_DELAY = 60
+
+# Rendered statement PDFs, keyed by content hash (LRU beyond the size limit)
+PDF_CACHE_DIR = os.path.join(DATA_DIR, "pdf_cache")
+PDF_CACHE_MAX_MB = int(os.environ.get("POSD_PDF_CACHE_MAX_MB", "512"))
+# Pre-render newly imported statements in the background, at most this many queued
+WARM_PDF_CACHE = os.environ.get("POSD_WARM_PDF_CACHE", "1") == "1"
+WARM_PDF_CACHE_MAX = int(os.environ.get("POSD_WARM_PDF_CACHE_MAX", "50"))
+# Rendered invoice PDFs kept in memory
+INVOICE_PDF_CACHE_MAX_MB = int(os.environ.get("POSD_INVOICE_PDF_CACHE_MAX_MB", "64"))
+# Background PDF jobs (/api/pdf-jobs): concurrent jobs, and how long results are kept
+PDF_JOB_DIR = os.path.join(DATA_DIR, "pdf_jobs")
+PDF_JOB_WORKERS = int(os.environ.get("POSD_PDF_JOB_WORKERS", "2"))
+PDF_JOB_TTL = int(os.environ.get("POSD_PDF_JOB_TTL", "3600"))
+# Largest client-supplied document /api/documents/html-to-pdf will render
+HTML_TO_PDF_MAX_KB = int(os.environ.get("POSD_HTML_TO_PDF_MAX_KB", "2048"))
+
 # Initialize DB
 db = XMLDatabase(DB_PATH)
-gmail_service = GmailService(CREDENTIALS_PATH, TOKEN_PATH)
+gmail_service = GmailService(
+    CREDENTIALS_PATH, TOKEN_PATH,
+    batch_size=GMAIL_BATCH_SIZE,
+    batch_concurrency=GMAIL_BATCH_CONCURRENCY,
+    quota_units_per_second=GMAIL_QUOTA_UNITS_PER_SECOND,
+    api_endpoint=GMAIL_API_ENDPOINT
+)
+statement_watcher = StatementWatcher(DATA_DIR, db)
+pdf_cache = PdfCache(PDF_CACHE_DIR, PDF_CACHE_MAX_MB * 1024 * 1024, get_pdf_pool, warm_limit=WARM_PDF_CACHE_MAX)
+
+def warm_pdf_cache(filenames: List[str]):
+    if WARM_PDF_CACHE and pisa is not None:
+        # Statement names start with their date: sorted, the newest are queued last and
+        # are the ones kept when a big sync overflows the warm queue
+        pdf_cache.warm([os.path.join(DATA_DIR, f) for f in sorted(filenames) if f.lower().endswith(".html")])
+
+add_commit_listener(warm_pdf_cache)
+
+invoice_pdf_cache = InvoicePdfCache(INVOICE_PDF_CACHE_MAX_MB * 1024 * 1024)
+db.add_change_listener(invoice_pdf_cache.on_db_change)
+
+pdf_jobs = PdfJobQueue(PDF_JOB_DIR, workers=PDF_JOB_WORKERS, ttl=PDF_JOB_TTL)
+pdf_jobs_sweeper = PeriodicJob("pdf-job-sweeper", 60, pdf_jobs.expire, jitter=0)
 
 # Initialize Sudreg API
 SUDREG_CREDS_PATH = os.path.join(os.getcwd(), "backend", "sudreg_credentials.json")
@@ -62,54 +127,158 @@ if os.path.exists(SUDREG_CREDS_PATH):
 # Initialize VIES API (No credentials needed)
 vies_api = ViesAPI()
 
+@app.on_event("startup")
+def start_background_workers():
+    if WATCH_DATA_DIR:
+        statement_watcher.start()
+    if pisa is not None:
+        # Start the PDF workers now so the first merge doesn't pay for xhtml2pdf imports
+        get_pdf_pool()
+    if GMAIL_SYNC_INTERVAL > 0:
+        gmail_sync_job.start()
+    pdf_jobs.start()
+    pdf_jobs_sweeper.start()
+
+@app.on_event("shutdown")
+def shutdown_workers():
+    gmail_sync_job.stop()
+    pdf_jobs_sweeper.stop()
+    pdf_jobs.stop()
+    if WATCH_DATA_DIR:
+        statement_watcher.stop()
+    shutdown_parse_pool()
+    pdf_cache.shutdown()
+    shutdown_render_pool()
+    shutdown_pdf_pool()
+    shutdown_sandbox_pool()
+
 
 # Sync Manager for SSE
 import asyncio
+import threading
+from collections import deque
 from sse_starlette.sse import EventSourceResponse
 
+# Recent sync log lines kept for clients that connect mid-sync
+SYNC_LOG_BUFFER = 500
+# Events queued per SSE client before it is considered lagging and resynced
+SYNC_SUBSCRIBER_QUEUE = 1000
+
 class SyncManager:
+    """
+    Sync state plus a small pub/sub for /api/sync/events.
+    Updates come from the sync threads; each SSE client has its own asyncio.Queue
+    on the event loop, fed with call_soon_threadsafe. A client gets a snapshot
+    (with the last SYNC_LOG_BUFFER log lines) when it connects and only deltas after that.
+    """
     def __init__(self):
         self.status = "idle" # idle, running, completed, error
-        self.logs = []
+        self.logs = deque(maxlen=SYNC_LOG_BUFFER)
         self.progress = 0
         self.total = 0
-        self.listeners = []
+        self._lock = threading.Lock()
+        self._subscribers = {} # queue -> event loop
 
     def reset(self):
-        self.status = "idle"
-        self.logs = []
-        self.progress = 0
-        self.total = 0
-        self._notify()
+        with self._lock:
+            self.status = "idle"
+            self.logs.clear()
+            self.progress = 0
+            self.total = 0
+        self._publish(None)
+
+    def try_start(self) -> bool:
+        """
+        Atomically claims the manager for a new sync (manual or scheduled).
+        Returns False if one is already running.
+        """
+        with self._lock:
+            if self.status == "running":
+                return False
+            self.status = "running"
+            self.logs.clear()
+            self.progress = 0
+            self.total = 0
+        self._publish(None)
+        return True
 
     def add_log(self, message: str):
-        self.logs.append({"timestamp": datetime.now().isoformat(), "message": message})
-        self._notify()
+        entry = {"timestamp": datetime.now().isoformat(), "message": message}
+        with self._lock:
+            self.logs.append(entry)
+        self._publish({"event": "log", "data": json.dumps(entry)})
 
     def set_status(self, status: str):
-        self.status = status
-        self._notify()
+        with self._lock:
+            self.status = status
+        self._publish({"event": "status", "data": json.dumps({"status": status})})
     
     def update_progress(self, current: int, total: int):
-        self.progress = current
-        self.total = total
-        self._notify()
-
-    def _notify(self):
-        # In a real async scenario we might queue this
-        pass
-
-    async def event_generator(self):
-        while True:
-            # Yield current state
-            data = {
+        with self._lock:
+            if (current, total) == (self.progress, self.total):
+                return
+            self.progress = current
+            self.total = total
+        self._publish({"event": "progress", "data": json.dumps({"progress": current, "total": total})})
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
                 "status": self.status,
-                "logs": self.logs,
+                "logs": list(self.logs),
                 "progress": self.progress,
                 "total": self.total
             }
-            yield {"data": json.dumps(data)}
-            await asyncio.sleep(1) # Simple polling for now, or use a queue/event
+
+    def _snapshot_event(self) -> dict:
+        return {"event": "snapshot", "data": json.dumps(self.snapshot())}
+
+    def subscribe(self) -> asyncio.Queue:
+        queue = asyncio.Queue(maxsize=SYNC_SUBSCRIBER_QUEUE)
+        with self._lock:
+            self._subscribers[queue] = asyncio.get_running_loop()
+        queue.put_nowait(self._snapshot_event())
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        with self._lock:
+            self._subscribers.pop(queue, None)
+
+    def _publish(self, event: Optional[dict]):
+        # event=None means the state was replaced: everyone gets a fresh snapshot
+        with self._lock:
+            subscribers = list(self._subscribers.items())
+        for queue, loop in subscribers:
+            try:
+                loop.call_soon_threadsafe(self._deliver, queue, event)
+            except RuntimeError:
+                # Event loop already closed
+                self.unsubscribe(queue)
+
+    def _deliver(self, queue: asyncio.Queue, event: Optional[dict]):
+        # Runs on the event loop
+        if event is None:
+            self._drain(queue)
+            event = self._snapshot_event()
+        try:
+            queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # Slow client: drop its backlog and resync it from a snapshot
+            self._drain(queue)
+            queue.put_nowait(self._snapshot_event())
+
+    @staticmethod
+    def _drain(queue: asyncio.Queue):
+        while not queue.empty():
+            queue.get_nowait()
+
+    async def event_generator(self):
+        queue = self.subscribe()
+        try:
+            while True:
+                yield await queue.get()
+        finally:
+            self.unsubscribe(queue)
 
 sync_manager = SyncManager()
 import json
@@ -162,61 +331,117 @@ def sync_local_file(file_path: str):
          raise HTTPException(status_code=404, detail="File not found")
     
     try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            content = f.read()
-        
-        filename = os.path.basename(file_path)
-        new_txs, metadata = parse_erste_html(content, source_filename=filename)
-        added_count = db.save_transactions(new_txs)
-        db.save_metadata(metadata)
+        filename, new_txs, metadata = parse_statement_file(file_path)
+        batch = IngestBatch()
+        batch.add(filename, new_txs, metadata)
+        added_count = batch.commit(db)[filename]
         return {"status": "success", "added": added_count, "metadata_found": bool(metadata), "total_found": len(new_txs)}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.post("/api/transactions/upload")
-async def upload_transactions(files: List[UploadFile]):
-    total_added = 0
-    total_found = 0
-    results = []
+UPLOAD_CHUNK_SIZE = 1024 * 1024
 
-    for file in files:
+def _store_upload(upload: UploadFile, filename: str) -> str:
+    """
+    Copies the upload to a temporary file in DATA_DIR and returns its path. Hidden,
+    so the watch folder leaves it alone.
+    """
+    # Copy in chunks so large statements never sit in memory as one bytes object
+    upload.file.seek(0)
+    with tempfile.NamedTemporaryFile(dir=DATA_DIR, prefix=".upload-", suffix=os.path.splitext(filename)[1], delete=False) as f:
         try:
-            content = await file.read()
-            # Decode using utf-8, assuming Erste export is utf-8
-            html_content = content.decode('utf-8')
-            new_txs, metadata = parse_erste_html(html_content, source_filename=file.filename)
-            added = db.save_transactions(new_txs)
-            db.save_metadata(metadata)
-            
-            # Save the file to DATA_DIR so we can serve it later
-            save_path = os.path.join(DATA_DIR, file.filename)
-            with open(save_path, "wb") as f:
-                f.write(content)
-            db.mark_file_processed(file.filename)
-            
-            total_added += added
-            total_found += len(new_txs)
-            
-            results.append({
-                "filename": file.filename,
-                "status": "success",
-                "added": added,
-                "found": len(new_txs)
-            })
+            shutil.copyfileobj(upload.file, f, UPLOAD_CHUNK_SIZE)
+        except Exception:
+            f.close()
+            os.remove(f.name)
+            raise
+    return f.name
+
+@app.post("/api/transactions/upload")
+async def upload_transactions(files: List[UploadFile], stream: bool = False):
+    """
+    Stores the uploaded statements in DATA_DIR, parses them concurrently in the
+    parse pool and commits everything in one batch at the end.
+    With stream=true the response is NDJSON: one line per file as soon as it is
+    parsed, followed by the final summary line.
+    """
+    loop = asyncio.get_running_loop()
+
+    async def ingest_one(file: UploadFile, duplicate: bool):
+        filename = os.path.basename(file.filename or "")
+        if not filename:
+            return {"filename": file.filename, "status": "error", "error": "Missing filename"}, None
+        if duplicate:
+            return {"filename": filename, "status": "error", "error": "Duplicate filename in this upload"}, None
+        tmp_path = None
+        try:
+            # Parsed from a temporary copy: only a statement that parses replaces
+            # the file (and a good statement imported earlier under its name)
+            tmp_path = await run_in_threadpool(_store_upload, file, filename)
+            parsed = await loop.run_in_executor(get_parse_pool(), parse_statement_file, tmp_path, filename)
+            os.replace(tmp_path, os.path.join(DATA_DIR, filename))
+            tmp_path = None
+            return {"filename": filename, "status": "parsed", "found": len(parsed[1])}, parsed
         except Exception as e:
-            results.append({
-                "filename": file.filename,
-                "status": "error",
-                "error": str(e)
-            })
-    
-    return {
-        "summary": {
-            "total_added": total_added,
-            "total_found": total_found
-        },
-        "details": results
-    }
+            return {"filename": filename, "status": "error", "error": str(e)}, None
+        finally:
+            if tmp_path and os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    async def process():
+        batch = IngestBatch()
+        results = []
+        names = [os.path.basename(f.filename or "") for f in files]
+        # Files sharing a name would overwrite each other; the first one is imported
+        seen = set()
+        duplicates = []
+        for name in names:
+            duplicates.append(name in seen)
+            seen.add(name)
+        # Keeps the watch folder off the files until they are committed here
+        claim_files(names)
+        try:
+            for next_done in asyncio.as_completed([ingest_one(f, duplicate) for f, duplicate in zip(files, duplicates)]):
+                result, parsed = await next_done
+                if parsed:
+                    batch.add(*parsed)
+                results.append(result)
+                yield result
+
+            added = await run_in_threadpool(batch.commit, db) if len(batch) else {}
+        finally:
+            release_files(names)
+
+        total_added = 0
+        total_found = 0
+        for result in results:
+            if result["status"] == "parsed":
+                result["status"] = "success"
+                result["added"] = added.get(result["filename"], 0)
+                total_added += result["added"]
+                total_found += result["found"]
+
+        yield {
+            "summary": {
+                "total_added": total_added,
+                "total_found": total_found
+            },
+            "details": results
+        }
+
+    if stream:
+        async def ndjson():
+            async for line in process():
+                yield json.dumps(line) + "\n"
+        return StreamingResponse(ndjson(), media_type="application/x-ndjson")
+
+    response = None
+    async for response in process():
+        pass
+    return response
+
+# Chunks of a merge queued between the merge thread and the response
+MERGE_STREAM_CHUNKS = 8
 
 class MergeRequest(BaseModel):
     filenames: List[str]
@@ -226,72 +451,80 @@ try:
 except ImportError:
     pisa = None
 
-@app.post("/api/documents/merge")
-def merge_documents(req: MergeRequest):
+def _merge_statements(filenames: List[str], output, progress=None):
+    """
+    Merges the statements into one PDF written to the `output` file object.
+    `progress(current, total)` is called as files are appended. Each statement is
+    written to `output` as soon as it is appended, so memory doesn't grow with the
+    number of statements. Nothing is written when none of them can be merged.
+    """
     if pisa is None:
         raise HTTPException(status_code=501, detail="PDF generation is currently disabled due to missing system dependencies.")
-    print(f"Received merge request for {len(req.filenames)} files")
-    merger = PdfWriter()
-    found_any = False
-    
-    # Create temp directory for PDFs if not exists
-    temp_pdf_dir = os.path.join(DATA_DIR, "temp_pdfs")
-    os.makedirs(temp_pdf_dir, exist_ok=True)
-    
-    generated_temp_files = []
-    import subprocess
-    import uuid
+    print(f"Received merge request for {len(filenames)} files")
+    with trace("merge"), ExitStack() as pins:
+        # HTML statements come from the rendered-PDF cache; misses render in parallel on the worker pool
+        with span("render"):
+            sources = []
+            for filename in filenames:
+                file_path = os.path.join(DATA_DIR, filename)
+                if os.path.exists(file_path):
+                    sources.append((filename, file_path))
+
+            # Pinned until the merge is done, so a concurrent merge can't evict them
+            # before they are appended
+            rendered = pins.enter_context(pdf_cache.pinned([path for filename, path in sources if not filename.lower().endswith(".pdf")]))
+
+        merger = StreamingPdfMerger(output)
+        found_any = False
+        with span("append"):
+            for i, (filename, file_path) in enumerate(sources):
+                # Statements that arrived as PDF need no conversion
+                pdf_path = rendered.get(file_path, file_path)
+                if isinstance(pdf_path, Exception):
+                    print(f"Worker failed for {filename}: {pdf_path}")
+                    continue
+                try:
+                    merger.append(pdf_path)
+                    found_any = True
+                except BrokenPipeError:
+                    raise
+                except Exception as e:
+                    print(f"Error merging {filename}: {e}")
+                if progress:
+                    progress(i + 1, len(sources))
 
-    for filename in req.filenames:
-        file_path = os.path.join(DATA_DIR, filename)
-        if os.path.exists(file_path):
-            try:
-                # Generate unique temp PDF path
-                temp_pdf_path = os.path.join(temp_pdf_dir, f"{uuid.uuid4()}.pdf")
-                worker_path = os.path.join(os.path.dirname(__file__), "pdf_worker.py")
-                
-                # Call worker
-                print(f"Converting {filename} to PDF via worker...")
-                result = subprocess.run(
-                    [sys.executable, worker_path, file_path, temp_pdf_path],
-                    capture_output=True,
-                    text=True
-                )
-                
-                if result.returncode != 0:
-                     print(f"Worker failed for {filename}: {result.stderr}")
-                     continue
-                
-                print(f"Worker success for {filename}")
-                generated_temp_files.append(temp_pdf_path)
-                
-                # Append to merger
-                merger.append(temp_pdf_path)
-                found_any = True
-            except Exception as e:
-                print(f"Error merging {filename}: {e}")
-    
-    if not found_any:
-        raise HTTPException(status_code=404, detail="No valid documents found to merge")
-        
-    output = io.BytesIO()
-    merger.write(output)
-    merger.close()
-    output.seek(0)
-    
-    # Cleanup temp files
-    for tmp in generated_temp_files:
+        if not found_any:
+            raise HTTPException(status_code=404, detail="No valid documents found to merge")
+
+        with span("write"):
+            merger.close()
+
+@app.post("/api/documents/merge")
+def merge_documents(req: MergeRequest):
+    # The merge runs on its own thread and is sent as it is written, so the download
+    # starts with the first statement. Waiting for that first chunk still turns a
+    # merge that fails up front (e.g. nothing to merge) into an error response.
+    pipe = ChunkPipe(MERGE_STREAM_CHUNKS)
+
+    def run():
         try:
-            os.remove(tmp)
-        except:
-            pass
+            _merge_statements(req.filenames, pipe)
+        except BrokenPipeError:
+            print("Merge abandoned: the client went away")
+        except Exception as e:
+            pipe.finish(e)
+        else:
+            pipe.finish()
+
+    threading.Thread(target=run, name="merge-stream", daemon=True).start()
     try:
-        os.rmdir(temp_pdf_dir)
-    except:
-        pass
-    
-    return Response(
-        content=output.getvalue(),
+        first = pipe.read_chunk()
+    except Exception:
+        pipe.close()
+        raise
+
+    return StreamingResponse(
+        pipe.chunks(first),
         media_type="application/pdf",
         headers={"Content-Disposition": "attachment; filename=merged_transactions.pdf"}
     )
@@ -326,32 +559,44 @@ class HTMLToPDFRequest(BaseModel):
     html_content: str
     filename: Optional[str] = "document"
 
+def _html_to_pdf(html_content: str, output):
+    """
+    Renders client-supplied HTML in the sandbox pool: size-capped, with no file or
+    network access, and under the pool's CPU, memory and wall-clock limits.
+    """
+    if pisa is None:
+        raise HTTPException(status_code=501, detail="xhtml2pdf not installed")
+    source = html_content.encode("utf-8")
+    if len(source) > HTML_TO_PDF_MAX_KB * 1024:
+        raise HTTPException(status_code=413, detail=f"Document is larger than {HTML_TO_PDF_MAX_KB} KB")
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        source_path = os.path.join(temp_dir, "document.html")
+        dest_path = os.path.join(temp_dir, "document.pdf")
+        with open(source_path, "wb") as f:
+            f.write(source)
+        try:
+            # Busy sandbox: give up rather than pile request threads up behind it
+            get_sandbox_pool().convert(source_path, dest_path, untrusted=True, wait_timeout=SANDBOX_JOB_TIMEOUT)
+        except TimeoutError as e:
+            raise HTTPException(status_code=503, detail=str(e))
+        except RuntimeError as e:
+            raise HTTPException(status_code=422, detail=str(e))
+        with open(dest_path, "rb") as f:
+            shutil.copyfileobj(f, output)
+
 @app.post("/api/documents/html-to-pdf")
 def html_to_pdf(req: HTMLToPDFRequest):
-    # Reuse pdf_worker logic but via subprocess or direct import?
-    # Since pdf_worker uses sys.argv, direct import of pisa is better here if thread-safe
-    # or just write temp file and call subprocess to keep it isolated (some libs have global state)
-    
-    # Let's try direct usage first, catching exceptions
     try:
-        if pisa is None:
-             raise Exception("xhtml2pdf not installed")
-        # from xhtml2pdf import pisa # Imported globally
         output_buffer = io.BytesIO()
-        
-        # pisa.CreatePDF expects str or file-like
-        # Warning: pisa might not support all modern CSS.
-        pisa_status = pisa.CreatePDF(req.html_content, dest=output_buffer)
-        
-        if pisa_status.err:
-             raise Exception("PDF generation error")
-             
-        output_buffer.seek(0)
+        _html_to_pdf(req.html_content, output_buffer)
         return Response(
             content=output_buffer.getvalue(),
             media_type="application/pdf",
             headers={"Content-Disposition": f"attachment; filename={req.filename}.pdf"}
         )
+    except HTTPException:
+        raise
     except Exception as e:
          print(f"Error producing PDF: {e}")
          raise HTTPException(status_code=500, detail=str(e))
@@ -418,13 +663,16 @@ def generate_posd_xml_post(data: POSDData):
         headers={"Content-Disposition": f"attachment; filename=PO-SD_{year}.xml"}
     )
 
-@app.get("/api/posd/memorandum")
-def get_posd_memorandum(year: int = datetime.now().year):
+def _memorandum_pdf(year: int) -> bytes:
     txs = db.load_transactions()
     stats = get_posd_stats(year) # Re-use logic to get headers/metadata
     
-    # Generate PDF
-    pdf_content = generate_memorandum_pdf(stats, txs, year)
+    # Generate PDF (page chunks render in parallel on the PDF workers)
+    return generate_memorandum_pdf(stats, txs, year, pool=get_pdf_pool() if pisa is not None else None)
+
+@app.get("/api/posd/memorandum")
+def get_posd_memorandum(year: int = datetime.now().year):
+    pdf_content = _memorandum_pdf(year)
     
     return Response(
         content=pdf_content,
@@ -498,12 +746,14 @@ def get_current_user():
         "email": email
     }
 
+@app.post("/api/auth/logout")
+def logout_google():
+    # History ids belong to the mailbox; the next account starts with a full sync
+    db.clear_gmail_sync_state()
     success = gmail_service.logout()
     return {"status": "success" if success else "error"}
 
-@app.get("/api/issuer")
-def get_issuer_info():
-    """Returns the issuer (my business) details for invoices."""
+def _get_issuer() -> dict:
     metadata = db.get_metadata()
     return {
         "name": metadata.get("name", "Lotus RC, vl. Timon Terzić"),
@@ -512,6 +762,11 @@ def get_issuer_info():
         "iban": metadata.get("iban", "HR9824020061140483524")
     }
 
+@app.get("/api/issuer")
+def get_issuer_info():
+    """Returns the issuer (my business) details for invoices."""
+    return _get_issuer()
+
 # --- Client Management Endpoints ---
 
 @app.get("/api/clients", response_model=List[Client])
@@ -532,15 +787,10 @@ def delete_client(client_id: str):
 
 # --- Invoice Management Endpoints ---
 
-@app.get("/api/invoices", response_model=dict)
-def get_invoices(
-    page: int = Query(1, ge=1),
-    limit: int = Query(100, ge=-1),
-    search: Optional[str] = None,
-    start_date: Optional[str] = None,
-    end_date: Optional[str] = None,
-    status: Optional[str] = None
-):
+def _invoice_filters(search: Optional[str], start_date: Optional[str], end_date: Optional[str], status: Optional[str], year: Optional[int]) -> dict:
+    """
+    Query parameters shared by the invoice list and export -> db.get_invoices kwargs.
+    """
     start = None
     end = None
     if start_date:
@@ -561,16 +811,53 @@ def get_invoices(
         except:
              pass
 
+    return {
+        "search": search,
+        "start_date": start,
+        "end_date": end,
+        "status": status_enum,
+        "year": year
+    }
+
+@app.get("/api/invoices", response_model=dict)
+def get_invoices(
+    page: int = Query(1, ge=1),
+    limit: int = Query(100, ge=-1),
+    search: Optional[str] = None,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    status: Optional[str] = None,
+    year: Optional[int] = None
+):
     result = db.get_invoices(
         skip=(page - 1) * limit if limit != -1 else 0,
         limit=limit,
-        search=search,
-        start_date=start,
-        end_date=end,
-        status=status_enum
+        **_invoice_filters(search, start_date, end_date, status, year)
     )
     return result
 
+@app.get("/api/invoices/export")
+def export_invoices(
+    search: Optional[str] = None,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    status: Optional[str] = None,
+    year: Optional[int] = None
+):
+    """
+    All invoices matching the filters as a ZIP of PDFs, streamed while they render.
+    """
+    invoices = db.get_invoices(limit=-1, **_invoice_filters(search, start_date, end_date, status, year))["data"]
+    if not invoices:
+        raise HTTPException(status_code=404, detail="No invoices match the filters")
+
+    filename = f"Racuni_{year}.zip" if year else "Racuni.zip"
+    return StreamingResponse(
+        stream_invoice_zip(invoices, _get_issuer(), invoice_pdf_cache),
+        media_type="application/zip",
+        headers={"Content-Disposition": f"attachment; filename={filename}"}
+    )
+
 @app.post("/api/invoices", response_model=Invoice)
 def create_invoice(invoice: Invoice):
     # Determine year from date if not correct
@@ -597,37 +884,133 @@ def delete_invoice(invoice_id: str):
     return {"status": "success"}
 
 @app.get("/api/invoices/{invoice_id}/pdf")
-def get_invoice_pdf(invoice_id: str):
+def get_invoice_pdf(invoice_id: str, if_none_match: Optional[str] = Header(None)):
     invoice = db.get_invoice(invoice_id)
     if not invoice:
         raise HTTPException(status_code=404, detail="Invoice not found")
         
-    # Get issuer info directly using existing logic
-    metadata = db.get_metadata()
-    issuer = {
-        "name": metadata.get("name", "Lotus RC, vl. Timon Terzić"),
-        "address": metadata.get("address", "STANKA VRAZA 10, 42000 VARAŽDIN"),
-        "oib": metadata.get("oib", "58278708852"),
-        "iban": metadata.get("iban", "HR9824020061140483524")
-    }
+    issuer = _get_issuer()
     
     try:
-        pdf_content = generate_invoice_pdf(invoice, issuer)
-        
-        # Sanitize client name for filename
-        safe_client_name = "".join([c if c.isalnum() else "_" for c in invoice.client_name]).strip("_")
-        date_str = invoice.issue_date.strftime("%Y-%m-%d")
-        filename = f"Racun_{invoice.number}_{safe_client_name}_{date_str}.pdf"
+        filename = invoice_pdf_filename(invoice)
+
+        # The cache key hashes everything that goes into the PDF, so it is the ETag:
+        # a matching If-None-Match needs neither the cache nor a render
+        etag = f'"{InvoicePdfCache.key(invoice, issuer)}"'
+        headers = {
+            "Content-Disposition": f"attachment; filename={filename}",
+            "ETag": etag,
+            "Cache-Control": "private, no-cache"
+        }
+        if if_none_match and etag in [tag.strip() for tag in if_none_match.split(",")]:
+            return Response(status_code=304, headers=headers)
+
+        _, pdf_content = invoice_pdf_cache.get_or_render(invoice, issuer)
         
         return Response(
             content=pdf_content,
             media_type="application/pdf",
-            headers={"Content-Disposition": f"attachment; filename={filename}"}
+            headers=headers
         )
     except Exception as e:
         print(f"Error generating invoice PDF: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+# --- PDF Jobs ---
+# The PDF endpoints above render inside the request; these queue the same work
+# and let the client poll (or follow over SSE) and download the result later.
+
+class PdfJobRequest(BaseModel):
+    kind: str # merge, html-to-pdf, memorandum, invoice
+    filenames: Optional[List[str]] = None # merge
+    html_content: Optional[str] = None # html-to-pdf
+    filename: Optional[str] = None # html-to-pdf
+    year: Optional[int] = None # memorandum
+    invoice_id: Optional[str] = None # invoice
+
+def _write_bytes(dest: str, content: bytes):
+    with open(dest, "wb") as f:
+        f.write(content)
+
+@app.post("/api/pdf-jobs", status_code=202)
+def submit_pdf_job(req: PdfJobRequest):
+    if req.kind == "merge":
+        if not req.filenames:
+            raise HTTPException(status_code=400, detail="filenames is required")
+        filenames = list(req.filenames)
+        def run(dest, progress):
+            with open(dest, "wb") as f:
+                _merge_statements(filenames, f, progress)
+        spec = ("merged_transactions.pdf", PRIORITY_BATCH, run)
+
+    elif req.kind == "html-to-pdf":
+        if not req.html_content:
+            raise HTTPException(status_code=400, detail="html_content is required")
+        html_content = req.html_content
+        def run(dest, progress):
+            with open(dest, "wb") as f:
+                _html_to_pdf(html_content, f)
+        spec = (f"{req.filename or 'document'}.pdf", PRIORITY_INTERACTIVE, run)
+
+    elif req.kind == "memorandum":
+        year = req.year or datetime.now().year
+        spec = (f"PO-SD_Obrazlozenje_{year}.pdf", PRIORITY_BATCH, lambda dest, progress: _write_bytes(dest, _memorandum_pdf(year)))
+
+    elif req.kind == "invoice":
+        invoice = db.get_invoice(req.invoice_id) if req.invoice_id else None
+        if not invoice:
+            raise HTTPException(status_code=404, detail="Invoice not found")
+        def run(dest, progress):
+            _, pdf_content = invoice_pdf_cache.get_or_render(invoice, _get_issuer())
+            _write_bytes(dest, pdf_content)
+        spec = (invoice_pdf_filename(invoice), PRIORITY_INTERACTIVE, run)
+
+    else:
+        raise HTTPException(status_code=400, detail=f"Unknown job kind: {req.kind}")
+
+    filename, priority, run = spec
+    try:
+        job = pdf_jobs.submit(req.kind, run, filename, priority=priority)
+    except RuntimeError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    return job.snapshot()
+
+def _get_pdf_job(job_id: str):
+    job = pdf_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found or expired")
+    return job
+
+@app.get("/api/pdf-jobs/{job_id}")
+def get_pdf_job(job_id: str):
+    return _get_pdf_job(job_id).snapshot()
+
+@app.get("/api/pdf-jobs/{job_id}/events")
+async def pdf_job_events(job_id: str):
+    return EventSourceResponse(pdf_jobs.event_generator(_get_pdf_job(job_id)))
+
+@app.get("/api/pdf-jobs/{job_id}/result")
+def get_pdf_job_result(job_id: str):
+    job = _get_pdf_job(job_id)
+    status = job.snapshot()["status"]
+    if status != "done":
+        raise HTTPException(status_code=409, detail=f"Job is {status}")
+    return FileResponse(job.result_path, media_type=job.media_type, filename=job.filename)
+
+@app.delete("/api/pdf-jobs/{job_id}")
+def delete_pdf_job(job_id: str):
+    if not pdf_jobs.cancel(job_id):
+        raise HTTPException(status_code=409, detail="Job is running or unknown")
+    return {"status": "success"}
+
+@app.get("/api/metrics/pdf")
+def get_pdf_metrics():
+    """
+    Per-stage latency (p50/p95/max over recent runs) of invoice, memorandum, merge
+    and HTML -> PDF rendering, plus the peak RSS seen in the PDF workers.
+    """
+    return METRICS.snapshot()
+
 # --- Sudreg API Endpoints ---
 
 @app.get("/api/sudreg/search")
@@ -677,84 +1060,71 @@ def sync_gmail(background_tasks: BackgroundTasks, query: Optional[str] = None):
     """
     Triggers a background task to fetch emails and parse them.
     """
-    if sync_manager.status == "running":
+    if not sync_manager.try_start():
+         # Possibly the scheduled sync; the client can follow it on /api/sync/events
          return {"status": "already_running"}
     
-    sync_manager.reset()
-    sync_manager.set_status("running")
     background_tasks.add_task(run_gmail_sync, query)
     return {"status": "started"}
 
+def scheduled_gmail_sync():
+    # Only with a saved login: a background job must never open the OAuth browser flow
+    if not os.path.exists(TOKEN_PATH) or not gmail_service.authenticate(interactive=False):
+        return
+    if not sync_manager.try_start():
+        print("Scheduled Gmail sync skipped, a sync is already running")
+        return
+    run_gmail_sync()
+
+gmail_sync_job = PeriodicJob("gmail-sync", GMAIL_SYNC_INTERVAL, scheduled_gmail_sync, initial_delay=GMAIL_SYNC_INITIAL_DELAY)
+
 def run_gmail_sync(query: Optional[str] = None):
     print("Starting Gmail sync...")
     sync_manager.add_log("Starting Gmail sync...")
     
     try:
-        # Fetching all emails now, thanks to pagination in gmail_service
-        # Use provided query or let fetch_erste_emails use its default
-        if query:
-            messages = gmail_service.fetch_erste_emails(query=query)
-        else:
-            messages = gmail_service.fetch_erste_emails()
+        query = query or DEFAULT_GMAIL_QUERY
+
+        # Read the history id before listing so nothing added meanwhile is missed next time
+        history_id = gmail_service.get_history_id()
+        sync_started = int(time.time())
+
+        messages = None
+        state = db.get_gmail_sync_state(query)
+        if state and history_id:
+            messages = gmail_service.fetch_new_erste_emails(state["history_id"], state["synced_at"], query=query)
+            if messages is None:
+                sync_manager.add_log("Gmail history has expired, falling back to a full sync...")
+            else:
+                sync_manager.add_log(f"Incremental sync since history id {state['history_id']}")
+
+        if messages is None:
+            if history_id:
+                messages = gmail_service.list_messages(query)
+            else:
+                # Not authenticated: fetch_erste_emails reports and returns nothing
+                messages = gmail_service.fetch_erste_emails(query=query)
+
         count_emails = len(messages)
         print(f"Found {count_emails} emails.")
         sync_manager.add_log(f"Found {count_emails} emails.")
-        
-        sync_manager.update_progress(0, count_emails)
-        
-        count = 0
-        skipped = 0
-        
-        for i, msg in enumerate(messages):
-            # Check if we already have the filename without downloading?
-            # Gmail API message list doesn't give filename, we need to get details.
-            # Ideally we'd get message details and check filename before download.
-            # But download_attachment already gets details.
-            
-            # Optimization: We can't know filename without fetching message details. 
-            # But we can assume download_attachment returns the path, and we can check db after saving?
-            # Or better: modify download_attachment to return filename before saving? 
-            # For now, let's keep it simple: download, check filename, if processed -> delete and skip.
-            # Wait, user wants to avoid re-processing.
-            
-            # Let's see if we can optimize. run_gmail_sync calls download_attachment.
-            # We can check if file exists in processed_files before parsing.
-            
-            sync_manager.add_log(f"Processing email {i+1}/{count_emails}...")
-            
-            # We will download it (it's fast enough for text files) then check processing status
-            # Ideally we would check 'HistoryId' or something, but filename is what we have.
-            
-            save_path = gmail_service.download_attachment(msg['id'], DATA_DIR)
-            
-            if save_path:
-                filename = os.path.basename(save_path)
-                
-                if db.is_file_processed(filename):
-                     sync_manager.add_log(f"Skipping {filename} (already processed)")
-                     # We used to delete here, but now we keep it for PDF generation
-                     # If it's already there, great. If we just downloaded it, also great.
-                     skipped += 1
-                     sync_manager.update_progress(i + 1, count_emails)
-                     continue
 
-                try:
-                    with open(save_path, 'r', encoding='utf-8') as f:
-                        content = f.read()
-                    new_txs, metadata = parse_erste_html(content, source_filename=filename)
-                    db.save_transactions(new_txs)
-                    db.save_metadata(metadata)
-                    db.mark_file_processed(filename)
-                    count += 1
-                    sync_manager.add_log(f"Successfully processed {filename}")
-                except Exception as e:
-                    print(f"Failed to parse {save_path}: {e}")
-                    sync_manager.add_log(f"Error parsing {save_path}: {e}")
-            else:
-                 sync_manager.add_log(f"No target attachment for email {msg['id']}")
-            
-            sync_manager.update_progress(i + 1, count_emails)
-        
+        # Messages that failed last time: history.list won't report them again
+        message_ids = [msg['id'] for msg in messages]
+        retry = [message_id for message_id in (state or {}).get("failed", []) if message_id not in message_ids]
+        if retry:
+            sync_manager.add_log(f"Retrying {len(retry)} emails that failed last time")
+            message_ids += retry
+
+        pipeline = GmailSyncPipeline(gmail_service, db, DATA_DIR, sync_manager, commit_batch_size=GMAIL_COMMIT_BATCH_SIZE)
+        count, skipped = pipeline.run(message_ids)
+
+        failed = sorted(set(pipeline.failed))
+        if failed:
+            sync_manager.add_log(f"{len(failed)} emails failed, they will be retried on the next sync")
+        if history_id:
+            db.save_gmail_sync_state(query, {"history_id": history_id, "synced_at": sync_started, "failed": failed})
+
         print(f"Gmail sync completed. Processed {count} new attachments. Skipped {skipped}.")
         sync_manager.add_log(f"Gmail sync completed. Processed {count} new attachments. Skipped {skipped}.")
         sync_manager.set_status("completed")
@@ -1,88 +1,88 @@
 try:
     from xhtml2pdf import pisa
+    from reportlab.lib.utils import simpleSplit
 except ImportError:
     pisa = None
 import io
+import os
+import tempfile
 from datetime import datetime
+from typing import List
+from pypdf import PdfWriter
 from backend.models import POSDData, Transaction
+from backend.pdf_metrics import span, trace
 
-def generate_memorandum_pdf(posd_data: POSDData, transactions: list[Transaction], year: int) -> bytes:
-    if pisa is None:
-        raise Exception("PDF generation disabled: xhtml2pdf not installed")
-    """
-    Generates a PDF Memorandum for the PO-SD form.
-    It lists all transactions, highlighting those excluded from the PO-SD calculation
-    and displaying user-provided notes.
-    """
-    
-    # Filter transactions for the relevant year
-    year_txs = [
-        tx for tx in transactions 
-        if tx.date.year == year and tx.type == "inflow"
-    ]
-    
-    # Sort by date
-    year_txs.sort(key=lambda x: x.date)
-    
-    formatted_date = datetime.now().strftime("%d.%m.%Y.")
-    
-    html_content = f"""
-    <!DOCTYPE html>
-    <html>
-    <head>
-        <style>
-            @page {{
+# The memorandum is rendered in page-sized chunks that are merged afterwards:
+# xhtml2pdf's cost grows faster than linearly with the size of a single table,
+# while independent one-page chunks keep it linear (and can render in parallel).
+# Rows are packed by estimated height; the budgets are kept below the real frame
+# height (~700pt below the table header on A4 with 2cm margins) so a chunk practically never spills over.
+PAGE_ROWS_HEIGHT = 680
+# The first page also carries the letterhead, title and introduction
+FIRST_PAGE_ROWS_HEIGHT = 410
+# UKUPNO rows plus the summary box
+TOTALS_HEIGHT = 200
+
+# Usable text width of the description and status cells (A4 minus margins and padding)
+DESCRIPTION_WIDTH = 155
+STATUS_WIDTH = 107
+LINE_HEIGHT = 13.5
+NOTE_LINE_HEIGHT = 12
+ROW_PADDING = 13
+
+STYLE = """
+            @page {
                 size: A4;
                 margin: 2cm;
-                @frame footer_frame {{
+                @frame footer_frame {
                     -pdf-frame-content: footerContent;
                     bottom: 1cm;
                     margin-left: 2cm;
                     margin-right: 2cm;
                     height: 1cm;
-                }}
-            }}
-            body {{
+                }
+            }
+            body {
                 font-family: Helvetica, Arial, sans-serif;
                 font-size: 10pt;
                 line-height: 1.5;
                 color: #333;
-            }}
-            .header {{
+            }
+            .header {
                 text-align: left;
                 margin-bottom: 2cm;
                 border-bottom: 2px solid #3366cc;
                 padding-bottom: 10px;
-            }}
-            .header h1 {{
+            }
+            .header h1 {
                 font-size: 18pt;
                 color: #3366cc;
                 margin: 0;
                 font-family: 'Roboto', sans-serif;
-            }}
-            .header p {{
+            }
+            .header p {
                 margin: 2px 0;
                 font-size: 10pt;
                 color: #666;
-            }}
-            .title {{
+            }
+            .title {
                 text-align: center;
                 margin-bottom: 1cm;
-            }}
-            .title h2 {{
+            }
+            .title h2 {
                 font-size: 16pt;
                 text-transform: uppercase;
                 margin: 0;
-            }}
-            .section {{
+            }
+            .section {
                 margin-bottom: 1cm;
-            }}
-            table {{
+            }
+            table {
                 width: 100%;
                 border-collapse: collapse;
                 margin-bottom: 1cm;
-            }}
-            th {{
+            }
+            th {
                 background-color: #f0f4f8;
                 color: #333;
                 font-weight: bold;
@@ -90,62 +90,41 @@ def generate_memorandum_pdf(posd_data: POSDData, transactions: list[Transaction]
                 text-align: left;
                 border: 1px solid #ddd;
                 font-size: 9pt;
-            }}
-            td {{
+            }
+            td {
                 padding: 8px;
                 border: 1px solid #ddd;
                 font-size: 9pt;
                 vertical-align: top;
-            }}
-            .amount {{
+            }
+            .amount {
                 text-align: right;
                 font-family: monospace;
-            }}
-            .excluded {{
+            }
+            .excluded {
                 background-color: #fff4e5; /* Light orange for excluded */
                 color: #d97706; /* Darker orange text */
-            }}
-            .note {{
+            }
+            .note {
                 font-style: italic;
                 font-size: 8pt;
                 color: #666;
                 margin-top: 4px;
-            }}
-            .summary-box {{
+            }
+            .summary-box {
                 background-color: #f8fafc;
                 border: 1px solid #e2e8f0;
                 padding: 15px;
                 border-radius: 5px;
-            }}
-            .total-row td {{
+            }
+            .total-row td {
                 font-weight: bold;
                 background-color: #f0f4f8;
-            }}
-        </style>
-    </head>
-    <body>
-        <div class="header">
-            <h1>{posd_data.name}</h1>
-            <p>{posd_data.address}</p>
-            <p>OIB: {posd_data.oib}</p>
-        </div>
+            }
+"""
 
-        <div class="title">
-            <h2>Obrazloženje Uz PO-SD Obrazac</h2>
-            <p>Za razdoblje: 01.01.{year}. - 31.12.{year}.</p>
-        </div>
-
-        <div class="section">
-            <p>
-                Ovaj dokument služi kao prilog PO-SD obrascu i detaljno prikazuje sve evidentirane priljeve
-                na žiro računu te specificira koji su priljevi uključeni u oporezive primitke, a koji su izuzeti
-                uz pripadajuće obrazloženje.
-            </p>
-        </div>
-
-        <div class="section">
-            <h3>Specifikacija Prometa po Žiro Računu</h3>
-            <table>
+TABLE_HEAD = """
+            <table repeat="1">
                 <thead>
                     <tr>
                         <th style="width: 15%;">Datum</th>
@@ -155,40 +134,120 @@ def generate_memorandum_pdf(posd_data: POSDData, transactions: list[Transaction]
                     </tr>
                 </thead>
                 <tbody>
+"""
+
+TABLE_TAIL = """
+                </tbody>
+            </table>
+"""
+
+def _row(tx: Transaction):
+    """
+    Returns (row html, estimated height in pt, excluded).
+    """
+    is_excluded = getattr(tx, 'is_excluded_from_posd', False)
+
+    row_class = 'class="excluded"' if is_excluded else ''
+    status_text = "<strong>ISKLJUČENO</strong>" if is_excluded else "PO-SD Prihod"
+
+    note = getattr(tx, 'posd_note', '') or ''
+    if not note and is_excluded:
+        note = "Nije poslovni primitak"
+    if note:
+        status_text += f"<br/><span class='note'>{note}</span>"
+
+    description_lines = len(simpleSplit(str(tx.description), "Helvetica", 9, DESCRIPTION_WIDTH)) or 1
+    status_height = LINE_HEIGHT + NOTE_LINE_HEIGHT * len(simpleSplit(note, "Helvetica-Oblique", 8, STATUS_WIDTH))
+    height = max(description_lines * LINE_HEIGHT, status_height) + ROW_PADDING
+
+    html = f"""
+                    <tr {row_class}>
+                        <td>{tx.date.strftime('%d.%m.%Y.')}</td>
+                        <td>{tx.description}</td>
+                        <td>{status_text}</td>
+                        <td class="amount">{tx.amount:.2f} {tx.currency}</td>
+                    </tr>"""
+    return html, height, is_excluded
+
+def _document(body: List[str], footer: str) -> str:
+    return "".join([
+        "<!DOCTYPE html>\n<html>\n<head>\n<style>",
+        STYLE,
+        "</style>\n</head>\n<body>\n",
+        *body,
+        f'\n<div id="footerContent">\n{footer}\n</div>\n</body>\n</html>\n',
+    ])
+
+def _render_chunks(chunks: List[str], pool=None) -> List[bytes]:
+    """
+    Renders each HTML chunk to PDF bytes, on the PDF worker pool when one is given.
     """
+    if pool is None:
+        rendered = []
+        for html in chunks:
+            output_buffer = io.BytesIO()
+            pisa_status = pisa.CreatePDF(html, dest=output_buffer)
+            if pisa_status.err:
+                raise Exception("Error generating PDF memorandum")
+            rendered.append(output_buffer.getvalue())
+        return rendered
+
+    with tempfile.TemporaryDirectory(prefix="memorandum-") as tmp_dir:
+        jobs = []
+        for i, html in enumerate(chunks):
+            source = os.path.join(tmp_dir, f"{i:05d}.html")
+            with open(source, "w", encoding="utf-8") as f:
+                f.write(html)
+            jobs.append((source, os.path.join(tmp_dir, f"{i:05d}.pdf")))
+
+        for error in pool.convert_many(jobs):
+            if error is not None:
+                raise Exception(f"Error generating PDF memorandum: {error}")
+
+        rendered = []
+        for _, dest in jobs:
+            with open(dest, "rb") as f:
+                rendered.append(f.read())
+        return rendered
+
+def _build_chunks(posd_data: POSDData, transactions: list[Transaction], year: int) -> List[str]:
+    """
+    The memorandum's HTML, one document per page.
+    """
+    # Filter transactions for the relevant year
+    year_txs = [
+        tx for tx in transactions 
+        if tx.date.year == year and tx.type == "inflow"
+    ]
+    
+    # Sort by date
+    year_txs.sort(key=lambda x: x.date)
+    
+    formatted_date = datetime.now().strftime("%d.%m.%Y.")
+    footer = f"DIREKTOR / VLASNIK: {posd_data.name} | Datum: {formatted_date}"
 
     total_all = 0.0
     total_posd = 0.0
     total_excluded = 0.0
 
+    # Pack rows into page-sized chunks
+    pages = [[]]
+    budget = FIRST_PAGE_ROWS_HEIGHT
     for tx in year_txs:
         total_all += tx.amount
-        is_excluded = getattr(tx, 'is_excluded_from_posd', False)
-        
-        row_class = 'class="excluded"' if is_excluded else ''
-        status_text = "<strong>ISKLJUČENO</strong>" if is_excluded else "PO-SD Prihod"
-        
-        note = getattr(tx, 'posd_note', '') or ''
-        if note:
-             status_text += f"<br/><span class='note'>{note}</span>"
-        elif is_excluded:
-             status_text += f"<br/><span class='note'>Nije poslovni primitak</span>"
-
+        html, height, is_excluded = _row(tx)
         if is_excluded:
             total_excluded += tx.amount
         else:
             total_posd += tx.amount
 
-        html_content += f"""
-                    <tr {row_class}>
-                        <td>{tx.date.strftime('%d.%m.%Y.')}</td>
-                        <td>{tx.description}</td>
-                        <td>{status_text}</td>
-                        <td class="amount">{tx.amount:.2f} {tx.currency}</td>
-                    </tr>
-        """
+        if height > budget and pages[-1]:
+            pages.append([])
+            budget = PAGE_ROWS_HEIGHT
+        pages[-1].append(html)
+        budget -= height
 
-    html_content += f"""
+    totals_rows = f"""
                     <tr class="total-row">
                         <td colspan="3" style="text-align: right;">UKUPNO PROMET:</td>
                         <td class="amount">{total_all:.2f} EUR</td>
@@ -200,11 +259,8 @@ def generate_memorandum_pdf(posd_data: POSDData, transactions: list[Transaction]
                     <tr class="total-row">
                         <td colspan="3" style="text-align: right; color: #10b981;">PO-SD OSNOVICA:</td>
                         <td class="amount" style="color: #10b981;">{total_posd:.2f} EUR</td>
-                    </tr>
-                </tbody>
-            </table>
-        </div>
-        
+                    </tr>"""
+    summary = f"""
         <div class="section summary-box">
              <h3>Zaključak</h3>
              <p>
@@ -212,18 +268,69 @@ def generate_memorandum_pdf(posd_data: POSDData, transactions: list[Transaction]
                 oporezivih primitaka od <strong>{total_posd:.2f} EUR</strong>.
              </p>
         </div>
+"""
+    # The totals stay with the last rows unless they would push that page over
+    if budget < TOTALS_HEIGHT:
+        pages.append([])
+
+    intro = f"""
+        <div class="header">
+            <h1>{posd_data.name}</h1>
+            <p>{posd_data.address}</p>
+            <p>OIB: {posd_data.oib}</p>
+        </div>
 
-        <div id="footerContent">
-            DIREKTOR / VLASNIK: {posd_data.name} | Datum: {formatted_date}
+        <div class="title">
+            <h2>Obrazloženje Uz PO-SD Obrazac</h2>
+            <p>Za razdoblje: 01.01.{year}. - 31.12.{year}.</p>
+        </div>
+
+        <div class="section">
+            <p>
+                Ovaj dokument služi kao prilog PO-SD obrascu i detaljno prikazuje sve evidentirane priljeve
+                na žiro računu te specificira koji su priljevi uključeni u oporezive primitke, a koji su izuzeti
+                uz pripadajuće obrazloženje.
+            </p>
         </div>
-    </body>
-    </html>
+
+        <div class="section">
+            <h3>Specifikacija Prometa po Žiro Računu</h3>
+"""
+
+    chunks = []
+    for i, rows in enumerate(pages):
+        first, last = i == 0, i == len(pages) - 1
+        body = [intro] if first else ['<div class="section">']
+        body += [TABLE_HEAD, *rows]
+        if last:
+            body.append(totals_rows)
+        body += [TABLE_TAIL, "</div>\n"]
+        if last:
+            body.append(summary)
+        chunks.append(_document(body, footer))
+    return chunks
+
+def generate_memorandum_pdf(posd_data: POSDData, transactions: list[Transaction], year: int, pool=None) -> bytes:
     """
-    
-    output_buffer = io.BytesIO()
-    pisa_status = pisa.CreatePDF(html_content, dest=output_buffer)
-    
-    if pisa_status.err:
-        raise Exception("Error generating PDF memorandum")
-        
+    Generates a PDF Memorandum for the PO-SD form.
+    It lists all transactions, highlighting those excluded from the PO-SD calculation
+    and displaying user-provided notes.
+    `pool` (a PdfWorkerPool) renders the page chunks in parallel; without it they
+    render one after another in this process.
+    """
+    if pisa is None:
+        raise Exception("PDF generation disabled: xhtml2pdf not installed")
+
+    with trace("memorandum"):
+        with span("html"):
+            chunks = _build_chunks(posd_data, transactions, year)
+        with span("render"):
+            rendered = _render_chunks(chunks, pool)
+        with span("merge"):
+            merger = PdfWriter()
+            for pdf in rendered:
+                merger.append(io.BytesIO(pdf))
+            output_buffer = io.BytesIO()
+            merger.write(output_buffer)
+            merger.close()
     return output_buffer.getvalue()
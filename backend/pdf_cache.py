@@ -0,0 +1,212 @@
+import hashlib
+import os
+import threading
+import time
+import uuid
+from collections import Counter, deque
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Union
+from backend.pdf_worker import STATEMENT_RENDERER
+
+# Part of every key: bump when statement rendering changes so old renders are dropped
+RENDERER_VERSION = "native-1" if STATEMENT_RENDERER == "native" else "xhtml2pdf-1"
+
+# .tmp files older than this were left by an interrupted render
+STALE_TMP_SECONDS = 3600
+# How often the warmer checks for an idle PDF worker while all are busy
+WARM_BUSY_POLL_SECONDS = 0.5
+
+
+class PdfCache:
+    """
+    Content-addressed store of rendered statement PDFs.
+
+    The key is the SHA-256 of the statement HTML (plus RENDERER_VERSION), so a
+    statement renders once no matter how often it is merged, and re-downloading an
+    identical file hits the same entry. The directory is kept under `max_bytes` by
+    evicting the least recently used entries (tracked through file mtimes); entries
+    handed out by pinned() are never evicted while in use.
+    """
+    def __init__(self, cache_dir: str, max_bytes: int, pool_getter, warm_limit: int = 50):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        # Callable returning the PdfWorkerPool, so the pool is only started when needed
+        self.pool_getter = pool_getter
+        self.warm_limit = warm_limit
+
+        self._lock = threading.Lock()
+        self._warm_cond = threading.Condition(self._lock)
+        self._warm_queue = deque(maxlen=max(1, warm_limit)) # newest kept when full
+        self._closed = False
+        self._hashes = {} # path -> (mtime_ns, size, digest)
+        self._sizes = {} # digest -> bytes on disk
+        self._pins = Counter() # digest -> callers still reading the file
+        self._warmer = None
+
+        os.makedirs(cache_dir, exist_ok=True)
+        for entry in os.scandir(cache_dir):
+            if entry.name.endswith(".pdf"):
+                self._sizes[entry.name[:-4]] = entry.stat().st_size
+            elif entry.name.endswith(".tmp") and entry.stat().st_mtime < time.time() - STALE_TMP_SECONDS:
+                # Render interrupted by a restart. Recent ones may be in flight: this also
+                # runs in processes that merely import backend.main (spawned PDF workers).
+                os.remove(entry.path)
+
+    def _digest(self, source_path: str) -> str:
+        stat = os.stat(source_path)
+        with self._lock:
+            known = self._hashes.get(source_path)
+        if known and known[:2] == (stat.st_mtime_ns, stat.st_size):
+            return known[2]
+
+        sha = hashlib.sha256(RENDERER_VERSION.encode())
+        with open(source_path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                sha.update(chunk)
+        digest = sha.hexdigest()
+        with self._lock:
+            self._hashes[source_path] = (stat.st_mtime_ns, stat.st_size, digest)
+        return digest
+
+    def _path(self, digest: str) -> str:
+        return os.path.join(self.cache_dir, f"{digest}.pdf")
+
+    def get_many(self, source_paths: List[str]) -> Dict[str, Union[str, Exception]]:
+        """
+        Returns {source_path: cached PDF path} rendering whatever is missing in
+        parallel on the worker pool. Failed renders map to the exception instead.
+        """
+        digests = {path: self._digest(path) for path in source_paths}
+
+        results = {}
+        jobs = {} # digest -> (source, tmp path)
+        for path, digest in digests.items():
+            cached = self._path(digest)
+            if digest in self._sizes and os.path.exists(cached):
+                os.utime(cached) # LRU bookkeeping
+                results[path] = cached
+            elif digest not in jobs:
+                jobs[digest] = (path, os.path.join(self.cache_dir, f"{digest}.{uuid.uuid4().hex}.tmp"))
+
+        job_list = list(jobs.items())
+        errors = dict(zip(jobs, self.pool_getter().convert_many([job for _, job in job_list], statement=True)))
+        for digest, (_, tmp_path) in job_list:
+            if errors[digest] is None:
+                os.replace(tmp_path, self._path(digest))
+                with self._lock:
+                    self._sizes[digest] = os.path.getsize(self._path(digest))
+            elif os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+        for path, digest in digests.items():
+            if path not in results:
+                results[path] = errors[digest] or self._path(digest)
+
+        self._evict(protect=set(digests.values()))
+        return results
+
+    @contextmanager
+    def pinned(self, source_paths: List[str]):
+        """
+        get_many() whose files stay on disk until the block exits, however much
+        concurrent renders need evicting meanwhile.
+        """
+        digests = {self._digest(path) for path in source_paths}
+        with self._lock:
+            self._pins.update(digests)
+        try:
+            yield self.get_many(source_paths)
+        finally:
+            with self._lock:
+                self._pins.subtract(digests)
+                for digest in digests:
+                    if self._pins[digest] <= 0:
+                        del self._pins[digest]
+
+    def get(self, source_path: str) -> str:
+        """
+        Single-file get_many; raises if rendering failed.
+        """
+        result = self.get_many([source_path])[source_path]
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    def _evict(self, protect: Iterable[str] = ()):
+        with self._lock:
+            total = sum(self._sizes.values())
+            if total <= self.max_bytes:
+                return
+            candidates = []
+            for digest in self._sizes:
+                if digest in protect or self._pins[digest] > 0:
+                    continue
+                try:
+                    candidates.append((os.path.getmtime(self._path(digest)), digest))
+                except OSError:
+                    candidates.append((0, digest))
+            candidates.sort()
+
+            for _, digest in candidates:
+                if total <= self.max_bytes:
+                    break
+                total -= self._sizes.pop(digest)
+                try:
+                    os.remove(self._path(digest))
+                except OSError:
+                    pass
+
+    def warm(self, source_paths: List[str]):
+        """
+        Renders statements in the background so later merges find them cached.
+        At most `warm_limit` wait at a time (the most recently queued are kept), and
+        they render one at a time, only while a PDF worker is idle, so a big import
+        never holds up interactive merges or the memorandum.
+        """
+        if not source_paths or self.warm_limit <= 0:
+            return
+        with self._warm_cond:
+            if self._closed:
+                return
+            for path in source_paths:
+                if path not in self._warm_queue:
+                    self._warm_queue.append(path)
+            if self._warmer is None:
+                self._warmer = threading.Thread(target=self._run_warmer, name="pdf-cache-warm", daemon=True)
+                self._warmer.start()
+            self._warm_cond.notify()
+
+    def _run_warmer(self):
+        while True:
+            with self._warm_cond:
+                while not self._warm_queue and not self._closed:
+                    self._warm_cond.wait()
+                if self._closed:
+                    return
+                path = self._warm_queue.popleft()
+
+            pool = self.pool_getter()
+            with self._warm_cond:
+                while not self._closed and pool.idle_workers() == 0:
+                    self._warm_cond.wait(WARM_BUSY_POLL_SECONDS)
+                if self._closed:
+                    return
+            self._warm_one(path)
+
+    def _warm_one(self, source_path: str):
+        try:
+            if os.path.exists(source_path):
+                self.get_many([source_path])
+        except Exception as e:
+            # Shutting down (or the interpreter exiting) mid-render isn't worth reporting
+            if not self._closed and threading.main_thread().is_alive():
+                print(f"Pre-rendering {os.path.basename(source_path)} failed: {e}")
+
+    def shutdown(self):
+        """
+        Stops warming; queued statements are dropped and a render in progress is abandoned.
+        """
+        with self._warm_cond:
+            self._closed = True
+            self._warm_queue.clear()
+            self._warm_cond.notify_all()
@@ -0,0 +1,238 @@
+import asyncio
+import itertools
+import json
+import os
+import queue
+import threading
+import time
+import uuid
+from typing import Callable, Dict, Optional
+
+# Lower runs first: a single invoice shouldn't wait behind a year's merge
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BATCH = 10
+
+FINISHED = ("done", "error", "cancelled")
+
+
+class PdfJob:
+    """
+    State of a queued job. PdfJobQueue changes it under the lock the job is given,
+    which snapshot() takes too.
+    """
+    def __init__(self, kind: str, filename: str, media_type: str, priority: int, run: Callable, lock=None):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.filename = filename
+        self.media_type = media_type
+        self.priority = priority
+        self.run = run
+
+        self.status = "queued" # queued, running, done, error, cancelled
+        self.progress = 0
+        self.total = 0
+        self.error = None
+        self.result_path = None
+        self.created_at = time.time()
+        self.finished_at = None
+        self._lock = lock or threading.Lock()
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return self._snapshot()
+
+    def _snapshot(self) -> dict:
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "progress": self.progress,
+            "total": self.total,
+            "error": self.error,
+            "filename": self.filename,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at
+        }
+
+
+class PdfJobQueue:
+    """
+    Runs PDF jobs off the request path.
+
+    Jobs wait in a priority queue for one of `workers` threads (the heavy lifting
+    still happens in the PDF/render process pools), write their result to
+    `result_dir` and are kept for `ttl` seconds after they finish. At most
+    `max_pending` jobs may be queued or running. Clients poll snapshot() or
+    follow a job over SSE, fed the same way as SyncManager's events.
+
+    A job's `run(dest_path, progress)` writes the result to `dest_path` and may call
+    `progress(current, total)`; an exception fails the job with its message.
+    """
+    def __init__(self, result_dir: str, workers: int = 2, ttl: float = 3600, max_pending: int = 100):
+        self.result_dir = result_dir
+        self.workers = workers
+        self.ttl = ttl
+        self.max_pending = max_pending
+
+        self._queue = queue.PriorityQueue()
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+        self._jobs: Dict[str, PdfJob] = {}
+        self._subscribers = {} # queue -> (job id, event loop)
+        self._threads = []
+        self._started = False
+
+    def start(self):
+        with self._lock:
+            if not self._started:
+                # Results of a previous run: their jobs are gone. Done here rather than in
+                # __init__, which also runs wherever backend.main is merely imported
+                # (e.g. spawned PDF workers re-importing the main module).
+                os.makedirs(self.result_dir, exist_ok=True)
+                for entry in os.scandir(self.result_dir):
+                    os.remove(entry.path)
+                self._started = True
+            while len(self._threads) < self.workers:
+                thread = threading.Thread(target=self._work, name=f"pdf-job-{len(self._threads)}", daemon=True)
+                self._threads.append(thread)
+                thread.start()
+
+    def stop(self):
+        with self._lock:
+            threads, self._threads = self._threads, []
+        for _ in threads:
+            # Sorts ahead of every job
+            self._queue.put((float("-inf"), next(self._seq), None))
+        for thread in threads:
+            thread.join(timeout=5)
+
+    def submit(self, kind: str, run: Callable, filename: str, media_type: str = "application/pdf", priority: int = PRIORITY_BATCH) -> PdfJob:
+        """
+        Queues a job. Raises RuntimeError when too many jobs are pending.
+        """
+        job = PdfJob(kind, filename, media_type, priority, run, self._lock)
+        with self._lock:
+            pending = sum(1 for j in self._jobs.values() if j.status not in FINISHED)
+            if pending >= self.max_pending:
+                raise RuntimeError("Too many PDF jobs pending, try again later")
+            self._jobs[job.id] = job
+        if not self._threads:
+            self.start()
+        self._queue.put((priority, next(self._seq), job))
+        return job
+
+    def get(self, job_id: str) -> Optional[PdfJob]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id: str) -> bool:
+        """
+        Cancels a queued job or discards a finished one. Running jobs can't be stopped.
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job.status == "running":
+                return False
+            finished = job.status in FINISHED
+            if finished:
+                self._jobs.pop(job_id)
+        if finished:
+            self._remove_result(job)
+            return True
+        # Unless a worker picked it up in the meantime
+        return self._update(job, only_if="queued", status="cancelled", finished_at=time.time())
+
+    def expire(self):
+        """
+        Drops finished jobs older than the TTL (run periodically).
+        """
+        cutoff = time.time() - self.ttl
+        with self._lock:
+            expired = [job for job in self._jobs.values() if job.finished_at is not None and job.finished_at < cutoff]
+            for job in expired:
+                self._jobs.pop(job.id)
+        for job in expired:
+            self._remove_result(job)
+
+    def _remove_result(self, job: PdfJob):
+        if job.result_path and os.path.exists(job.result_path):
+            os.remove(job.result_path)
+
+    def _work(self):
+        while True:
+            _, _, job = self._queue.get()
+            if job is None:
+                return
+            if not self._update(job, only_if="queued", status="running"):
+                continue
+
+            dest = os.path.join(self.result_dir, f"{job.id}.tmp")
+            try:
+                job.run(dest, lambda current, total: self._update(job, progress=current, total=total))
+                result_path = os.path.join(self.result_dir, job.id)
+                os.replace(dest, result_path)
+                self._update(job, result_path=result_path, status="done", finished_at=time.time())
+            except Exception as e:
+                # HTTPException carries its message in .detail
+                error = str(getattr(e, "detail", None) or e)
+                print(f"PDF job {job.kind} {job.id} failed: {error}")
+                if os.path.exists(dest):
+                    os.remove(dest)
+                self._update(job, error=error, status="error", finished_at=time.time())
+
+    def _update(self, job: PdfJob, only_if: Optional[str] = None, **changes) -> bool:
+        """
+        Applies `changes` to the job's attributes and publishes its snapshot. Every
+        state change goes through here, under the lock, so readers never see half
+        of one (e.g. "done" before the result path is set). With `only_if`, nothing
+        changes unless the job has that status. Returns whether it changed.
+        """
+        with self._lock:
+            if only_if is not None and job.status != only_if:
+                return False
+            for name, value in changes.items():
+                setattr(job, name, value)
+            snapshot = job._snapshot()
+            subscribers = [(events, loop) for events, (job_id, loop) in self._subscribers.items() if job_id == job.id]
+        for events, loop in subscribers:
+            try:
+                loop.call_soon_threadsafe(self._deliver, events, snapshot)
+            except RuntimeError:
+                # Event loop already closed
+                self.unsubscribe(events)
+        return True
+
+    # --- SSE ---
+
+    def subscribe(self, job_id: str) -> asyncio.Queue:
+        events = asyncio.Queue()
+        with self._lock:
+            self._subscribers[events] = (job_id, asyncio.get_running_loop())
+        return events
+
+    def unsubscribe(self, events: asyncio.Queue):
+        with self._lock:
+            self._subscribers.pop(events, None)
+
+    @staticmethod
+    def _deliver(events: asyncio.Queue, snapshot: dict):
+        # Runs on the event loop. Every event is a full snapshot, so a backlog
+        # only needs its latest entry.
+        while not events.empty():
+            events.get_nowait()
+        events.put_nowait(snapshot)
+
+    async def event_generator(self, job: PdfJob):
+        """
+        Yields a "job" event with the job's snapshot on every change, until it finishes.
+        """
+        events = self.subscribe(job.id)
+        try:
+            snapshot = job.snapshot()
+            while True:
+                yield {"event": "job", "data": json.dumps(snapshot)}
+                if snapshot["status"] in FINISHED:
+                    return
+                snapshot = await events.get()
+        finally:
+            self.unsubscribe(events)
@@ -0,0 +1,217 @@
+import io
+import queue
+import threading
+from collections import deque
+from typing import Dict, List, Tuple
+
+from pypdf import PdfReader
+from pypdf.generic import ArrayObject, DictionaryObject, IndirectObject, NameObject, NullObject, StreamObject
+
+# Kept on pages in the output even when a source's page tree sets them on a parent
+INHERITED_PAGE_KEYS = [NameObject(key) for key in ("/Resources", "/MediaBox", "/CropBox", "/Rotate")]
+
+CATALOG_ID = 1
+PAGES_ID = 2
+
+_END = object()
+
+
+class StreamingPdfMerger:
+    """
+    Concatenates PDFs into `output` (a writable binary file object) one source at a
+    time. A source's pages and every object they reference are renumbered and
+    written out as soon as it is appended, so however many sources are merged,
+    memory holds one source plus an offset per written object.
+    pypdf's PdfWriter keeps every page until write() instead: about 8x the size
+    of the sources. Only pages (with their annotations) are copied, not outlines
+    or forms.
+    """
+    def __init__(self, output):
+        self.output = output
+        self.pages = 0
+        self._offset = 0
+        self._offsets: List[int] = [0, 0, 0] # by object id; 1 and 2 are written by close()
+        self._kids: List[int] = []
+
+    def append(self, source) -> int:
+        """
+        Appends the pages of `source` (a path or a binary file object) and returns
+        how many there were. A source that can't be read raises before anything of
+        it is written.
+        """
+        reader = PdfReader(source)
+        if reader.is_encrypted:
+            reader.decrypt("")
+
+        first_id = len(self._offsets)
+        ids: Dict[Tuple[int, int], int] = {} # source (number, generation) -> ours
+        queue = deque() # (our id, object) still to write
+
+        def allocate(obj) -> int:
+            object_id = first_id + len(queue) + len(offsets)
+            queue.append((object_id, obj))
+            return object_id
+
+        def ref(reference: IndirectObject) -> int:
+            if reference.pdf is None:
+                return reference.idnum # one of ours: the page tree
+            key = (reference.idnum, reference.generation)
+            if key not in ids:
+                obj = reference.get_object()
+                ids[key] = allocate(NullObject() if obj is None else obj)
+            return ids[key]
+
+        # Serialized in memory first, so a broken source leaves nothing half-written
+        buffer = io.BytesIO()
+        if self._offset == 0:
+            buffer.write(b"%PDF-1.7\n%\xe2\xe3\xcf\xd3\n")
+        offsets = {}
+
+        # Pages first, so links between them resolve to the copied pages
+        pages = []
+        for page in reader.pages:
+            key = None
+            if page.indirect_reference is not None:
+                key = (page.indirect_reference.idnum, page.indirect_reference.generation)
+                if key in ids: # listed twice in the source's page tree
+                    pages.append(ids[key])
+                    continue
+            copy = DictionaryObject(page)
+            for name in INHERITED_PAGE_KEYS:
+                node = page
+                while name not in node and "/Parent" in node:
+                    node = node["/Parent"]
+                if name in node:
+                    copy[name] = node.raw_get(name)
+            copy[NameObject("/Parent")] = IndirectObject(PAGES_ID, 0, None)
+            pages.append(allocate(copy))
+            if key is not None:
+                ids[key] = pages[-1]
+
+        while queue:
+            object_id, obj = queue.popleft()
+            offsets[object_id] = self._offset + buffer.tell()
+            buffer.write(b"%d 0 obj\n" % object_id)
+            _write(obj, buffer, ref)
+            buffer.write(b"\nendobj\n")
+
+        self._offsets.extend(offsets[object_id] for object_id in range(first_id, first_id + len(offsets)))
+        self._kids.extend(pages)
+        self.pages += len(pages)
+        self._write(buffer.getvalue())
+        return len(pages)
+
+    def close(self):
+        """
+        Writes the page tree, catalog and cross-reference table that end the file.
+        """
+        buffer = io.BytesIO()
+        if self._offset == 0:
+            buffer.write(b"%PDF-1.7\n%\xe2\xe3\xcf\xd3\n")
+        self._offsets[CATALOG_ID] = self._offset + buffer.tell()
+        buffer.write(b"%d 0 obj\n<< /Type /Catalog /Pages %d 0 R >>\nendobj\n" % (CATALOG_ID, PAGES_ID))
+        self._offsets[PAGES_ID] = self._offset + buffer.tell()
+        kids = b" ".join(b"%d 0 R" % kid for kid in self._kids)
+        buffer.write(b"%d 0 obj\n<< /Type /Pages /Kids [ %s ] /Count %d >>\nendobj\n" % (PAGES_ID, kids, len(self._kids)))
+
+        xref = self._offset + buffer.tell()
+        buffer.write(b"xref\n0 %d\n0000000000 65535 f \n" % len(self._offsets))
+        for offset in self._offsets[1:]:
+            buffer.write(b"%010d 00000 n \n" % offset)
+        buffer.write(b"trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(self._offsets), CATALOG_ID, xref))
+        self._write(buffer.getvalue())
+
+    def _write(self, data: bytes):
+        self.output.write(data)
+        self._offset += len(data)
+
+
+def _write(obj, stream, ref):
+    """
+    Serializes a pypdf object with its indirect references renumbered by `ref`.
+    """
+    if isinstance(obj, IndirectObject):
+        stream.write(b"%d 0 R" % ref(obj))
+    elif isinstance(obj, DictionaryObject):
+        stream.write(b"<<\n")
+        for key, value in obj.items():
+            if key == "/Length" and isinstance(obj, StreamObject):
+                continue
+            key.write_to_stream(stream)
+            stream.write(b" ")
+            _write(value, stream, ref)
+            stream.write(b"\n")
+        if isinstance(obj, StreamObject):
+            # Still encoded as in the source (pypdf's own clone copies _data too)
+            stream.write(b"/Length %d\n>>\nstream\n" % len(obj._data))
+            stream.write(obj._data)
+            stream.write(b"\nendstream")
+        else:
+            stream.write(b">>")
+    elif isinstance(obj, ArrayObject):
+        stream.write(b"[")
+        for value in obj:
+            stream.write(b" ")
+            _write(value, stream, ref)
+        stream.write(b" ]")
+    else:
+        obj.write_to_stream(stream)
+
+
+class ChunkPipe:
+    """
+    Binary file object one thread writes and another reads chunk by chunk, e.g. a
+    merge being sent while it is written. write() blocks while `max_chunks` wait
+    to be read, so a slow reader holds the writer back instead of the output
+    piling up in memory; once the reader is closed, write() raises.
+    """
+    def __init__(self, max_chunks: int = 8):
+        self._queue = queue.Queue(max_chunks)
+        self._closed = threading.Event()
+
+    def write(self, data: bytes):
+        if data:
+            self._put(bytes(data))
+
+    def finish(self, error: Exception = None):
+        """
+        Ends the stream: the reader gets `error` raised, or the end.
+        """
+        self._put(_END if error is None else error)
+
+    def read_chunk(self):
+        """
+        Next chunk, None at the end. Raises the error the writer finished with.
+        """
+        item = self._queue.get()
+        if item is _END:
+            return None
+        if isinstance(item, Exception):
+            raise item
+        return item
+
+    def chunks(self, first: bytes = None):
+        """
+        Iterates over the remaining chunks (after `first`, if already read) and
+        closes the pipe at the end, or when the iteration is abandoned.
+        """
+        try:
+            chunk = first if first is not None else self.read_chunk()
+            while chunk is not None:
+                yield chunk
+                chunk = self.read_chunk()
+        finally:
+            self.close()
+
+    def close(self):
+        self._closed.set()
+
+    def _put(self, item):
+        while not self._closed.is_set():
+            try:
+                self._queue.put(item, timeout=1)
+                return
+            except queue.Full:
+                pass
+        if item is not _END and not isinstance(item, Exception):
+            raise BrokenPipeError("Reader closed the pipe")
@@ -0,0 +1,141 @@
+import math
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+# Traces taking at least this long are logged (ms); negative turns the log off
+PDF_TIMING_LOG_MS = float(os.environ.get("POSD_PDF_TIMING_LOG_MS", "100"))
+# Recent samples kept per stage for the percentiles
+SAMPLES_PER_STAGE = 1000
+
+
+class Trace:
+    """
+    Stage timings of one PDF operation. Plain attributes only, so worker
+    processes can send theirs back to the API process.
+    """
+    def __init__(self, operation: str):
+        self.operation = operation
+        self.stages: Dict[str, float] = {} # stage -> seconds, in the order first seen
+        self.total = 0.0
+        self.peak_rss_mb: Optional[float] = None # set by worker processes
+
+    def add(self, stage: str, seconds: float):
+        self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+    def summary(self) -> str:
+        stages = ", ".join(f"{stage} {seconds * 1000:.1f}ms" for stage, seconds in self.stages.items())
+        return f"PDF {self.operation}: {self.total * 1000:.1f}ms ({stages})"
+
+
+def percentile(samples: List[float], q: float) -> float:
+    """
+    Nearest-rank percentile of `samples`, q in [0, 1].
+    """
+    ordered = sorted(samples)
+    if not ordered:
+        return 0.0
+    return ordered[max(0, math.ceil(q * len(ordered)) - 1)]
+
+
+class PdfMetrics:
+    """
+    Rolling per-stage latencies of the PDF operations, for /api/metrics/pdf.
+    """
+    def __init__(self, samples: int = SAMPLES_PER_STAGE):
+        self.samples = samples
+        self._lock = threading.Lock()
+        self._operations = {} # operation -> {"count", "peak_rss_mb", "stages": {stage: deque}}
+
+    def record(self, trace: Trace):
+        with self._lock:
+            entry = self._operations.setdefault(trace.operation, {"count": 0, "peak_rss_mb": None, "stages": {}})
+            entry["count"] += 1
+            if trace.peak_rss_mb is not None:
+                entry["peak_rss_mb"] = max(entry["peak_rss_mb"] or 0.0, trace.peak_rss_mb)
+            for stage, seconds in list(trace.stages.items()) + [("total", trace.total)]:
+                entry["stages"].setdefault(stage, deque(maxlen=self.samples)).append(seconds)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            operations = {
+                operation: (entry["count"], entry["peak_rss_mb"], {stage: list(samples) for stage, samples in entry["stages"].items()})
+                for operation, entry in self._operations.items()
+            }
+        return {
+            operation: {
+                "count": count,
+                "peak_rss_mb": peak_rss_mb,
+                "stages": {
+                    stage: {
+                        "samples": len(samples),
+                        "p50_ms": round(percentile(samples, 0.5) * 1000, 2),
+                        "p95_ms": round(percentile(samples, 0.95) * 1000, 2),
+                        "max_ms": round(max(samples) * 1000, 2),
+                    }
+                    for stage, samples in stages.items()
+                }
+            }
+            for operation, (count, peak_rss_mb, stages) in operations.items()
+        }
+
+    def reset(self):
+        with self._lock:
+            self._operations.clear()
+
+
+METRICS = PdfMetrics()
+
+_local = threading.local()
+
+
+def record(trace: Trace, log: bool = False):
+    """
+    Adds a finished trace to METRICS, e.g. one sent back by a worker process.
+    """
+    METRICS.record(trace)
+    if log and PDF_TIMING_LOG_MS >= 0 and trace.total * 1000 >= PDF_TIMING_LOG_MS:
+        print(trace.summary())
+
+
+@contextmanager
+def trace(operation: str):
+    """
+    Times an operation; span()s entered in the same thread become its stages.
+    Only operations that finish are recorded. A nested trace is recorded on its own.
+    """
+    outer = getattr(_local, "trace", None)
+    current = Trace(operation)
+    _local.trace = current
+    started = time.perf_counter()
+    try:
+        yield current
+    finally:
+        _local.trace = outer
+    current.total = time.perf_counter() - started
+    _local.last = current
+    record(current, log=True)
+
+
+@contextmanager
+def span(stage: str):
+    """
+    Times one stage of the enclosing trace (a no-op outside of one).
+    """
+    current = getattr(_local, "trace", None)
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        if current is not None:
+            current.add(stage, time.perf_counter() - started)
+
+
+def last_trace() -> Optional[Trace]:
+    """
+    The trace most recently finished in this thread.
+    """
+    return getattr(_local, "last", None)
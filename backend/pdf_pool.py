@@ -0,0 +1,246 @@
+import multiprocessing
+import os
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Tuple
+
+from backend.pdf_metrics import record
+from backend.pdf_worker import worker_loop
+
+# Workers are spawned, not forked: the API process is multi-threaded by the time
+# the pool starts, and a fresh interpreter is the only safe way to get a clean child.
+_mp = multiprocessing.get_context("spawn")
+
+
+class _Worker:
+    def __init__(self, memory_limit_mb: Optional[float]):
+        self.conn, child_conn = _mp.Pipe()
+        self.process = _mp.Process(target=worker_loop, args=(child_conn, memory_limit_mb), daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.ready = False
+        self.jobs = 0
+
+    def wait_ready(self, timeout: float) -> bool:
+        if self.ready:
+            return True
+        try:
+            if self.conn.poll(timeout):
+                self.ready = self.conn.recv()[0] == "ready"
+        except (EOFError, OSError):
+            # Died during startup
+            self.ready = False
+        return self.ready
+
+    def kill(self):
+        if self.process.is_alive():
+            self.process.kill()
+        self.process.join(timeout=5)
+        self.conn.close()
+
+    def close(self):
+        try:
+            self.conn.send(None)
+        except OSError:
+            pass
+        self.process.join(timeout=5)
+        if self.process.is_alive():
+            self.process.kill()
+        self.conn.close()
+
+
+class PdfWorkerPool:
+    """
+    Long-lived pool of HTML -> PDF worker processes.
+
+    Workers are started (and import xhtml2pdf) ahead of the first job. Each job has
+    a timeout after which its worker is killed and replaced, and optionally a CPU
+    time limit enforced inside the worker. Workers run under an address-space cap,
+    and a worker is recycled after `max_jobs_per_worker` jobs or once its peak RSS
+    passes `recycle_rss_mb`, so leaks in the renderer can't pile up.
+    """
+    def __init__(
+        self,
+        size: int,
+        job_timeout: float = 60.0,
+        job_cpu_seconds: Optional[float] = None,
+        max_jobs_per_worker: int = 200,
+        memory_limit_mb: Optional[float] = 2048,
+        recycle_rss_mb: Optional[float] = 512,
+        startup_timeout: float = 60.0
+    ):
+        self.size = size
+        self.job_timeout = job_timeout
+        self.job_cpu_seconds = job_cpu_seconds
+        self.max_jobs_per_worker = max_jobs_per_worker
+        self.memory_limit_mb = memory_limit_mb
+        self.recycle_rss_mb = recycle_rss_mb
+        self.startup_timeout = startup_timeout
+
+        self._idle = queue.Queue()
+        self._lock = threading.Lock()
+        self._workers = []
+        self._closed = False
+
+    def start(self):
+        with self._lock:
+            while len(self._workers) < self.size:
+                worker = _Worker(self.memory_limit_mb)
+                self._workers.append(worker)
+                self._idle.put(worker)
+
+    def shutdown(self):
+        with self._lock:
+            self._closed = True
+            workers, self._workers = self._workers, []
+        for worker in workers:
+            worker.close()
+
+    def _replace(self, worker: _Worker, kill: bool):
+        if kill:
+            worker.kill()
+        else:
+            worker.close()
+        with self._lock:
+            if worker in self._workers:
+                self._workers.remove(worker)
+            if self._closed:
+                return
+            fresh = _Worker(self.memory_limit_mb)
+            self._workers.append(fresh)
+        self._idle.put(fresh)
+
+    def idle_workers(self) -> int:
+        """
+        Workers waiting for a job right now (a hint: it may change at once).
+        """
+        return self._idle.qsize()
+
+    def convert(
+        self,
+        source_path: str,
+        dest_path: str,
+        timeout: Optional[float] = None,
+        untrusted: bool = False,
+        wait_timeout: Optional[float] = None,
+        statement: bool = False
+    ):
+        """
+        Renders one HTML file to `dest_path`. Blocks until a worker is free, or for at
+        most `wait_timeout` seconds. `untrusted` HTML may not fetch local files or URLs;
+        a `statement` is an Erste statement, rendered without xhtml2pdf where possible.
+        Raises TimeoutError or RuntimeError if the job fails.
+        """
+        if self._closed:
+            raise RuntimeError("PDF worker pool is shut down")
+        if not self._workers:
+            self.start()
+
+        try:
+            worker = self._idle.get(timeout=wait_timeout)
+        except queue.Empty:
+            raise TimeoutError("No PDF worker free, try again later")
+        if not worker.wait_ready(self.startup_timeout):
+            self._replace(worker, kill=True)
+            raise RuntimeError("PDF worker failed to start")
+
+        try:
+            worker.conn.send((source_path, dest_path, self.job_cpu_seconds, untrusted, statement))
+            finished = worker.conn.poll(timeout or self.job_timeout)
+            if finished:
+                status, message, peak_rss_mb, timings = worker.conn.recv()
+        except (EOFError, OSError) as e:
+            # The worker died mid-job (e.g. killed by the OOM killer)
+            self._replace(worker, kill=True)
+            raise RuntimeError(f"PDF worker crashed converting {os.path.basename(source_path)}: {e}")
+
+        if not finished:
+            self._replace(worker, kill=True)
+            raise TimeoutError(f"Converting {os.path.basename(source_path)} timed out")
+
+        worker.jobs += 1
+        if worker.jobs >= self.max_jobs_per_worker or (self.recycle_rss_mb and peak_rss_mb > self.recycle_rss_mb):
+            self._replace(worker, kill=False)
+        else:
+            self._idle.put(worker)
+
+        if status != "ok":
+            raise RuntimeError(message)
+        # The worker's stdout goes nowhere; its timings are logged here
+        record(timings, log=True)
+
+    def convert_many(self, jobs: List[Tuple[str, str]], statement: bool = False) -> List[Optional[Exception]]:
+        """
+        Runs (source_path, dest_path) jobs across all workers.
+        Returns one entry per job, in order: None on success or the exception raised.
+        """
+        def run(job):
+            try:
+                self.convert(*job, statement=statement)
+                return None
+            except Exception as e:
+                return e
+
+        if not jobs:
+            return []
+        with ThreadPoolExecutor(max_workers=min(self.size, len(jobs))) as dispatch:
+            return list(dispatch.map(run, jobs))
+
+
+# Shared pool, created on first use (or at startup to have it warm)
+PDF_WORKERS = int(os.environ.get("POSD_PDF_WORKERS", min(4, os.cpu_count() or 1)))
+
+_pdf_pool: Optional[PdfWorkerPool] = None
+_pdf_pool_lock = threading.Lock()
+
+
+def get_pdf_pool() -> PdfWorkerPool:
+    global _pdf_pool
+    with _pdf_pool_lock:
+        if _pdf_pool is None:
+            _pdf_pool = PdfWorkerPool(PDF_WORKERS)
+            _pdf_pool.start()
+        return _pdf_pool
+
+
+def shutdown_pdf_pool():
+    global _pdf_pool
+    with _pdf_pool_lock:
+        if _pdf_pool is not None:
+            _pdf_pool.shutdown()
+            _pdf_pool = None
+
+
+# Client-supplied HTML (/api/documents/html-to-pdf) gets its own, tighter pool, so a
+# pathological document only ever holds up other conversions of its kind
+SANDBOX_PDF_WORKERS = int(os.environ.get("POSD_SANDBOX_PDF_WORKERS", "1"))
+SANDBOX_JOB_TIMEOUT = float(os.environ.get("POSD_SANDBOX_PDF_TIMEOUT", "30"))
+SANDBOX_JOB_CPU_SECONDS = float(os.environ.get("POSD_SANDBOX_PDF_CPU_SECONDS", "20"))
+SANDBOX_MEMORY_LIMIT_MB = float(os.environ.get("POSD_SANDBOX_PDF_MEMORY_MB", "512"))
+
+_sandbox_pool: Optional[PdfWorkerPool] = None
+
+
+def get_sandbox_pool() -> PdfWorkerPool:
+    global _sandbox_pool
+    with _pdf_pool_lock:
+        if _sandbox_pool is None:
+            _sandbox_pool = PdfWorkerPool(
+                SANDBOX_PDF_WORKERS,
+                job_timeout=SANDBOX_JOB_TIMEOUT,
+                job_cpu_seconds=SANDBOX_JOB_CPU_SECONDS,
+                max_jobs_per_worker=50,
+                memory_limit_mb=SANDBOX_MEMORY_LIMIT_MB,
+                recycle_rss_mb=SANDBOX_MEMORY_LIMIT_MB / 2
+            )
+            _sandbox_pool.start()
+        return _sandbox_pool
+
+
+def shutdown_sandbox_pool():
+    global _sandbox_pool
+    with _pdf_pool_lock:
+        if _sandbox_pool is not None:
+            _sandbox_pool.shutdown()
+            _sandbox_pool = None
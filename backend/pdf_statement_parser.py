@@ -0,0 +1,231 @@
+import re
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+from pypdf import PdfReader
+
+from backend.models import Transaction, TransactionType, TransactionCategory
+from backend.erste_parser import make_transaction_id
+
+PDF_PAGE_WORKERS = min(4, os.cpu_count() or 1)
+
+DATE_RE = re.compile(r'^\d{2}\.\d{2}\.\d{4}\.$')
+AMOUNT_RE = re.compile(r'^\d{1,3}(?:\.\d{3})*,\d{2}$')
+
+# Column layout of the Erste statement table (same as the HTML export):
+# dates | payer/payee + IBAN | ordinal + description | references | outflow | inflow
+# Relative column starts, used when a page has no header row to measure.
+DEFAULT_COLUMN_STARTS = (0.0, 0.10, 0.39, 0.54, 0.80, 0.90)
+HEADER_LABELS = ("Platitelj/Primatelj", "Redni broj", "Poziv na broj platitelja", "Isplata", "Uplata")
+
+
+def _extract_page_lines(args: Tuple[str, int]) -> Tuple[float, List[tuple]]:
+    """
+    Extracts the positioned text lines of one page: (page_width, [(x, y, text, font_size)]).
+    Module level so pages can be farmed out to a process pool.
+    """
+    path, page_index = args
+    page = PdfReader(path).pages[page_index]
+
+    lines = []
+    current = None
+
+    def visitor(text, cm, tm, font_dict, font_size):
+        nonlocal current
+        if not text:
+            return
+        if current is None:
+            # Text space -> page space
+            x = tm[4] * cm[0] + tm[5] * cm[2] + cm[4]
+            y = tm[4] * cm[1] + tm[5] * cm[3] + cm[5]
+            current = [x, y, "", font_size * abs(cm[0] or 1)]
+        # Glyphs missing from the font (e.g. Č in Helvetica) split a line into pieces
+        current[2] += text.rstrip("\n")
+        if text.endswith("\n"):
+            if current[2].strip():
+                lines.append(tuple(current))
+            current = None
+
+    page.extract_text(visitor_text=visitor)
+    if current is not None and current[2].strip():
+        lines.append(tuple(current))
+
+    return float(page.mediabox.width), lines
+
+
+def extract_pdf_pages(path: str) -> List[Tuple[float, List[tuple]]]:
+    """
+    Extracts positioned text for every page, page-parallel for multi-page statements.
+    """
+    page_count = len(PdfReader(path).pages)
+    jobs = [(path, i) for i in range(page_count)]
+    if page_count < 2:
+        return [_extract_page_lines(job) for job in jobs]
+
+    with ProcessPoolExecutor(max_workers=min(page_count, PDF_PAGE_WORKERS)) as pool:
+        return list(pool.map(_extract_page_lines, jobs))
+
+
+def _column_starts(page_width: float, lines: List[tuple]) -> Optional[List[float]]:
+    """
+    Column start positions measured from the table header, if the page has one.
+    """
+    found = {}
+    for x, y, text, _ in lines:
+        for label in HEADER_LABELS:
+            if text.strip().startswith(label) and label not in found:
+                found[label] = x
+    if len(found) != len(HEADER_LABELS):
+        return None
+    return [0.0] + [found[label] for label in HEADER_LABELS]
+
+
+def _text_right_edge(x: float, text: str, font_size: float) -> float:
+    # Amounts are right aligned, so compare where they end rather than where they start.
+    # Digits are roughly half an em wide in the fonts banks use.
+    return x + len(text) * font_size * 0.55
+
+
+def _extract_metadata(lines: List[tuple]) -> dict:
+    metadata = {}
+    labels = {"Naziv klijenta:": "name", "OIB:": "oib", "IBAN:": "iban"}
+    for x, y, text, _ in lines:
+        key = labels.get(text.strip())
+        if not key or key in metadata:
+            continue
+        # Value sits on the same baseline, to the right of the label
+        values = [l for l in lines if abs(l[1] - y) < 1 and l[0] > x]
+        if values:
+            metadata[key] = min(values, key=lambda l: l[0])[2].strip()
+
+    # Address: the lines under the client name in the addressee block
+    if metadata.get("name"):
+        name_lines = [l for l in lines if l[2].strip() == metadata["name"]]
+        if name_lines:
+            nx, ny = max(name_lines, key=lambda l: l[1])[:2]
+            below = sorted((l for l in lines if abs(l[0] - nx) < 1 and l[1] < ny), key=lambda l: -l[1])
+            if len(below) >= 2:
+                metadata["address"] = ", ".join(l[2].strip() for l in below[:2])
+
+    return metadata
+
+
+def _parse_page_rows(page_width: float, lines: List[tuple], columns: List[float], source_filename: Optional[str]) -> List[Transaction]:
+    date_column_end = columns[1]
+
+    # Header rows sit above the first booking; ignore anything at or above them
+    header_y = min((l[1] for l in lines if l[2].strip().startswith(HEADER_LABELS[0])), default=None)
+
+    body = [l for l in lines if header_y is None or l[1] < header_y - 1]
+    col0 = sorted((l for l in body if l[0] < date_column_end), key=lambda l: -l[1])
+
+    # Each booking is anchored on a stacked pair of dates (value date, processing date).
+    # Anything else in the first column (opening/closing balance, recap) anchors a non-booking row.
+    anchors = []
+    i = 0
+    while i < len(col0):
+        x, y, text, size = col0[i]
+        nxt = col0[i + 1] if i + 1 < len(col0) else None
+        if DATE_RE.match(text.strip()) and nxt and DATE_RE.match(nxt[2].strip()) and y - nxt[1] < size * 2:
+            anchors.append(((y + nxt[1]) / 2, text.strip()))
+            i += 2
+        else:
+            anchors.append((y, None))
+            i += 1
+
+    rows = {index: [] for index, anchor in enumerate(anchors) if anchor[1]}
+    for line in body:
+        if line[0] < date_column_end or not anchors:
+            continue
+        nearest = min(range(len(anchors)), key=lambda a: abs(anchors[a][0] - line[1]))
+        if nearest in rows:
+            rows[nearest].append(line)
+
+    transactions = []
+    for index, row_lines in rows.items():
+        tx_date = datetime.strptime(anchors[index][1], '%d.%m.%Y.').date()
+        row_lines.sort(key=lambda l: -l[1])
+
+        amount = None
+        tx_type = None
+        text_lines = []
+        for line in row_lines:
+            x, y, text, size = line
+            text = text.strip()
+            right_edge = _text_right_edge(x, text, size)
+            if not AMOUNT_RE.match(text) or right_edge <= columns[4]:
+                text_lines.append(line)
+                continue
+            amount = float(text.replace('.', '').replace(',', '.'))
+            is_inflow = right_edge > columns[5]
+            tx_type = TransactionType.INFLOW if is_inflow else TransactionType.OUTFLOW
+
+        def column_text(col):
+            start = columns[col]
+            end = columns[col + 1] if col + 1 < len(columns) else page_width
+            return [l[2].strip() for l in text_lines if start <= l[0] < end]
+
+        description = " ".join(" ".join(column_text(1)).split())
+        reference = " ".join(column_text(3))
+
+        if amount is None:
+            continue
+
+        if tx_type == TransactionType.INFLOW:
+            category = TransactionCategory.BUSINESS_INCOME # Default for positive
+        else:
+            category = TransactionCategory.BUSINESS_EXPENSE
+
+        transactions.append(Transaction(
+            id=make_transaction_id(tx_date, description, amount, reference),
+            date=tx_date,
+            description=description,
+            amount=amount,
+            type=tx_type,
+            category=category,
+            raw_reference=reference,
+            source_file=source_filename
+        ))
+
+    return transactions
+
+
+def parse_erste_pdf(path: str, source_filename: str = None) -> Tuple[List[Transaction], dict]:
+    """
+    Parses an Erste statement PDF and returns (transactions, metadata),
+    the same shape as parse_erste_html.
+    Rows are rebuilt from text positions: the column layout is taken from the
+    table header (falling back to the HTML export's column widths).
+    """
+    pages = extract_pdf_pages(path)
+
+    metadata = {}
+    transactions = []
+    columns = None
+    for page_width, lines in pages:
+        if not metadata:
+            metadata = _extract_metadata(lines)
+        # Continuation pages may not repeat the header; keep the last measured layout
+        columns = _column_starts(page_width, lines) or columns or [page_width * c for c in DEFAULT_COLUMN_STARTS]
+        transactions.extend(_parse_page_rows(page_width, lines, columns, source_filename))
+
+    return transactions, metadata
+
+
+def is_pdf(head: bytes) -> bool:
+    return head.lstrip()[:5] == b'%PDF-'
+
+
+if __name__ == "__main__":
+    # Test run
+    import sys
+    if len(sys.argv) > 1:
+        fpath = sys.argv[1]
+        print(f"Parsing {fpath}...")
+        txs, meta = parse_erste_pdf(fpath)
+        print(f"Metadata: {meta}")
+        print(f"Found {len(txs)} transactions.")
+        for t in txs:
+            print(f"{t.date} | {t.amount} | {t.type} | {t.description[:50]}...")
@@ -1,35 +1,183 @@
 import sys
 import io
+import os
+import signal
+try:
+    import resource
+except ImportError:
+    resource = None # Windows: no rlimits
 try:
     from xhtml2pdf import pisa
 except ImportError:
     pisa = None
+try:
+    from xhtml2pdf.config.resources import ResourceAccessPolicy
+except ImportError:
+    ResourceAccessPolicy = None # older xhtml2pdf: no fetch policy
+try:
+    from backend.statement_pdf_native import render_statement_pdf
+except ImportError:
+    render_statement_pdf = None
+from backend.erste_parser import parse_erste_statement
+from backend.pdf_metrics import last_trace, span, trace
 
-def convert_html_to_pdf(source_path, dest_path):
+# "native" draws statements from their parsed contents with reportlab, falling back
+# to xhtml2pdf for anything it can't lay out; "html" always goes through xhtml2pdf
+STATEMENT_RENDERER = os.environ.get("POSD_STATEMENT_RENDERER", "native")
+
+def _untrusted_policy():
+    # Client-supplied HTML may not read local files or reach the network (SSRF);
+    # everything it needs has to be inline (data: URIs)
+    if ResourceAccessPolicy is None:
+        return None
+    return ResourceAccessPolicy.server(base_dir=None, allow_remote=False)
+
+def render_html_to_pdf(source_path, dest_path, untrusted=False):
+    """
+    Renders an HTML file to a PDF file. Raises on failure.
+    """
     if pisa is None:
-        print("Error: xhtml2pdf not installed")
-        sys.exit(1)
+        raise RuntimeError("xhtml2pdf not installed")
+
+    with trace("html-to-pdf"):
+        with span("read"):
+            with open(source_path, "r", encoding="utf-8") as f:
+                source_html = f.read()
+        _pisa_to_file(source_html, source_path, dest_path, untrusted)
+
+def _pisa_to_file(source_html, source_path, dest_path, untrusted=False):
+    options = {}
+    if untrusted and ResourceAccessPolicy is not None:
+        options["resource_policy"] = _untrusted_policy()
+    # HTML/CSS parsing, layout and writing all happen inside CreatePDF
+    with span("pisa"), open(dest_path, "wb") as output_file:
+        pisa_status = pisa.CreatePDF(source_html, dest=output_file, **options)
+
+    if pisa_status.err:
+        raise RuntimeError(f"Error converting {source_path}")
+
+def render_statement_to_pdf(source_path, dest_path):
+    """
+    Renders an Erste statement to a PDF file, natively when STATEMENT_RENDERER
+    allows and the statement parses, otherwise with xhtml2pdf. Raises on failure.
+    """
+    with trace("statement"):
+        with span("read"):
+            with open(source_path, "r", encoding="utf-8") as f:
+                source_html = f.read()
+
+        if STATEMENT_RENDERER == "native" and render_statement_pdf is not None:
+            try:
+                with span("parse"):
+                    statement = parse_erste_statement(source_html)
+                if statement is not None:
+                    with span("render"):
+                        render_statement_pdf(statement, dest_path)
+                    return
+            except (MemoryError, TimeoutError):
+                raise
+            except Exception:
+                # Not laid out the way the native renderer expects: fall through to
+                # xhtml2pdf (the "pisa" stage in /api/metrics/pdf counts these)
+                pass
+
+        if pisa is None:
+            raise RuntimeError("xhtml2pdf not installed")
+        _pisa_to_file(source_html, source_path, dest_path)
+
+def convert_html_to_pdf(source_path, dest_path):
     try:
-        with open(source_path, "r", encoding="utf-8") as f:
-            source_html = f.read()
-            
-        with open(dest_path, "wb") as output_file:
-            pisa_status = pisa.CreatePDF(source_html, dest=output_file)
-            
-        if pisa_status.err:
-            print(f"Error converting {source_path}")
-            sys.exit(1)
-            
+        render_html_to_pdf(source_path, dest_path)
         print(f"Successfully converted {source_path}")
         sys.exit(0)
-        
+
     except Exception as e:
         print(f"Exception converting {source_path}: {e}")
         sys.exit(1)
 
+def _peak_rss_mb():
+    if resource is None:
+        return 0.0
+    # ru_maxrss is in KB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def _cpu_seconds_used():
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+def _limit_cpu(seconds):
+    """
+    Lets the next job use `seconds` of CPU time (None lifts the limit).
+    RLIMIT_CPU counts the whole process, so the soft limit is moved past what
+    earlier jobs used; the kernel then sends SIGXCPU once a second until it's raised.
+    """
+    if resource is None:
+        return
+    _, hard = resource.getrlimit(resource.RLIMIT_CPU)
+    soft = hard
+    if seconds:
+        soft = int(_cpu_seconds_used() + seconds) + 1
+        if hard != resource.RLIM_INFINITY:
+            soft = min(soft, hard)
+    resource.setrlimit(resource.RLIMIT_CPU, (soft, hard))
+
+def _on_cpu_limit(signum, frame):
+    raise TimeoutError("CPU time limit exceeded")
+
+def worker_loop(conn, memory_limit_mb=None):
+    """
+    Entry point of a pooled worker process (see backend.pdf_pool).
+    xhtml2pdf is already imported by the time the worker reports ready, so jobs
+    never pay the import. Jobs are (source_path, dest_path, cpu_seconds, untrusted,
+    statement), `statement` picking render_statement_to_pdf; each reply is
+    ("ok" | "error", message, peak_rss_mb, Trace or None).
+    None shuts the worker down.
+    """
+    if memory_limit_mb and resource is not None:
+        # Hard cap: a runaway document fails with MemoryError instead of swapping the host
+        limit = int(memory_limit_mb * 1024 * 1024)
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    if hasattr(signal, "SIGXCPU"):
+        signal.signal(signal.SIGXCPU, _on_cpu_limit)
+
+    # Keep the parent's log readable: xhtml2pdf warns about every missing glyph
+    sys.stdout = io.StringIO()
+    import logging
+    logging.getLogger("xhtml2pdf").setLevel(logging.ERROR)
+
+    conn.send(("ready", os.getpid(), _peak_rss_mb()))
+    while True:
+        try:
+            job = conn.recv()
+        except EOFError:
+            return
+        if job is None:
+            return
+        source_path, dest_path, cpu_seconds, untrusted, statement = job
+        try:
+            _limit_cpu(cpu_seconds)
+            if statement:
+                render_statement_to_pdf(source_path, dest_path)
+            else:
+                render_html_to_pdf(source_path, dest_path, untrusted)
+            timings = last_trace()
+            timings.peak_rss_mb = _peak_rss_mb()
+            reply = ("ok", "", timings.peak_rss_mb, timings)
+        except MemoryError:
+            reply = ("error", f"Out of memory converting {source_path}", _peak_rss_mb(), None)
+        except Exception as e:
+            reply = ("error", f"Exception converting {source_path}: {e}", _peak_rss_mb(), None)
+        try:
+            _limit_cpu(None)
+        except TimeoutError:
+            # SIGXCPU landed between the job and lifting the limit
+            _limit_cpu(None)
+        conn.send(reply)
+        sys.stdout = io.StringIO()
+
 if __name__ == "__main__":
     if len(sys.argv) != 3:
         print("Usage: python pdf_worker.py <input_html> <output_pdf>")
         sys.exit(1)
-        
+
     convert_html_to_pdf(sys.argv[1], sys.argv[2])
@@ -0,0 +1,53 @@
+import random
+import threading
+from typing import Callable, Optional
+
+
+class PeriodicJob:
+    """
+    Runs `func` on a daemon thread every `interval` seconds.
+    Each wait is randomised by +/- `jitter` (a fraction of the interval) so runs
+    don't line up with other clients hitting the same API. Runs never overlap:
+    the next wait only starts once the previous run has returned.
+    """
+    def __init__(
+        self,
+        name: str,
+        interval: float,
+        func: Callable[[], None],
+        jitter: float = 0.1,
+        initial_delay: Optional[float] = None
+    ):
+        self.name = name
+        self.interval = interval
+        self.func = func
+        self.jitter = jitter
+        self.initial_delay = interval if initial_delay is None else initial_delay
+
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+        self._thread.start()
+        print(f"Scheduled {self.name} every {self.interval}s")
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def _delay(self, base: float) -> float:
+        return max(0.0, base * (1 + random.uniform(-self.jitter, self.jitter)))
+
+    def _run(self):
+        delay = self._delay(self.initial_delay)
+        while not self._stop.wait(delay):
+            try:
+                self.func()
+            except Exception as e:
+                print(f"{self.name} failed: {e}")
+            delay = self._delay(self.interval)
@@ -0,0 +1,106 @@
+from typing import Iterator, List, Optional, Tuple
+
+from backend.models import Transaction
+from backend.erste_parser import parse_erste_html
+from backend.camt_parser import is_camt053, iter_camt053_transactions
+from backend.pdf_statement_parser import is_pdf, parse_erste_pdf
+
+# How much of a file is read to pick a parser
+SNIFF_BYTES = 4096
+
+
+class StatementParser:
+    """
+    Base class for bank statement parsers.
+    `sniff` must decide from the first SNIFF_BYTES of a file alone, so picking a
+    parser never costs a full parse. `iter_transactions` yields Transactions and
+    fills `metadata` (oib, name, address, iban) as it goes.
+    """
+    name = ""
+    # File extensions this parser handles, used to pick email attachments
+    extensions: Tuple[str, ...] = ()
+
+    def sniff(self, head: bytes) -> bool:
+        raise NotImplementedError
+
+    def iter_transactions(self, path: str, source_filename: str, metadata: dict) -> Iterator[Transaction]:
+        raise NotImplementedError
+
+
+class ErsteHtmlParser(StatementParser):
+    name = "erste_html"
+    extensions = ('.html',)
+
+    def sniff(self, head: bytes) -> bool:
+        # The statement's stylesheet (within the first KB) styles the 'trItems' rows
+        return b'trItems' in head
+
+    def iter_transactions(self, path, source_filename, metadata):
+        with open(path, 'r', encoding='utf-8') as f:
+            content = f.read()
+        transactions, found = parse_erste_html(content, source_filename=source_filename)
+        metadata.update(found)
+        yield from transactions
+
+
+class Camt053Parser(StatementParser):
+    name = "camt053"
+    extensions = ('.xml',)
+
+    def sniff(self, head: bytes) -> bool:
+        return is_camt053(head)
+
+    def iter_transactions(self, path, source_filename, metadata):
+        yield from iter_camt053_transactions(path, source_filename, metadata)
+
+
+class ErstePdfParser(StatementParser):
+    name = "erste_pdf"
+    extensions = ('.pdf',)
+
+    def sniff(self, head: bytes) -> bool:
+        return is_pdf(head)
+
+    def iter_transactions(self, path, source_filename, metadata):
+        transactions, found = parse_erste_pdf(path, source_filename=source_filename)
+        metadata.update(found)
+        yield from transactions
+
+
+# Registration order is also the order of preference between formats
+_parsers: List[StatementParser] = []
+
+
+def register_parser(parser: StatementParser):
+    _parsers.append(parser)
+
+
+def get_parsers() -> List[StatementParser]:
+    return list(_parsers)
+
+
+def statement_extensions() -> Tuple[str, ...]:
+    """
+    All importable file extensions, most preferred first.
+    """
+    extensions = []
+    for parser in _parsers:
+        extensions.extend(ext for ext in parser.extensions if ext not in extensions)
+    return tuple(extensions)
+
+
+def detect_parser(path: str) -> Optional[StatementParser]:
+    """
+    Picks the parser for a file by sniffing its first few KB.
+    """
+    with open(path, 'rb') as f:
+        head = f.read(SNIFF_BYTES)
+    for parser in _parsers:
+        if parser.sniff(head):
+            return parser
+    return None
+
+
+register_parser(ErsteHtmlParser())
+register_parser(Camt053Parser())
+register_parser(ErstePdfParser())
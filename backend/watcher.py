@@ -0,0 +1,180 @@
+import os
+import threading
+import time
+from typing import Dict, List
+
+try:
+    from watchdog.observers import Observer
+    from watchdog.events import FileSystemEventHandler
+except ImportError:
+    Observer = None
+    FileSystemEventHandler = object
+
+from backend.ingest import IngestBatch, get_parse_pool, is_claimed, parse_statement_file
+from backend.statement_parsers import statement_extensions
+
+
+class _DataDirHandler(FileSystemEventHandler):
+    def __init__(self, watcher: "StatementWatcher"):
+        self.watcher = watcher
+
+    def on_created(self, event):
+        if not event.is_directory:
+            self.watcher.notify(event.src_path)
+
+    def on_modified(self, event):
+        if not event.is_directory:
+            self.watcher.notify(event.src_path)
+
+    def on_closed(self, event):
+        if not event.is_directory:
+            self.watcher.notify(event.src_path)
+
+    def on_moved(self, event):
+        if not event.is_directory:
+            self.watcher.notify(event.dest_path)
+
+
+class StatementWatcher:
+    """
+    Watches DATA_DIR for statement files dropped in by other tooling and imports them.
+    Uses inotify (via watchdog) when available and falls back to polling file
+    stats. Events are debounced so a file that is still being written, or a burst
+    of files, becomes one batched commit once things have been quiet for
+    `debounce_seconds`. Files in the processed ledger, and files that failed to
+    parse, are skipped unless they changed since, and so are files an upload or
+    Gmail sync is still ingesting.
+    """
+    def __init__(self, data_dir: str, db, debounce_seconds: float = 2.0, poll_interval: float = 5.0):
+        self.data_dir = data_dir
+        self.db = db
+        self.debounce_seconds = debounce_seconds
+        self.poll_interval = poll_interval
+
+        self._pending: Dict[str, float] = {} # path -> time of last event
+        self._cond = threading.Condition()
+        self._stop = threading.Event()
+        self._observer = None
+        self._threads: List[threading.Thread] = []
+
+    def start(self):
+        os.makedirs(self.data_dir, exist_ok=True)
+
+        if Observer is not None:
+            try:
+                self._observer = Observer()
+                self._observer.schedule(_DataDirHandler(self), self.data_dir, recursive=False)
+                self._observer.start()
+                print(f"Watching {self.data_dir} for new statements (inotify)")
+            except OSError as e:
+                # e.g. inotify watch limit reached
+                print(f"File system events unavailable ({e}), polling {self.data_dir} instead")
+                self._observer = None
+
+        if self._observer is None:
+            self._start_thread(self._run_poller, "statement-poller")
+            print(f"Polling {self.data_dir} for new statements every {self.poll_interval}s")
+
+        self._start_thread(self._run_ingest, "statement-ingest")
+
+        # Catch up on anything that arrived while the server was down
+        for entry in os.scandir(self.data_dir):
+            if entry.is_file():
+                self.notify(entry.path)
+
+    def stop(self):
+        self._stop.set()
+        if self._observer is not None:
+            self._observer.stop()
+            self._observer.join(timeout=5)
+        with self._cond:
+            self._cond.notify_all()
+        for thread in self._threads:
+            thread.join(timeout=5)
+
+    def _start_thread(self, target, name):
+        thread = threading.Thread(target=target, name=name, daemon=True)
+        thread.start()
+        self._threads.append(thread)
+
+    def _is_candidate(self, path: str) -> bool:
+        filename = os.path.basename(path)
+        if filename.startswith('.') or not filename.lower().endswith(statement_extensions()):
+            return False
+        # The DB itself lives in DATA_DIR and is rewritten on every commit
+        if os.path.abspath(path) == os.path.abspath(self.db.db_path):
+            return False
+        if is_claimed(filename) or self.db.is_file_rejected(filename):
+            return False
+        return not self.db.is_file_current(filename)
+
+    def notify(self, path: str):
+        if not self._is_candidate(path):
+            return
+        with self._cond:
+            self._pending[path] = time.monotonic()
+            self._cond.notify()
+
+    def _run_poller(self):
+        # Fallback: compare (mtime, size) of the directory entries; nothing is read or parsed
+        seen = {}
+        while not self._stop.wait(self.poll_interval):
+            try:
+                entries = list(os.scandir(self.data_dir))
+            except OSError as e:
+                print(f"Polling {self.data_dir} failed: {e}")
+                continue
+            current = {}
+            for entry in entries:
+                if not entry.is_file():
+                    continue
+                stat = entry.stat()
+                current[entry.path] = (stat.st_mtime_ns, stat.st_size)
+                if seen.get(entry.path) != current[entry.path]:
+                    self.notify(entry.path)
+            seen = current
+
+    def _run_ingest(self):
+        while not self._stop.is_set():
+            with self._cond:
+                while not self._pending and not self._stop.is_set():
+                    self._cond.wait()
+                # Debounce: wait until no new events arrived for debounce_seconds
+                while self._pending and not self._stop.is_set():
+                    quiet_for = time.monotonic() - max(self._pending.values())
+                    if quiet_for >= self.debounce_seconds:
+                        break
+                    self._cond.wait(self.debounce_seconds - quiet_for)
+                if self._stop.is_set():
+                    return
+                paths = list(self._pending)
+                self._pending.clear()
+
+            try:
+                self._ingest(paths)
+            except Exception as e:
+                print(f"Watch folder ingest failed: {e}")
+
+    def _ingest(self, paths: List[str]):
+        # Re-check: uploads and Gmail sync write into DATA_DIR and commit on their own
+        paths = [p for p in paths if os.path.exists(p) and self._is_candidate(p)]
+        if not paths:
+            return
+
+        batch = IngestBatch()
+        rejected = []
+        futures = {path: get_parse_pool().submit(parse_statement_file, path) for path in paths}
+        for path, future in futures.items():
+            try:
+                batch.add(*future.result())
+            except Exception as e:
+                print(f"Skipping {os.path.basename(path)} until it changes: {e}")
+                rejected.append(os.path.basename(path))
+        if rejected:
+            self.db.mark_files_rejected(rejected)
+
+        # A writer may have claimed and committed a file while it was being parsed here
+        batch.entries = [entry for entry in batch.entries if self._is_candidate(os.path.join(self.data_dir, entry[0]))]
+        if len(batch):
+            added = batch.commit(self.db)
+            print(f"Watch folder imported {len(added)} statement(s), {sum(added.values())} new transactions")
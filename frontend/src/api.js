@@ -172,6 +172,14 @@ export const deleteInvoice = async (id) => {
     return response.data;
 };
 
+// Plain URL so the browser streams the ZIP to disk instead of buffering a blob
+export const getInvoiceExportUrl = (year, status = '') => {
+    const params = new URLSearchParams();
+    if (year) params.append('year', year);
+    if (status) params.append('status', status);
+    return `/api/invoices/export?${params.toString()}`;
+};
+
 export const downloadInvoicePdf = async (id) => {
     const response = await api.get(`/invoices/${id}/pdf`, {
         responseType: 'blob'
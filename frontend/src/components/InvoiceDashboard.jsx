@@ -1,5 +1,5 @@
 import React, { useState, useEffect } from 'react';
-import { fetchInvoices, getInvoiceStats, deleteInvoice, downloadInvoicePdf } from '../api';
+import { fetchInvoices, getInvoiceStats, deleteInvoice, downloadInvoicePdf, getInvoiceExportUrl } from '../api';
 import { Plus, Search, Filter, FileText, CheckCircle, AlertCircle, Clock, MoreHorizontal, Trash2, Edit, Download } from 'lucide-react';
 import clsx from 'clsx';
 import { format } from 'date-fns';
@@ -157,6 +157,14 @@ const InvoiceDashboard = ({ onCreateNew, onEdit }) => {
                         {[2024, 2025, 2026].map(y => <option key={y} value={y}>{y}</option>)}
                     </select>
 
+                    <a
+                        href={getInvoiceExportUrl(year, statusFilter)}
+                        className="flex items-center gap-2 bg-white dark:bg-slate-800 border border-slate-200 dark:border-slate-700 text-slate-700 dark:text-slate-300 hover:bg-slate-50 dark:hover:bg-slate-700 px-4 py-2 rounded-lg text-sm font-medium transition-all"
+                    >
+                        <Download size={16} />
+                        Izvoz PDF (ZIP)
+                    </a>
+
                     <button
                         onClick={onCreateNew}
                         className="flex items-center gap-2 bg-indigo-600 hover:bg-indigo-700 text-white px-5 py-2.5 rounded-lg shadow-lg shadow-indigo-200 dark:shadow-none transition-all font-medium"
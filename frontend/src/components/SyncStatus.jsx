@@ -2,6 +2,9 @@ import React, { useEffect, useState, useRef } from 'react';
 import { X, CheckCircle, AlertCircle, Loader2 } from 'lucide-react';
 import clsx from 'clsx';
 
+// Same size as the server's log ring buffer
+const MAX_LOGS = 500;
+
 const SyncStatus = ({ onClose }) => {
     const [status, setStatus] = useState('connecting'); // connecting, running, completed, error
     const [logs, setLogs] = useState([]);
@@ -11,21 +14,36 @@ const SyncStatus = ({ onClose }) => {
     useEffect(() => {
         const eventSource = new EventSource('http://localhost:8000/api/sync/events');
 
-        eventSource.onmessage = (event) => {
+        const parse = (handler) => (event) => {
             try {
-                const data = JSON.parse(event.data);
-                setStatus(data.status);
-                setLogs(data.logs);
-                setProgress({ current: data.progress, total: data.total });
-
-                if (data.status === 'completed' || data.status === 'error') {
-                    // Optionally auto-close or keep open for review
-                }
+                handler(JSON.parse(event.data));
             } catch (err) {
                 console.error("Error parsing sync event:", err);
             }
         };
 
+        // Full state on connect (and after a reset or resync), deltas afterwards
+        eventSource.addEventListener('snapshot', parse((data) => {
+            setStatus(data.status);
+            setLogs(data.logs);
+            setProgress({ current: data.progress, total: data.total });
+        }));
+
+        eventSource.addEventListener('log', parse((entry) => {
+            setLogs((prev) => {
+                const next = [...prev, entry];
+                return next.length > MAX_LOGS ? next.slice(next.length - MAX_LOGS) : next;
+            });
+        }));
+
+        eventSource.addEventListener('progress', parse((data) => {
+            setProgress({ current: data.progress, total: data.total });
+        }));
+
+        eventSource.addEventListener('status', parse((data) => {
+            setStatus(data.status);
+        }));
+
         eventSource.onerror = (err) => {
             console.error("EventSource failed:", err);
             // eventSource.close(); // Don't close immediately on minor network blips, but maybe on fatal
@@ -0,0 +1,113 @@
+"""
+End-to-end Gmail sync benchmark against scripts/fake_gmail_server.py.
+
+Runs the real run_gmail_sync (listing, batching, rate limiting, parsing, DB commits)
+in a scratch directory over the whole data/IZV_*.html archive and reports:
+
+    1. full sync         - empty ledger, every statement downloaded and imported
+    2. incremental sync  - a few new statements delivered, found via history.list
+    3. no-op sync        - nothing new
+
+Usage:
+    python scripts/benchmark_gmail_sync.py --latency 0.05 --error-rate 0.01
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+sys.path.insert(0, os.path.join(REPO_ROOT, "scripts"))
+
+from fake_gmail_server import serve
+
+
+def _write_fake_token(path: str):
+    # Valid for a day, so authenticate() never tries to refresh against Google
+    expiry = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(time.time() + 86400))
+    with open(path, "w") as f:
+        json.dump({
+            "token": "fake-token",
+            "refresh_token": "fake-refresh-token",
+            "client_id": "fake",
+            "client_secret": "fake",
+            "token_uri": "https://oauth2.googleapis.com/token",
+            "expiry": expiry,
+        }, f)
+
+
+def _timed_sync(main, server, label: str) -> dict:
+    before = dict(server.stats)
+    started = time.perf_counter()
+    main.run_gmail_sync()
+    elapsed = time.perf_counter() - started
+
+    status = main.sync_manager.status
+    messages = main.sync_manager.total
+    calls = server.stats["calls"] - before["calls"]
+    result = {
+        "label": label,
+        "status": status,
+        "messages": messages,
+        "seconds": elapsed,
+        "msgs_per_sec": messages / elapsed if elapsed else 0.0,
+        "http_requests": server.stats["http_requests"] - before["http_requests"],
+        "api_calls": calls,
+        "rate_limited": server.stats["rate_limited"] - before["rate_limited"],
+        "mb_received": (server.stats["bytes_sent"] - before["bytes_sent"]) / 1e6,
+    }
+    print(
+        f"{label:<12} {status:<9} {messages:>5} msgs {elapsed:>8.2f}s {result['msgs_per_sec']:>8.1f} msg/s "
+        f"{result['http_requests']:>5} HTTP {calls:>5} calls {result['rate_limited']:>4} x429 {result['mb_received']:>7.2f} MB"
+    )
+    return result
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument("--archive", default=os.path.join(REPO_ROOT, "data"))
+    arg_parser.add_argument("--latency", type=float, default=0.05, help="seconds per HTTP request")
+    arg_parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of calls answered with 429")
+    arg_parser.add_argument("--quota", type=int, default=None, help="server-side quota units per second")
+    arg_parser.add_argument("--new", type=int, default=5, help="statements delivered before the incremental run")
+    arg_parser.add_argument("--json", help="write the results to this file")
+    args = arg_parser.parse_args()
+
+    server = serve(args.archive, latency=args.latency, error_rate=args.error_rate, quota_units=args.quota)
+    total = len(server.mailbox.files)
+    server.mailbox.delivered = max(total - args.new, 0)
+    print(f"Fake Gmail on {server.url}: {total} statements, latency {args.latency}s, error rate {args.error_rate}")
+
+    workdir = tempfile.mkdtemp(prefix="posd-gmail-bench-")
+    os.chdir(workdir)
+    os.makedirs("data")
+    _write_fake_token(os.path.join("data", "token.json"))
+
+    # backend.main reads its configuration at import time
+    os.environ["POSD_GMAIL_API_ENDPOINT"] = server.url
+    os.environ["POSD_WATCH_DATA_DIR"] = "0"
+    os.environ["POSD_GMAIL_SYNC_INTERVAL"] = "0"
+    # Measures the sync alone, not the PDF pre-rendering it would trigger
+    os.environ["POSD_WARM_PDF_CACHE"] = "0"
+    import backend.main as app_main
+
+    results = [_timed_sync(app_main, server, "full")]
+    server.mailbox.deliver(args.new)
+    results.append(_timed_sync(app_main, server, "incremental"))
+    results.append(_timed_sync(app_main, server, "no-op"))
+
+    imported = len(app_main.db.load_transactions())
+    print(f"Transactions in DB: {imported} (scratch dir {workdir})")
+    app_main.shutdown_parse_pool()
+    app_main.pdf_cache.shutdown()
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"latency": args.latency, "error_rate": args.error_rate, "runs": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
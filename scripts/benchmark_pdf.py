@@ -0,0 +1,232 @@
+"""
+PDF rendering benchmark.
+
+Runs the real rendering paths in a scratch directory and reports p50/p95 latency,
+the per-stage breakdown recorded by backend.pdf_metrics and peak RSS (of this
+process and of the PDF workers) for:
+
+    1. invoices      - representative invoices of 1, 5, 25 and 100 items
+    2. memorandum    - a PO-SD memorandum over synthetic inflows (5,000 by default)
+    3. merge (cold)  - merging the first statements of the archive, empty PDF cache
+    4. merge (warm)  - the same merge again, every statement cached
+
+Usage:
+    python scripts/benchmark_pdf.py --statements 50 --memorandum-rows 5000
+    POSD_INVOICE_RENDERER=html python scripts/benchmark_pdf.py --skip-merge
+    POSD_STATEMENT_RENDERER=html python scripts/benchmark_pdf.py --invoice-runs 1
+"""
+import argparse
+import io
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+ISSUER = {
+    "name": "Obrt za usluge, vl. Ivan Horvat",
+    "address": "Ulica Stjepana Radića 10, 42000 Varaždin",
+    "oib": "12345678903",
+    "iban": "HR1210010051863000160",
+}
+
+DESCRIPTIONS = [
+    "Izrada web stranice", "Održavanje sustava", "Konzultacije", "Grafički dizajn",
+    "Izrada mobilne aplikacije prema specifikaciji naručitelja, uključujući testiranje i objavu",
+    "Hosting i domena", "Savjetovanje o poslovnim procesima", "Edukacija djelatnika",
+]
+
+
+class _PeakRss:
+    """
+    Samples this process's RSS in the background; peak_mb is None where /proc is missing.
+    """
+    def __init__(self, interval: float = 0.02):
+        self.interval = interval
+        self.peak_mb = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    @staticmethod
+    def _rss_mb():
+        try:
+            with open("/proc/self/statm") as f:
+                return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+        except (OSError, ValueError):
+            return None
+
+    def _sample(self):
+        rss = self._rss_mb()
+        if rss is not None:
+            self.peak_mb = max(self.peak_mb or 0.0, rss)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._sample()
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self._sample()
+
+
+def _make_invoice(items: int, seed: int):
+    from backend.models import Invoice, InvoiceItem
+
+    rnd = random.Random(seed)
+    lines = []
+    subtotal = 0.0
+    for i in range(items):
+        quantity = rnd.randint(1, 10)
+        price = round(rnd.uniform(20, 900), 2)
+        discount = rnd.choice([0, 0, 0, 5, 10])
+        subtotal += quantity * price * (1 - discount / 100)
+        lines.append(InvoiceItem(id=str(i), description=rnd.choice(DESCRIPTIONS), quantity=quantity, price=price, discount=discount))
+    issue_date = date(2025, 3, 1) + timedelta(days=seed % 300)
+    return Invoice(
+        id=f"bench-{items}-{seed}", number=f"{seed}-1-1", year=2025,
+        issue_date=issue_date, due_date=issue_date + timedelta(days=15),
+        client_name="Primjer d.o.o.", client_oib="98765432106",
+        client_address="Ilica 1", client_city="Zagreb", client_zip="10000",
+        items=lines, notes="Plaćanje u roku od 15 dana. Obveznik nije u sustavu PDV-a.",
+        subtotal=round(subtotal, 2), tax_total=0.0, total_amount=round(subtotal, 2)
+    )
+
+
+def _make_inflows(count: int, year: int):
+    from backend.models import Transaction
+
+    rnd = random.Random(count)
+    words = ["Uplata", "po računu", "za usluge", "Primjer d.o.o.", "održavanja", "web stranice", "HR00 1234", "konzultacije"]
+    transactions = []
+    for i in range(count):
+        excluded = i % 9 == 0
+        transactions.append(Transaction(
+            id=str(i), date=date(year, 1, 1) + timedelta(days=i * 365 // count),
+            description=" ".join(rnd.choice(words) for _ in range(rnd.randint(2, 12))),
+            amount=round(rnd.uniform(10, 3000), 2), type="inflow", category="business_income",
+            is_excluded_from_posd=excluded, posd_note="Povrat pozajmice vlasnika" if excluded and i % 2 else None
+        ))
+    return transactions
+
+
+def _run(label: str, runs: int, fn) -> dict:
+    from backend.pdf_metrics import METRICS, percentile
+
+    METRICS.reset()
+    timings = []
+    with _PeakRss() as rss:
+        for _ in range(runs):
+            started = time.perf_counter()
+            fn()
+            timings.append(time.perf_counter() - started)
+    stages = METRICS.snapshot()
+    worker_rss = max((op["peak_rss_mb"] for op in stages.values() if op["peak_rss_mb"]), default=None)
+
+    result = {
+        "label": label,
+        "runs": runs,
+        "p50_ms": percentile(timings, 0.5) * 1000,
+        "p95_ms": percentile(timings, 0.95) * 1000,
+        "max_ms": max(timings) * 1000,
+        "peak_rss_mb": rss.peak_mb,
+        "worker_peak_rss_mb": worker_rss,
+        "stages": stages,
+    }
+    print(
+        f"{label:<16} {runs:>4} runs  p50 {result['p50_ms']:>9.1f}ms  p95 {result['p95_ms']:>9.1f}ms  "
+        f"peak RSS {_mb(rss.peak_mb)}  workers {_mb(worker_rss)}"
+    )
+    for operation, entry in stages.items():
+        breakdown = "  ".join(
+            f"{stage} {s['p50_ms']:.1f}/{s['p95_ms']:.1f}" for stage, s in entry["stages"].items() if stage != "total"
+        )
+        print(f"    {operation:<12} x{entry['count']:<5} p50/p95 ms: {breakdown}")
+    return result
+
+
+def _mb(value) -> str:
+    return f"{value:>7.1f} MB" if value is not None else "      - MB"
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument("--archive", default=os.path.join(REPO_ROOT, "data"), help="directory with IZV_*.html statements")
+    arg_parser.add_argument("--invoice-runs", type=int, default=50, help="renders per invoice size")
+    arg_parser.add_argument("--memorandum-rows", type=int, default=5000)
+    arg_parser.add_argument("--memorandum-runs", type=int, default=3)
+    arg_parser.add_argument("--statements", type=int, default=50, help="statements per merge")
+    arg_parser.add_argument("--merge-runs", type=int, default=5, help="warm-cache merges (one cold merge runs first)")
+    arg_parser.add_argument("--skip-merge", action="store_true")
+    arg_parser.add_argument("--json", help="write the results to this file")
+    args = arg_parser.parse_args()
+    archive = os.path.abspath(args.archive)
+
+    statements = sorted(f for f in os.listdir(archive) if f.startswith("IZV_") and f.endswith(".html"))[:args.statements]
+    if not args.skip_merge and not statements:
+        arg_parser.error(f"no IZV_*.html statements in {archive}")
+
+    workdir = tempfile.mkdtemp(prefix="posd-pdf-bench-")
+    os.chdir(workdir)
+    os.makedirs("data")
+    for filename in statements:
+        os.symlink(os.path.join(archive, filename), os.path.join("data", filename))
+
+    # backend.main reads its configuration at import time
+    os.environ["POSD_WATCH_DATA_DIR"] = "0"
+    os.environ["POSD_GMAIL_SYNC_INTERVAL"] = "0"
+    os.environ["POSD_WARM_PDF_CACHE"] = "0"
+    os.environ.setdefault("POSD_PDF_TIMING_LOG_MS", "-1")
+    import backend.main as app_main
+    from backend.invoice_pdf_generator import INVOICE_RENDERER, generate_invoice_pdf
+    from backend.pdf_worker import STATEMENT_RENDERER
+
+    pool = app_main.get_pdf_pool()
+    print(
+        f"Scratch dir {workdir}, {pool.size} PDF workers, "
+        f"invoice renderer {INVOICE_RENDERER}, statement renderer {STATEMENT_RENDERER}"
+    )
+
+    results = []
+    for items in (1, 5, 25, 100):
+        invoices = [_make_invoice(items, seed) for seed in range(args.invoice_runs)]
+        rendering = iter(invoices)
+        results.append(_run(f"invoice x{items}", len(invoices), lambda: generate_invoice_pdf(next(rendering), ISSUER)))
+
+    year = 2025
+    posd = app_main.POSDData(oib=ISSUER["oib"], name=ISSUER["name"], address=ISSUER["address"], year=year, total_receipts=0, tax_paid=0, surtax_paid=0)
+    inflows = _make_inflows(args.memorandum_rows, year)
+    results.append(_run(
+        f"memorandum {args.memorandum_rows}", args.memorandum_runs,
+        lambda: app_main.generate_memorandum_pdf(posd, inflows, year, pool=pool)
+    ))
+
+    if not args.skip_merge:
+        merge = lambda: app_main._merge_statements(statements, io.BytesIO())
+        results.append(_run(f"merge {len(statements)} cold", 1, merge))
+        results.append(_run(f"merge {len(statements)} warm", args.merge_runs, merge))
+
+    app_main.shutdown_pdf_pool()
+    app_main.pdf_cache.shutdown()
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({
+                "invoice_renderer": INVOICE_RENDERER, "statement_renderer": STATEMENT_RENDERER,
+                "pdf_workers": pool.size, "runs": results
+            }, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
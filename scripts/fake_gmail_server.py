@@ -0,0 +1,385 @@
+"""
+Local stand-in for the parts of the Gmail API the sync uses:
+profile, messages.list, messages.get, attachments.get, history.list and batch requests.
+
+Every data/IZV_*.html statement becomes one synthetic "ERSTE Izvadak" message
+carrying the file as its attachment. Latency, random 429s and a per-second quota
+can be dialled in to see how the sync copes.
+
+Usage:
+    python scripts/fake_gmail_server.py --port 8081 --latency 0.05 --error-rate 0.02
+    POSD_GMAIL_API_ENDPOINT=http://127.0.0.1:8081 uvicorn backend.main:app
+"""
+import argparse
+import base64
+import glob
+import json
+import os
+import random
+import re
+import threading
+import time
+from datetime import datetime
+from email.parser import FeedParser
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List, Optional
+from urllib.parse import parse_qs, urlparse
+
+API_PREFIX = "/gmail/v1/users/me"
+BATCH_PATH = "/batch/gmail/v1"
+PAGE_SIZE = 100
+FIRST_HISTORY_ID = 1000
+
+# Quota cost of each call, as documented by Gmail
+CALL_UNITS = {"profile": 1, "list": 5, "get": 5, "attachment": 5, "history": 2}
+
+
+def _internal_date(filename: str) -> int:
+    # IZV_2025_12_20 04_06_39_977_427.html -> ms since epoch of the statement run
+    match = re.match(r"IZV_(\d{4})_(\d{2})_(\d{2}) (\d{2})_(\d{2})_(\d{2})", filename)
+    if not match:
+        return 0
+    return int(datetime(*map(int, match.groups())).timestamp() * 1000)
+
+
+def _select_fields(value, fields: str):
+    """
+    Applies a partial-response `fields` mask such as 'id,payload/parts(filename,body/attachmentId)'.
+    """
+    def split_top(spec):
+        parts, depth, current = [], 0, ""
+        for ch in spec:
+            if ch == "(":
+                depth += 1
+            elif ch == ")":
+                depth -= 1
+            if ch == "," and depth == 0:
+                parts.append(current)
+                current = ""
+            else:
+                current += ch
+        if current:
+            parts.append(current)
+        return parts
+
+    def apply(node, specs):
+        if isinstance(node, list):
+            return [apply(item, specs) for item in node]
+        if not isinstance(node, dict):
+            return node
+        out = {}
+        for spec in specs:
+            if "(" in spec and spec.endswith(")") and ("/" not in spec or spec.index("(") < spec.index("/")):
+                key, sub = spec.split("(", 1)
+                if key in node:
+                    out[key] = apply(node[key], split_top(sub[:-1]))
+            elif "/" in spec:
+                key, rest = spec.split("/", 1)
+                if key in node:
+                    merged = apply(node[key], [rest])
+                    if isinstance(out.get(key), dict) and isinstance(merged, dict):
+                        out[key].update(merged)
+                    elif isinstance(out.get(key), list) and isinstance(merged, list):
+                        out[key] = [dict(a, **b) for a, b in zip(out[key], merged)]
+                    else:
+                        out[key] = merged
+            elif spec in node:
+                out[spec] = node[spec]
+        return out
+
+    return apply(value, split_top(fields))
+
+
+class FakeMailbox:
+    """
+    In-memory mailbox built from a statement archive.
+    Only the first `delivered` messages are visible; `deliver()` makes more of them
+    arrive, which is what an incremental sync should pick up.
+    """
+    def __init__(self, archive_dir: str, delivered: Optional[int] = None, history_floor: int = FIRST_HISTORY_ID):
+        self.files = sorted(glob.glob(os.path.join(archive_dir, "IZV_*.html")))
+        self.delivered = len(self.files) if delivered is None else min(delivered, len(self.files))
+        # history.list answers 404 for start ids below this, like an expired history id
+        self.history_floor = history_floor
+        # Receive time of messages delivered while running; the archive keeps its statement dates
+        self.received_at = {}
+        self._lock = threading.Lock()
+
+    def deliver(self, count: int = 1):
+        with self._lock:
+            now_ms = int(time.time() * 1000)
+            for index in range(self.delivered, min(self.delivered + count, len(self.files))):
+                self.received_at[index] = now_ms
+            self.delivered = min(self.delivered + count, len(self.files))
+
+    def internal_date(self, index: int) -> int:
+        return self.received_at.get(index) or _internal_date(os.path.basename(self.files[index]))
+
+    @property
+    def history_id(self) -> int:
+        return FIRST_HISTORY_ID + self.delivered
+
+    def message_ids(self) -> List[str]:
+        return [f"{index:016x}" for index in range(self.delivered)]
+
+    def _index(self, message_id: str) -> Optional[int]:
+        try:
+            index = int(message_id, 16)
+        except ValueError:
+            return None
+        return index if 0 <= index < self.delivered else None
+
+    def message(self, message_id: str) -> Optional[dict]:
+        index = self._index(message_id)
+        if index is None:
+            return None
+        path = self.files[index]
+        filename = os.path.basename(path)
+        return {
+            "id": message_id,
+            "threadId": message_id,
+            "historyId": str(FIRST_HISTORY_ID + index + 1),
+            "internalDate": str(self.internal_date(index)),
+            "labelIds": ["INBOX"],
+            "payload": {
+                "mimeType": "multipart/mixed",
+                "headers": [
+                    {"name": "Subject", "value": "ERSTE Izvadak"},
+                    {"name": "From", "value": "izvadak@erstebank.hr"},
+                ],
+                "parts": [
+                    {
+                        "partId": "0",
+                        "mimeType": "text/plain",
+                        "filename": "",
+                        "body": {"size": 17, "data": base64.urlsafe_b64encode(b"Izvadak u prilogu").decode()},
+                    },
+                    {
+                        "partId": "1",
+                        "mimeType": "text/html",
+                        "filename": filename,
+                        "body": {"attachmentId": f"att-{message_id}", "size": os.path.getsize(path)},
+                    },
+                ],
+            },
+        }
+
+    def attachment(self, message_id: str, attachment_id: str) -> Optional[dict]:
+        index = self._index(message_id)
+        if index is None or attachment_id != f"att-{message_id}":
+            return None
+        with open(self.files[index], "rb") as f:
+            data = f.read()
+        return {"size": len(data), "data": base64.urlsafe_b64encode(data).decode()}
+
+    def list(self, query: str, page_token: Optional[str]) -> dict:
+        # Every archived message matches the statement query; only after: is honoured
+        ids = self.message_ids()
+        after = re.search(r"after:(\d+)", query or "")
+        if after:
+            since_ms = int(after.group(1)) * 1000
+            ids = [m for m in ids if self.internal_date(int(m, 16)) >= since_ms]
+        ids.reverse() # newest first, like Gmail
+
+        start = int(page_token or 0)
+        page = ids[start:start + PAGE_SIZE]
+        result = {"messages": [{"id": m, "threadId": m} for m in page], "resultSizeEstimate": len(ids)}
+        if start + PAGE_SIZE < len(ids):
+            result["nextPageToken"] = str(start + PAGE_SIZE)
+        if not page:
+            del result["messages"]
+        return result
+
+    def history(self, start_history_id: int, page_token: Optional[str]) -> Optional[dict]:
+        if start_history_id < self.history_floor:
+            return None
+        first = max(start_history_id - FIRST_HISTORY_ID, 0)
+        records = [
+            {"id": str(FIRST_HISTORY_ID + index + 1), "messagesAdded": [{"message": {"id": f"{index:016x}", "labelIds": ["INBOX"]}}]}
+            for index in range(first, self.delivered)
+        ]
+        start = int(page_token or 0)
+        result = {"history": records[start:start + PAGE_SIZE], "historyId": str(self.history_id)}
+        if start + PAGE_SIZE < len(records):
+            result["nextPageToken"] = str(start + PAGE_SIZE)
+        return result
+
+
+class FakeGmailServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, mailbox: FakeMailbox, latency: float = 0.0, error_rate: float = 0.0, quota_units: Optional[int] = None):
+        super().__init__(address, FakeGmailHandler)
+        self.mailbox = mailbox
+        self.latency = latency
+        self.error_rate = error_rate
+        # Per-second quota; calls beyond it get 429 like the real per-user limit
+        self.quota_units = quota_units
+
+        self.stats = {"http_requests": 0, "calls": 0, "rate_limited": 0, "bytes_sent": 0}
+        self._lock = threading.Lock()
+        self._window = (0, 0) # (second, units used)
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def charge(self, units: int) -> bool:
+        """
+        Accounts one API call. Returns False if it should be rejected with 429.
+        """
+        with self._lock:
+            self.stats["calls"] += 1
+            rejected = self.error_rate and random.random() < self.error_rate
+            if self.quota_units and not rejected:
+                second = int(time.monotonic())
+                used = self._window[1] if self._window[0] == second else 0
+                rejected = used + units > self.quota_units
+                if not rejected:
+                    self._window = (second, used + units)
+            if rejected:
+                self.stats["rate_limited"] += 1
+            return not rejected
+
+    def dispatch(self, method: str, target: str):
+        """
+        Handles one API call; returns (status, body dict).
+        """
+        parsed = urlparse(target)
+        params = {k: v[0] for k, v in parse_qs(parsed.query).items()}
+        path = parsed.path
+        if not path.startswith(API_PREFIX) or method != "GET":
+            return 404, {"error": {"code": 404, "message": "Not Found"}}
+        route = path[len(API_PREFIX):].strip("/").split("/")
+
+        kind = {
+            ("profile",): "profile",
+            ("messages",): "list",
+            ("history",): "history",
+        }.get(tuple(route))
+        if kind is None and len(route) == 2 and route[0] == "messages":
+            kind = "get"
+        elif kind is None and len(route) == 4 and route[0] == "messages" and route[2] == "attachments":
+            kind = "attachment"
+        if kind is None:
+            return 404, {"error": {"code": 404, "message": "Not Found"}}
+
+        if not self.charge(CALL_UNITS[kind]):
+            return 429, {"error": {"code": 429, "message": "Rate Limit Exceeded", "status": "RESOURCE_EXHAUSTED"}}
+
+        mailbox = self.mailbox
+        if kind == "profile":
+            body = {"emailAddress": "fake@example.com", "messagesTotal": mailbox.delivered, "historyId": str(mailbox.history_id)}
+        elif kind == "list":
+            body = mailbox.list(params.get("q", ""), params.get("pageToken"))
+        elif kind == "history":
+            body = mailbox.history(int(params.get("startHistoryId", 0)), params.get("pageToken"))
+            if body is None:
+                return 404, {"error": {"code": 404, "message": "Requested entity was not found.", "status": "NOT_FOUND"}}
+        elif kind == "get":
+            body = mailbox.message(route[1])
+        else:
+            body = mailbox.attachment(route[1], route[3])
+
+        if body is None:
+            return 404, {"error": {"code": 404, "message": "Requested entity was not found.", "status": "NOT_FOUND"}}
+        if params.get("fields"):
+            body = _select_fields(body, params["fields"])
+        return 200, body
+
+
+class FakeGmailHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status: int, body: bytes, content_type: str = "application/json; charset=UTF-8"):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        with self.server._lock:
+            self.server.stats["bytes_sent"] += len(body)
+
+    def _begin(self):
+        with self.server._lock:
+            self.server.stats["http_requests"] += 1
+        if self.server.latency:
+            time.sleep(self.server.latency)
+
+    def do_GET(self):
+        self._begin()
+        status, body = self.server.dispatch("GET", self.path)
+        self._send(status, json.dumps(body).encode())
+
+    def do_POST(self):
+        self._begin()
+        length = int(self.headers.get("Content-Length", 0))
+        payload = self.rfile.read(length).decode("utf-8")
+        if urlparse(self.path).path != BATCH_PATH:
+            self._send(404, b'{"error": {"code": 404, "message": "Not Found"}}')
+            return
+
+        parser = FeedParser()
+        parser.feed(f"Content-Type: {self.headers['Content-Type']}\r\n\r\n" + payload)
+        message = parser.close()
+        if not message.is_multipart():
+            self._send(400, b'{"error": {"code": 400, "message": "Batch body must be multipart/mixed"}}')
+            return
+
+        boundary = "batch_fake_gmail"
+        out = []
+        for part in message.get_payload():
+            request_line = part.get_payload().split("\n", 1)[0].strip()
+            method, target, _ = request_line.split(" ", 2)
+            status, body = self.server.dispatch(method, target)
+            out.append(
+                f"--{boundary}\r\n"
+                "Content-Type: application/http\r\n"
+                f"Content-ID: <response-{part['Content-ID'].strip('<>')}>\r\n\r\n"
+                f"HTTP/1.1 {status} {'OK' if status == 200 else 'Error'}\r\n"
+                "Content-Type: application/json; charset=UTF-8\r\n\r\n"
+                f"{json.dumps(body)}\r\n"
+            )
+        out.append(f"--{boundary}--\r\n")
+        self._send(200, "".join(out).encode("utf-8"), content_type=f"multipart/mixed; boundary={boundary}")
+
+
+def serve(
+    archive_dir: str,
+    host: str = "127.0.0.1",
+    port: int = 0,
+    latency: float = 0.0,
+    error_rate: float = 0.0,
+    quota_units: Optional[int] = None,
+    delivered: Optional[int] = None,
+    background: bool = True
+) -> FakeGmailServer:
+    """
+    Starts the fake server (port 0 picks a free one). With background=True it runs
+    on a daemon thread and the server is returned for `.url`, `.stats` and `.mailbox`.
+    """
+    server = FakeGmailServer((host, port), FakeMailbox(archive_dir, delivered), latency, error_rate, quota_units)
+    if background:
+        threading.Thread(target=server.serve_forever, name="fake-gmail", daemon=True).start()
+    else:
+        server.serve_forever()
+    return server
+
+
+if __name__ == "__main__":
+    repo_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    arg_parser = argparse.ArgumentParser(description="Local Gmail API stand-in serving the statement archive")
+    arg_parser.add_argument("--archive", default=os.path.join(repo_root, "data"), help="directory with IZV_*.html files")
+    arg_parser.add_argument("--host", default="127.0.0.1")
+    arg_parser.add_argument("--port", type=int, default=8081)
+    arg_parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every HTTP request")
+    arg_parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of calls answered with 429")
+    arg_parser.add_argument("--quota", type=int, default=None, help="quota units per second before 429s")
+    args = arg_parser.parse_args()
+
+    print(f"Serving {args.archive} as a fake Gmail API on http://{args.host}:{args.port}")
+    serve(args.archive, args.host, args.port, args.latency, args.error_rate, args.quota, background=False)
@@ -0,0 +1,67 @@
+import os
+import sys
+
+import pytest
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+sys.path.insert(0, os.path.join(REPO_ROOT, "scripts"))
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+STATEMENTS = os.path.join(FIXTURES, "statements")
+
+
+@pytest.fixture
+def statement_paths():
+    """
+    The Erste HTML statements in tests/fixtures/statements, oldest first.
+    """
+    return sorted(os.path.join(STATEMENTS, name) for name in os.listdir(STATEMENTS))
+
+
+@pytest.fixture
+def data_dir(tmp_path):
+    path = tmp_path / "data"
+    path.mkdir()
+    return str(path)
+
+
+@pytest.fixture
+def db(data_dir):
+    from backend.database import XMLDatabase
+    return XMLDatabase(os.path.join(data_dir, "transactions.xml"))
+
+
+@pytest.fixture(scope="session")
+def app_main(tmp_path_factory):
+    """
+    backend.main, imported once from a scratch directory: it reads its configuration
+    and creates data/ relative to the working directory at import time. Tests swap
+    in their own `db`, DATA_DIR and services with monkeypatch. Startup events never
+    run (TestClient is used without `with`), so no worker pools or watchers start.
+    """
+    workdir = tmp_path_factory.mktemp("app")
+    os.makedirs(workdir / "data")
+    os.environ["POSD_WATCH_DATA_DIR"] = "0"
+    os.environ["POSD_GMAIL_SYNC_INTERVAL"] = "0"
+    os.environ["POSD_WARM_PDF_CACHE"] = "0"
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    try:
+        import backend.main as app_main
+    finally:
+        os.chdir(cwd)
+    yield app_main
+    app_main.shutdown_parse_pool()
+    app_main.pdf_cache.shutdown()
+
+
+@pytest.fixture
+def app(app_main, db, data_dir, monkeypatch):
+    """
+    backend.main pointed at this test's empty DB and data directory.
+    """
+    monkeypatch.setattr(app_main, "db", db)
+    monkeypatch.setattr(app_main, "DATA_DIR", data_dir)
+    db.add_change_listener(app_main.invoice_pdf_cache.on_db_change)
+    return app_main
@@ -0,0 +1,137 @@
+import json
+import os
+import shutil
+
+from backend.database import XMLDatabase
+from backend.erste_parser import parse_erste_statement
+from backend.ingest import parse_statement_file
+from backend.statement_pdf_native import render_statement_pdf
+
+
+def _add_statement(data_dir, source) -> str:
+    filename = os.path.basename(source)
+    shutil.copy(source, os.path.join(data_dir, filename))
+    return filename
+
+
+def _add_pdf_statement(data_dir, source) -> str:
+    filename = os.path.splitext(os.path.basename(source))[0] + ".pdf"
+    with open(source, encoding="utf-8") as f:
+        render_statement_pdf(parse_erste_statement(f.read()), os.path.join(data_dir, filename))
+    return filename
+
+
+def _ingest(db, data_dir, *filenames) -> dict:
+    return db.commit_ingest([parse_statement_file(os.path.join(data_dir, filename)) for filename in filenames])
+
+
+def _sources(db) -> list:
+    return sorted(os.path.splitext(t.source_file)[1] for t in db.load_transactions())
+
+
+# --- processed_files.json ---
+
+def test_legacy_processed_files_are_migrated(data_dir, statement_paths):
+    old, new = (_add_statement(data_dir, path) for path in statement_paths[:2])
+    db_path = os.path.join(data_dir, "transactions.xml")
+    XMLDatabase(db_path)
+    # The ledger as it was written before stats were kept
+    with open(os.path.join(data_dir, "processed_files.json"), "w") as f:
+        json.dump([old], f)
+
+    db = XMLDatabase(db_path)
+    assert db.is_file_processed(old) and db.is_file_current(old)
+    assert not db.is_file_processed(new)
+
+    _ingest(db, data_dir, new)
+
+    with open(os.path.join(data_dir, "processed_files.json")) as f:
+        ledger = json.load(f)
+    stat = os.stat(os.path.join(data_dir, new))
+    assert ledger == {old: None, new: [stat.st_mtime_ns, stat.st_size]}
+
+    db = XMLDatabase(db_path)
+    assert db.is_file_current(old) and db.is_file_current(new)
+
+
+def test_changed_file_is_no_longer_current(db, data_dir, statement_paths):
+    filename = _add_statement(data_dir, statement_paths[0])
+    _ingest(db, data_dir, filename)
+    assert db.is_file_current(filename)
+
+    with open(os.path.join(data_dir, filename), "a") as f:
+        f.write("\n")
+
+    assert db.is_file_processed(filename)
+    assert not db.is_file_current(filename)
+
+
+def test_rejected_file_is_skipped_until_it_changes(data_dir):
+    filename = "broken.html"
+    with open(os.path.join(data_dir, filename), "w") as f:
+        f.write("<html>not a statement</html>")
+    db = XMLDatabase(os.path.join(data_dir, "transactions.xml"))
+    db.mark_files_rejected([filename])
+
+    db = XMLDatabase(os.path.join(data_dir, "transactions.xml"))
+    assert db.is_file_rejected(filename)
+
+    with open(os.path.join(data_dir, filename), "a") as f:
+        f.write("\n")
+    assert not db.is_file_rejected(filename)
+
+
+# --- PDF/HTML row dedupe ---
+
+def test_pdf_rows_already_known_from_html_are_dropped(db, data_dir, statement_paths):
+    html = _add_statement(data_dir, statement_paths[0])
+    pdf = _add_pdf_statement(data_dir, statement_paths[0])
+    _ingest(db, data_dir, html)
+    count = len(db.load_transactions())
+    assert count
+
+    assert _ingest(db, data_dir, pdf) == {pdf: 0}
+    assert _sources(db) == [".html"] * count
+    assert db.is_file_processed(pdf)
+
+
+def test_html_replaces_rows_imported_from_pdf(db, data_dir, statement_paths):
+    html = _add_statement(data_dir, statement_paths[0])
+    pdf = _add_pdf_statement(data_dir, statement_paths[0])
+    _ingest(db, data_dir, pdf)
+    pdf_rows = db.load_transactions()
+    reviewed = pdf_rows[0]
+    reviewed.posd_note = "Checked against the PDF"
+    reviewed.is_excluded_from_posd = True
+    db.save_transactions([reviewed])
+
+    _ingest(db, data_dir, html)
+
+    rows = db.load_transactions()
+    assert _sources(db) == [".html"] * len(pdf_rows)
+    carried = [t for t in rows if t.posd_note]
+    assert len(carried) == 1
+    assert carried[0].posd_note == "Checked against the PDF"
+    assert carried[0].is_excluded_from_posd
+    assert (carried[0].date, carried[0].amount) == (reviewed.date, reviewed.amount)
+
+
+def test_html_and_pdf_in_one_batch(db, data_dir, statement_paths):
+    html = _add_statement(data_dir, statement_paths[0])
+    pdf = _add_pdf_statement(data_dir, statement_paths[0])
+
+    added = _ingest(db, data_dir, html, pdf)
+
+    assert added[pdf] == 0
+    assert _sources(db) == [".html"] * added[html]
+
+
+def test_pdf_metadata_does_not_overwrite_html(db, data_dir, statement_paths):
+    html = _add_statement(data_dir, statement_paths[0])
+    pdf = _add_pdf_statement(data_dir, statement_paths[0])
+    _ingest(db, data_dir, html)
+    db.save_metadata({"name": "Edited by hand"})
+
+    _ingest(db, data_dir, pdf)
+
+    assert db.get_metadata()["name"] == "Edited by hand"
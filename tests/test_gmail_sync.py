@@ -0,0 +1,83 @@
+import json
+import os
+import time
+
+import pytest
+
+from backend.gmail_service import DEFAULT_QUERY, GmailService
+from fake_gmail_server import serve
+
+
+def _write_fake_token(path: str):
+    # Valid for a day, so authenticate() never tries to refresh against Google
+    expiry = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(time.time() + 86400))
+    with open(path, "w") as f:
+        json.dump({
+            "token": "fake-token",
+            "refresh_token": "fake-refresh-token",
+            "client_id": "fake",
+            "client_secret": "fake",
+            "token_uri": "https://oauth2.googleapis.com/token",
+            "expiry": expiry,
+        }, f)
+
+
+@pytest.fixture
+def server(statement_paths):
+    """
+    The fake Gmail API over the fixture statements, with the first two delivered.
+    """
+    server = serve(os.path.dirname(statement_paths[0]), delivered=2)
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def synced_app(app, server, data_dir, monkeypatch):
+    token_path = os.path.join(data_dir, "token.json")
+    _write_fake_token(token_path)
+    service = GmailService(os.path.join(data_dir, "credentials.json"), token_path, api_endpoint=server.url)
+    monkeypatch.setattr(app, "gmail_service", service)
+    return app
+
+
+def _logs(app) -> list:
+    return [entry["message"] for entry in app.sync_manager.logs]
+
+
+def _imported_files(app) -> set:
+    return {t.source_file for t in app.db.load_transactions()}
+
+
+def test_full_then_incremental_sync(synced_app, server, statement_paths):
+    app = synced_app
+    app.run_gmail_sync()
+
+    assert app.sync_manager.status == "completed"
+    assert _imported_files(app) == {os.path.basename(path) for path in statement_paths[:2]}
+    assert app.db.get_gmail_sync_state(DEFAULT_QUERY)["history_id"] == str(server.mailbox.history_id)
+
+    server.mailbox.deliver(1)
+    app.sync_manager.logs.clear()
+    app.run_gmail_sync()
+
+    assert any(message.startswith("Incremental sync since history id") for message in _logs(app))
+    assert _imported_files(app) == {os.path.basename(path) for path in statement_paths}
+
+
+def test_expired_history_falls_back_to_a_full_sync(synced_app, server, statement_paths):
+    app = synced_app
+    app.run_gmail_sync()
+    saved = app.db.get_gmail_sync_state(DEFAULT_QUERY)["history_id"]
+
+    server.mailbox.deliver(1)
+    # history.list now answers 404 for the saved id
+    server.mailbox.history_floor = int(saved) + 1
+    app.sync_manager.logs.clear()
+    app.run_gmail_sync()
+
+    assert "Gmail history has expired, falling back to a full sync..." in _logs(app)
+    assert app.sync_manager.status == "completed"
+    assert _imported_files(app) == {os.path.basename(path) for path in statement_paths}
+    assert app.db.get_gmail_sync_state(DEFAULT_QUERY)["history_id"] == str(server.mailbox.history_id)
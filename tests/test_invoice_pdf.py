@@ -0,0 +1,90 @@
+from datetime import date
+
+import pytest
+from fastapi.testclient import TestClient
+
+from backend.invoice_pdf_generator import generate_invoice_pdf
+from backend.models import Invoice, InvoiceItem, InvoiceStatus
+
+ISSUER = {
+    "name": "Obrt Test, vl. Ivo Ivic",
+    "address": "Ilica 1, 10000 Zagreb",
+    "oib": "12345678903",
+    "iban": "HR1723600001101234565",
+}
+
+
+def _invoice(**changes) -> Invoice:
+    fields = dict(
+        id="inv-1",
+        number="R-2025-07",
+        year=2025,
+        issue_date=date(2025, 3, 4),
+        due_date=date(2025, 3, 19),
+        client_name="Acme d.o.o.",
+        client_oib="12345678901",
+        client_address="Ilica 1",
+        client_city="Zagreb",
+        client_zip="10000",
+        items=[
+            InvoiceItem(id="1", description="Izrada web stranice", quantity=1, price=1000),
+            InvoiceItem(id="2", description="Održavanje", quantity=3, price=50, discount=10),
+        ],
+        notes="Plaćanje u roku od 15 dana.",
+        subtotal=1135,
+        tax_total=283.75,
+        total_amount=1418.75,
+    )
+    fields.update(changes)
+    return Invoice(**fields)
+
+
+def test_invoice_pdf_is_deterministic():
+    first = generate_invoice_pdf(_invoice(), ISSUER)
+
+    assert first.startswith(b"%PDF")
+    assert generate_invoice_pdf(_invoice(), ISSUER) == first
+
+
+@pytest.fixture
+def client(app):
+    app.db.save_metadata(ISSUER)
+    app.db.save_invoice(_invoice())
+    # Without `with`: startup events (pools, watcher, Gmail loop) stay off
+    return TestClient(app.app)
+
+
+def test_invoice_pdf_etag_and_not_modified(client, app):
+    response = client.get("/api/invoices/inv-1/pdf")
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/pdf"
+    assert response.content == generate_invoice_pdf(_invoice(), app._get_issuer())
+    etag = response.headers["etag"]
+
+    again = client.get("/api/invoices/inv-1/pdf", headers={"If-None-Match": etag})
+    assert again.status_code == 304
+    assert again.headers["etag"] == etag
+    assert not again.content
+
+    listed = client.get("/api/invoices/inv-1/pdf", headers={"If-None-Match": f'"other", {etag}'})
+    assert listed.status_code == 304
+
+
+def test_invoice_pdf_etag_follows_rendered_content(client, app):
+    etag = client.get("/api/invoices/inv-1/pdf").headers["etag"]
+
+    # Not on the PDF: same render, same ETag
+    app.db.save_invoice(_invoice(status=InvoiceStatus.PAID))
+    assert client.get("/api/invoices/inv-1/pdf", headers={"If-None-Match": etag}).status_code == 304
+
+    app.db.save_invoice(_invoice(notes="Novi rok plaćanja."))
+    changed = client.get("/api/invoices/inv-1/pdf", headers={"If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.headers["etag"] != etag
+
+    app.db.save_metadata({"iban": "HR1210010051863000160"})
+    assert client.get("/api/invoices/inv-1/pdf").headers["etag"] not in (etag, changed.headers["etag"])
+
+
+def test_missing_invoice_pdf(client):
+    assert client.get("/api/invoices/nope/pdf").status_code == 404
@@ -0,0 +1,105 @@
+import io
+import os
+import threading
+
+import pytest
+from fastapi.testclient import TestClient
+from pypdf import PdfReader
+
+from backend.erste_parser import parse_erste_statement
+from backend.pdf_merge import ChunkPipe, StreamingPdfMerger
+from backend.statement_pdf_native import render_statement_pdf
+
+
+@pytest.fixture
+def statement_pdfs(tmp_path, statement_paths):
+    paths = []
+    for path in statement_paths:
+        pdf = str(tmp_path / (os.path.splitext(os.path.basename(path))[0] + ".pdf"))
+        with open(path, encoding="utf-8") as f:
+            render_statement_pdf(parse_erste_statement(f.read()), pdf)
+        paths.append(pdf)
+    return paths
+
+
+def _texts(source) -> list:
+    return [page.extract_text() for page in PdfReader(source).pages]
+
+
+def test_merger_keeps_every_page_in_order(statement_pdfs):
+    output = io.BytesIO()
+    merger = StreamingPdfMerger(output)
+    for path in statement_pdfs:
+        merger.append(path)
+    merger.close()
+
+    output.seek(0)
+    expected = [text for path in statement_pdfs for text in _texts(path)]
+    assert merger.pages == len(expected)
+    assert _texts(output) == expected
+
+
+def test_merger_writes_nothing_for_an_unreadable_source(tmp_path):
+    broken = tmp_path / "broken.pdf"
+    broken.write_bytes(b"not a pdf")
+    output = io.BytesIO()
+
+    with pytest.raises(Exception):
+        StreamingPdfMerger(output).append(str(broken))
+    assert output.getvalue() == b""
+
+
+def test_chunk_pipe_passes_chunks_and_errors():
+    pipe = ChunkPipe(max_chunks=2)
+
+    def write():
+        for i in range(5):
+            pipe.write(b"%d" % i)
+        pipe.finish(ValueError("boom"))
+
+    writer = threading.Thread(target=write)
+    writer.start()
+
+    received = []
+    with pytest.raises(ValueError, match="boom"):
+        for chunk in pipe.chunks():
+            received.append(chunk)
+    writer.join()
+    assert received == [b"0", b"1", b"2", b"3", b"4"]
+
+
+def test_chunk_pipe_stops_the_writer_when_the_reader_goes_away():
+    pipe = ChunkPipe(max_chunks=1)
+    failed = []
+
+    def write():
+        try:
+            while True:
+                pipe.write(b"x")
+        except BrokenPipeError:
+            failed.append(True)
+
+    writer = threading.Thread(target=write)
+    writer.start()
+    chunks = pipe.chunks()
+    assert next(chunks) == b"x"
+    chunks.close()
+    writer.join(timeout=5)
+
+    assert not writer.is_alive()
+    assert failed == [True]
+
+
+def test_merge_endpoint_streams_the_statements(app, data_dir, statement_pdfs):
+    pages = sum(len(PdfReader(path).pages) for path in statement_pdfs)
+    for path in statement_pdfs:
+        os.replace(path, os.path.join(data_dir, os.path.basename(path)))
+    filenames = [os.path.basename(path) for path in statement_pdfs]
+    client = TestClient(app.app)
+
+    response = client.post("/api/documents/merge", json={"filenames": filenames})
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/pdf"
+    assert len(PdfReader(io.BytesIO(response.content)).pages) == pages
+
+    assert client.post("/api/documents/merge", json={"filenames": ["missing.pdf"]}).status_code == 404
@@ -0,0 +1,162 @@
+import os
+from datetime import date
+
+from backend.camt_parser import parse_camt053
+from backend.database import XMLDatabase
+from backend.erste_parser import make_transaction_id, parse_erste_html, parse_erste_statement
+from backend.models import TransactionType
+from backend.pdf_statement_parser import parse_erste_pdf
+from backend.statement_parsers import SNIFF_BYTES, detect_parser, statement_extensions
+from backend.statement_pdf_native import render_statement_pdf
+
+CAMT053 = b"""<?xml version="1.0" encoding="UTF-8"?>
+<Document xmlns="urn:iso:std:iso:20022:tech:xsd:camt.053.001.02">
+  <BkToCstmrStmt>
+    <GrpHdr><MsgId>STMT-1</MsgId><CreDtTm>2025-06-27T06:00:00</CreDtTm></GrpHdr>
+    <Stmt>
+      <Id>STMT-1</Id>
+      <Acct>
+        <Id><IBAN>HR1723600001101234565</IBAN></Id>
+        <Ownr>
+          <Nm>Obrt Test, vl. Ivo Ivic</Nm>
+          <PstlAdr><StrtNm>Ilica</StrtNm><BldgNb>1</BldgNb><PstCd>10000</PstCd><TwnNm>Zagreb</TwnNm></PstlAdr>
+          <Id><OrgId><Othr><Id>12345678903</Id></Othr></OrgId></Id>
+        </Ownr>
+      </Acct>
+      <Ntry>
+        <Amt Ccy="EUR">1250.00</Amt>
+        <CdtDbtInd>CRDT</CdtDbtInd>
+        <Sts>BOOK</Sts>
+        <BookgDt><Dt>2025-06-25</Dt></BookgDt>
+        <NtryDtls><TxDtls>
+          <Refs><EndToEndId>HR00 2025-7</EndToEndId></Refs>
+          <RltdPties>
+            <Dbtr><Nm>Acme d.o.o.</Nm></Dbtr>
+            <DbtrAcct><Id><IBAN>HR1210010051863000160</IBAN></Id></DbtrAcct>
+          </RltdPties>
+        </TxDtls></NtryDtls>
+      </Ntry>
+      <Ntry>
+        <Amt Ccy="EUR">7.30</Amt>
+        <CdtDbtInd>DBIT</CdtDbtInd>
+        <Sts>BOOK</Sts>
+        <BookgDt><DtTm>2025-06-26T15:42:00</DtTm></BookgDt>
+        <NtryDtls><TxDtls>
+          <Refs><EndToEndId>NOTPROVIDED</EndToEndId></Refs>
+          <RltdPties><Cdtr><Nm>MLINAR   P-452 Varazdin</Nm></Cdtr></RltdPties>
+        </TxDtls></NtryDtls>
+      </Ntry>
+      <Ntry>
+        <Amt Ccy="EUR">99.00</Amt>
+        <CdtDbtInd>DBIT</CdtDbtInd>
+        <Sts>PDNG</Sts>
+        <BookgDt><Dt>2025-06-26</Dt></BookgDt>
+      </Ntry>
+      <Ntry>
+        <Amt Ccy="EUR">20.00</Amt>
+        <CdtDbtInd>DBIT</CdtDbtInd>
+        <RvslInd>true</RvslInd>
+        <Sts>BOOK</Sts>
+        <ValDt><Dt>2025-06-26</Dt></ValDt>
+        <AddtlNtryInf>Storno naknade</AddtlNtryInf>
+      </Ntry>
+    </Stmt>
+  </BkToCstmrStmt>
+</Document>
+"""
+
+
+def _write(path, content: bytes) -> str:
+    with open(path, "wb") as f:
+        f.write(content)
+    return str(path)
+
+
+def _read(path) -> str:
+    with open(path, encoding="utf-8") as f:
+        return f.read()
+
+
+# --- Registry (sniffing) ---
+
+def test_detect_parser_sniffs_content_not_extension(tmp_path, statement_paths):
+    html = open(statement_paths[0], "rb").read()
+    pdf = tmp_path / "statement.pdf"
+    render_statement_pdf(parse_erste_statement(html.decode("utf-8")), str(pdf))
+
+    assert detect_parser(_write(tmp_path / "html.xml", html)).name == "erste_html"
+    assert detect_parser(_write(tmp_path / "camt.html", CAMT053)).name == "camt053"
+    assert detect_parser(_write(tmp_path / "pdf.xml", pdf.read_bytes())).name == "erste_pdf"
+    assert detect_parser(_write(tmp_path / "other.xml", b"<Document><Other/></Document>")) is None
+
+
+def test_detect_parser_only_reads_the_head(tmp_path):
+    late_marker = b"<html>" + b" " * SNIFF_BYTES + b"<tr class='trItems'>"
+    assert detect_parser(_write(tmp_path / "late.html", late_marker)) is None
+
+
+def test_statement_extensions_in_preference_order():
+    assert statement_extensions() == (".html", ".xml", ".pdf")
+
+
+# --- camt.053 ---
+
+def test_camt053_entries(tmp_path):
+    transactions, _ = parse_camt053(_write(tmp_path / "camt.xml", CAMT053), source_filename="camt.xml")
+
+    # The pending entry is left out
+    assert [(t.date, t.amount, t.type) for t in transactions] == [
+        (date(2025, 6, 25), 1250.0, TransactionType.INFLOW),
+        (date(2025, 6, 26), 7.3, TransactionType.OUTFLOW),
+        (date(2025, 6, 26), 20.0, TransactionType.INFLOW), # reversed debit
+    ]
+    credit, debit, reversal = transactions
+    assert credit.description == "Acme d.o.o. HR1210010051863000160"
+    assert credit.raw_reference == "HR00 2025-7"
+    assert debit.description == "MLINAR P-452 Varazdin"
+    assert debit.raw_reference == "" # NOTPROVIDED is dropped
+    assert reversal.description == "Storno naknade"
+    assert all(t.source_file == "camt.xml" and t.currency == "EUR" for t in transactions)
+
+
+def test_camt053_ids_use_the_shared_scheme(tmp_path):
+    path = _write(tmp_path / "camt.xml", CAMT053)
+    first, _ = parse_camt053(path)
+    second, _ = parse_camt053(path)
+
+    assert [t.id for t in first] == [t.id for t in second]
+    assert first[0].id == make_transaction_id(first[0].date, first[0].description, first[0].amount, first[0].raw_reference)
+
+
+def test_camt053_metadata_comes_from_the_statement_account(tmp_path):
+    _, metadata = parse_camt053(_write(tmp_path / "camt.xml", CAMT053))
+
+    assert metadata == {
+        "iban": "HR1723600001101234565",
+        "name": "Obrt Test, vl. Ivo Ivic",
+        "oib": "12345678903",
+        "address": "Ilica 1, 10000 Zagreb",
+    }
+
+
+# --- PDF ---
+
+def test_pdf_statement_rows_match_html(tmp_path, statement_paths):
+    for path in statement_paths:
+        html = _read(path)
+        html_transactions, html_metadata = parse_erste_html(html)
+        pdf = str(tmp_path / (os.path.basename(path) + ".pdf"))
+        render_statement_pdf(parse_erste_statement(html), pdf)
+
+        pdf_transactions, pdf_metadata = parse_erste_pdf(pdf, source_filename="statement.pdf")
+
+        def rows(transactions):
+            return sorted(
+                (XMLDatabase._row_key(t.date.isoformat(), t.amount, t.type.value, t.raw_reference), t.description)
+                for t in transactions
+            )
+
+        assert html_transactions
+        assert rows(pdf_transactions) == rows(html_transactions)
+        for key in ("name", "oib", "address"):
+            assert pdf_metadata[key] == html_metadata[key]